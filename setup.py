@@ -34,6 +34,7 @@ setuptools.setup(
     entry_points={
         'console_scripts': [
             'survtur-glacier = survtur_glacier:start',
+            'survtur-glacier-upload-stream = survtur_glacier.cli:upload_stream',
         ],
     },
 )
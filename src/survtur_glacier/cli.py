@@ -0,0 +1,102 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from .common.compression import available_codecs
+from .common.config import Config
+from .common.helpers import KB, is_power_of_two
+from .common.human_readable import human_readable_bytes
+from .glacier.inventory import Inventory, ArchiveInfo
+from .glacier.part_size import MIN_PART_SIZE_MB, MAX_PART_SIZE_MB
+from .glacier.stream_upload import StreamUploader, DEFAULT_STREAM_PART_SIZE_MB
+from .glacier.survtur_glacier import SurvturGlacier
+from .mp.bandwidth import TokenBucket, BandwidthRefiller
+
+_logger = logging.getLogger(__name__)
+
+
+def _part_size_mb(s: str) -> int:
+    n = int(s)
+    if not (MIN_PART_SIZE_MB <= n <= MAX_PART_SIZE_MB and is_power_of_two(n)):
+        raise argparse.ArgumentTypeError(f"must be power of two from {MIN_PART_SIZE_MB} to {MAX_PART_SIZE_MB}")
+    return n
+
+
+def upload_stream():
+    """
+    Uploads stdin to vault. Like:
+        pg_dump mydb | zstd | survtur-glacier-upload-stream MyVault backups/mydb.sql.zst
+    """
+    parser = argparse.ArgumentParser(description="Upload stdin to Glacier vault without saving it to disk.")
+    parser.add_argument("vault", help="vault name")
+    parser.add_argument("save_as", help="path of archive in inventory, like backups/mydb.sql.zst")
+    parser.add_argument("--part-size-mb", type=_part_size_mb, default=DEFAULT_STREAM_PART_SIZE_MB,
+                        help="power of two. Stream may be up to 10000 parts. "
+                             f"Default {DEFAULT_STREAM_PART_SIZE_MB}")
+    parser.add_argument("--threads", type=int, default=4, help="parallel part uploads. Default 4")
+    parser.add_argument("--compress", choices=available_codecs(),
+                        help="compress stream before upload. It is decompressed on download")
+    parser.add_argument("--level", type=int, help="compression level. Default is default of codec")
+    parser.add_argument("--workdir", default=os.path.join(str(Path.home()), ".survtur-glacier"),
+                        help="directory with config.ini and inventories")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    logging.getLogger('botocore').level = logging.WARNING
+
+    config = Config(args.workdir)
+    if args.compress and not config.fast_glacier_style_naming:
+        sys.exit("--compress requires fast_glacier_style_naming = 1 in config")
+
+    def make_glacier() -> SurvturGlacier:
+        return SurvturGlacier(access_key_id=config.access_key_id,
+                              secret_access_key=config.secret_access_key,
+                              region_name=config.region_name)
+
+    vault = next((v for v in make_glacier().download_vaults_list() if v['VaultName'] == args.vault), None)
+    if vault is None:
+        sys.exit(f"No vault {args.vault!r}")
+
+    bucket = TokenBucket(config.upload_speed_limit_kb * KB)
+    refiller = BandwidthRefiller()
+    refiller.buckets = [bucket]
+    refiller.start()
+
+    parent, _, name = args.save_as.rpartition("/")
+    parent = parent + "/" if parent else ""
+    uploader = StreamUploader(make_glacier, args.vault, args.save_as,
+                              use_glacier_format=config.fast_glacier_style_naming,
+                              part_size_mb=args.part_size_mb,
+                              threads=args.threads,
+                              progress_cb=lambda n: _logger.info(f"Uploaded {human_readable_bytes(n)}"),
+                              throttle=bucket.consume,
+                              codec=args.compress,
+                              compression_level=args.level)
+    try:
+        result = uploader.upload(sys.stdin.buffer)
+    finally:
+        refiller.stop.set()
+    _logger.info(f"Uploaded {human_readable_bytes(result.size)}. Archive id: {result.archive_id}")
+
+    inventory_file = config.get_inventories_location(SurvturGlacier.inventory_filename(vault['VaultARN']))
+    if not os.path.isfile(inventory_file):
+        _logger.warning("There is no inventory of vault yet. Archive will be there after inventory update.")
+        return
+    inv = Inventory(inventory_file)
+    inv.put_archive(ArchiveInfo(
+        archive_id=result.archive_id,
+        parent=parent,
+        name=name,
+        upload_timestamp=time.time(),
+        modified_timestamp=time.time(),
+        sha256=result.sha256,
+        size=result.size,
+        is_dir=False,
+        codec=args.compress,
+        original_size=result.original_size if args.compress else None
+    ))
+    inv.save()
+    inv.close()
@@ -0,0 +1,108 @@
+import lzma
+import zlib
+from typing import BinaryIO, Optional, Callable, Any, List
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .helpers import MB
+
+CODECS = ("zlib", "lzma", "zstd")
+
+_EXTENSIONS = {"zlib": ".zz", "lzma": ".xz", "zstd": ".zst"}
+
+
+def available_codecs() -> List[str]:
+    """zstd is there only if `zstandard` package is installed"""
+    return [c for c in CODECS if c != "zstd" or zstandard is not None]
+
+
+def codec_extension(codec: str) -> str:
+    return _EXTENSIONS[codec]
+
+
+def _check_codec(codec: str):
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec!r}. Expected one of {', '.join(CODECS)}")
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("zstd codec requires `zstandard` package. Install it with `pip3 install zstandard`")
+
+
+def make_compressor(codec: str, level: Optional[int] = None):
+    """Returns object with `compress(bytes)` and `flush()`, like `zlib.compressobj()`"""
+    _check_codec(codec)
+    if codec == "zlib":
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level)
+    if codec == "lzma":
+        return lzma.LZMACompressor(preset=level)
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+
+
+class Decompressor:
+    """The same interface for all codecs: `decompress(bytes)` and `flush()`"""
+
+    def __init__(self, codec: str):
+        _check_codec(codec)
+        self._codec = codec
+        if codec == "zlib":
+            self._d = zlib.decompressobj()
+        elif codec == "lzma":
+            self._d = lzma.LZMADecompressor()
+        else:
+            self._d = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._d.decompress(data)
+
+    def flush(self) -> bytes:
+        # Only zlib keeps some output till the end
+        return self._d.flush() if self._codec == "zlib" else b""
+
+
+class CompressingReader:
+    """
+    Readable stream of compressed content of `raw` stream. Raw stream is read by 1 MB.
+    `progress_cb` is called with total count of raw bytes read.
+    """
+
+    def __init__(self, raw: BinaryIO, codec: str, level: Optional[int] = None,
+                 progress_cb: Optional[Callable[[int], Any]] = None):
+        self._raw = raw
+        self._compressor = make_compressor(codec, level)
+        self._progress_cb = progress_cb
+        self._pending = bytearray()
+        self._eof = False
+        self.raw_read = 0
+
+    def _fill(self, n: int):
+        while len(self._pending) < n and not self._eof:
+            chunk = self._raw.read(MB)
+            if not chunk:
+                self._pending += self._compressor.flush()
+                self._eof = True
+                break
+            self.raw_read += len(chunk)
+            self._pending += self._compressor.compress(chunk)
+            if self._progress_cb:
+                self._progress_cb(self.raw_read)
+
+    def readinto(self, b) -> int:
+        view = memoryview(b).cast('B')
+        self._fill(len(view))
+        n = min(len(view), len(self._pending))
+        view[:n] = self._pending[:n]
+        del self._pending[:n]
+        return n
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            self._fill(float('inf'))
+            n = len(self._pending)
+        buffer = bytearray(n)
+        got = self.readinto(buffer)
+        return bytes(buffer[:got])
+
+    def readable(self) -> bool:
+        return True
@@ -25,6 +25,9 @@ class Config:
         self._inventories_dir: str = os.path.join(self._workdir, 'inventories')
         if not os.path.isdir(self._inventories_dir):
             os.mkdir(self._inventories_dir)
+        self._packs_dir: str = os.path.join(self._workdir, 'packs')
+        if not os.path.isdir(self._packs_dir):
+            os.mkdir(self._packs_dir)
 
     def get_config_file_locations(self) -> str:
         return self._config_file
@@ -47,6 +50,81 @@ class Config:
         assert n > 0
         self._config['LOCAL']['task_threads'] = str(n)
 
+    @property
+    def upload_threads(self) -> int:
+        return int(self._config['LOCAL'].get('upload_threads', self.task_threads))
+
+    @upload_threads.setter
+    def upload_threads(self, n: int):
+        assert n > 0
+        self._config['LOCAL']['upload_threads'] = str(n)
+
+    @property
+    def download_threads(self) -> int:
+        return int(self._config['LOCAL'].get('download_threads', self.task_threads))
+
+    @download_threads.setter
+    def download_threads(self, n: int):
+        assert n > 0
+        self._config['LOCAL']['download_threads'] = str(n)
+
+    @property
+    def meta_threads(self) -> int:
+        return int(self._config['LOCAL'].get('meta_threads', self.task_threads))
+
+    @meta_threads.setter
+    def meta_threads(self, n: int):
+        assert n > 0
+        self._config['LOCAL']['meta_threads'] = str(n)
+
+    @property
+    def upload_speed_limit_kb(self) -> int:
+        return int(self._config['LOCAL'].get('upload_speed_limit_kb', 0))
+
+    @upload_speed_limit_kb.setter
+    def upload_speed_limit_kb(self, n: int):
+        assert n >= 0
+        self._config['LOCAL']['upload_speed_limit_kb'] = str(n)
+
+    @property
+    def download_speed_limit_kb(self) -> int:
+        return int(self._config['LOCAL'].get('download_speed_limit_kb', 0))
+
+    @download_speed_limit_kb.setter
+    def download_speed_limit_kb(self, n: int):
+        assert n >= 0
+        self._config['LOCAL']['download_speed_limit_kb'] = str(n)
+
+    @property
+    def upload_window(self) -> str:
+        return self._config['LOCAL'].get('upload_window', '')
+
+    @property
+    def download_window(self) -> str:
+        return self._config['LOCAL'].get('download_window', '')
+
+    @property
+    def meta_window(self) -> str:
+        return self._config['LOCAL'].get('meta_window', '')
+
+    @property
+    def scheduling_policy(self) -> str:
+        return self._config['LOCAL'].get('scheduling_policy', 'fifo')
+
+    @scheduling_policy.setter
+    def scheduling_policy(self, s: str):
+        assert s in ('fifo', 'aging', 'sjf'), s
+        self._config['LOCAL']['scheduling_policy'] = s
+
+    @property
+    def aging_interval(self) -> int:
+        return int(self._config['LOCAL'].get('aging_interval', 600))
+
+    @aging_interval.setter
+    def aging_interval(self, n: int):
+        assert n > 0
+        self._config['LOCAL']['aging_interval'] = str(n)
+
     @property
     def fast_glacier_style_naming(self) -> bool:
         return bool(int(self._config['LOCAL']['fast_glacier_style_naming']) != 0)
@@ -81,16 +159,143 @@ class Config:
         else:
             return os.path.join(self._inventories_dir, and_file)
 
+    def get_packs_location(self, and_file: Optional[str] = None) -> str:
+        """
+        Returns directory where packs are made before uploading.
+        If `and_file` specified, then returns this file from packs directory.
+        """
+        if and_file is None:
+            return self._packs_dir
+        else:
+            return os.path.join(self._packs_dir, and_file)
+
+    def get_archive_cache_location(self) -> str:
+        """Returns directory of local cache of downloaded archives. See `glacier.archive_cache`."""
+        return os.path.join(self._workdir, 'archive_cache')
+
+    @property
+    def archive_cache_mb(self) -> int:
+        """Size of local cache of downloaded archives. 0 disables cache."""
+        return int(self._config['LOCAL'].get('archive_cache_mb', 0))
+
+    @archive_cache_mb.setter
+    def archive_cache_mb(self, n: int):
+        assert n >= 0, n
+        self._config['LOCAL']['archive_cache_mb'] = str(n)
+
+    @property
+    def pack_threshold_kb(self) -> int:
+        """Files smaller than this are packed together. 0 disables packing."""
+        return int(self._config['LOCAL'].get('pack_threshold_kb', 0))
+
+    @pack_threshold_kb.setter
+    def pack_threshold_kb(self, n: int):
+        assert n >= 0, n
+        self._config['LOCAL']['pack_threshold_kb'] = str(n)
+
+    @property
+    def pack_size_mb(self) -> int:
+        return int(self._config['LOCAL'].get('pack_size_mb', 1024))
+
+    @pack_size_mb.setter
+    def pack_size_mb(self, n: int):
+        assert n > 0, n
+        self._config['LOCAL']['pack_size_mb'] = str(n)
+
     @property
-    def chunk_size_mb(self) -> int:
-        return int(self._config['LOCAL']['chunk_size_mb'])
+    def compression(self) -> Optional[str]:
+        """Codec to compress files before upload. None means no compression."""
+        s = self._config['LOCAL'].get('compression', 'none').strip().lower()
+        return None if s in ('', 'none') else s
+
+    @compression.setter
+    def compression(self, codec: Optional[str]):
+        self._config['LOCAL']['compression'] = codec or 'none'
+
+    @property
+    def compression_level(self) -> Optional[int]:
+        """None means default level of codec"""
+        s = self._config['LOCAL'].get('compression_level', '').strip()
+        return int(s) if s else None
+
+    @compression_level.setter
+    def compression_level(self, n: Optional[int]):
+        self._config['LOCAL']['compression_level'] = '' if n is None else str(n)
+
+    @property
+    def chunk_size_mb(self) -> Optional[int]:
+        """None means that part size is chosen automatically for every file"""
+        s = self._config['LOCAL']['chunk_size_mb'].strip()
+        if s.lower() == 'auto':
+            return None
+        return int(s)
 
     @chunk_size_mb.setter
-    def chunk_size_mb(self, i: int):
+    def chunk_size_mb(self, i: Optional[int]):
+        if i is None:
+            self._config['LOCAL']['chunk_size_mb'] = 'auto'
+            return
         assert i > 0, i
         assert is_power_of_two(i), i
         self._config['LOCAL']['chunk_size_mb'] = str(i)
 
+    @property
+    def target_parts_count(self) -> int:
+        return int(self._config['LOCAL'].get('target_parts_count', 64))
+
+    @target_parts_count.setter
+    def target_parts_count(self, n: int):
+        assert 0 < n <= 10000, n
+        self._config['LOCAL']['target_parts_count'] = str(n)
+
+    @property
+    def min_part_size_mb(self) -> int:
+        """For chunk_size_mb = auto. Every part costs request, so parts are not made smaller."""
+        return int(self._config['LOCAL'].get('min_part_size_mb', 8))
+
+    @min_part_size_mb.setter
+    def min_part_size_mb(self, n: int):
+        assert n > 0, n
+        assert is_power_of_two(n), n
+        self._config['LOCAL']['min_part_size_mb'] = str(n)
+
+    @property
+    def single_upload_max_mb(self) -> int:
+        """For chunk_size_mb = auto. Files up to this size are uploaded in one request. 0 disables it."""
+        return int(self._config['LOCAL'].get('single_upload_max_mb', 64))
+
+    @single_upload_max_mb.setter
+    def single_upload_max_mb(self, n: int):
+        assert 0 <= n <= 4096, n
+        self._config['LOCAL']['single_upload_max_mb'] = str(n)
+
+    @property
+    def resume_lost_uploads(self) -> bool:
+        """Look for upload to resume in vault even if there is no local record of it"""
+        return bool(int(self._config['LOCAL'].get('resume_lost_uploads', 1)) != 0)
+
+    @resume_lost_uploads.setter
+    def resume_lost_uploads(self, b: bool):
+        self._config['LOCAL']['resume_lost_uploads'] = "1" if b else "0"
+
+    @property
+    def max_part_seconds(self) -> int:
+        return int(self._config['LOCAL'].get('max_part_seconds', 600))
+
+    @max_part_seconds.setter
+    def max_part_seconds(self, n: int):
+        assert n >= 0, n
+        self._config['LOCAL']['max_part_seconds'] = str(n)
+
+    @property
+    def max_parts_in_queue(self) -> int:
+        return int(self._config['LOCAL'].get('max_parts_in_queue', 8))
+
+    @max_parts_in_queue.setter
+    def max_parts_in_queue(self, n: int):
+        assert n > 0
+        self._config['LOCAL']['max_parts_in_queue'] = str(n)
+
     @property
     def fast_glacier_style_dirs(self) -> bool:
         return bool(int(self._config['LOCAL']['fast_glacier_style_dirs']) != 0)
@@ -1,7 +1,7 @@
 import base64
 import re
 from datetime import datetime
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
 
 class FastGlacierArchiveInfo(NamedTuple):
@@ -9,10 +9,14 @@ class FastGlacierArchiveInfo(NamedTuple):
     name: str
     is_dir: bool
     last_modified: datetime
+    # Not FastGlacier fields. They are there only if archive is compressed before upload.
+    codec: Optional[str] = None
+    original_size: Optional[int] = None
 
 
 def from_fast_glacier(s: str) -> FastGlacierArchiveInfo:
-    r = re.compile(r"^<m><v>(?P<v>.*)</v><p>(?P<p>.*)</p><lm>(?P<lm>.*)</lm></m>$")
+    r = re.compile(r"^<m><v>(?P<v>.*)</v><p>(?P<p>.*)</p><lm>(?P<lm>.*?)</lm>"
+                   r"(?:<c>(?P<c>.*)</c>)?(?:<os>(?P<os>\d*)</os>)?</m>$")
     match = r.match(s)
     assert match.group('v') == '4'
     name = base64.b64decode(match.group('p')).decode('utf8')
@@ -25,11 +29,18 @@ def from_fast_glacier(s: str) -> FastGlacierArchiveInfo:
     if parent:
         parent += "/"
 
-    return FastGlacierArchiveInfo(parent=parent, name=name, is_dir=is_dir, last_modified=dt)
+    original_size = int(match.group('os')) if match.group('os') else None
+    return FastGlacierArchiveInfo(parent=parent, name=name, is_dir=is_dir, last_modified=dt,
+                                  codec=match.group('c'), original_size=original_size)
 
 
 def to_fast_glacier(f: FastGlacierArchiveInfo) -> str:
     path = f.parent + f.name
     p = base64.b64encode(path.encode('utf8')).decode('ascii')
     lm = f.last_modified.strftime("%Y%m%dT%H%M%SZ")
-    return f"<m><v>4</v><p>{p}</p><lm>{lm}</lm></m>"
+    extra = ""
+    if f.codec:
+        extra += f"<c>{f.codec}</c>"
+        if f.original_size is not None:
+            extra += f"<os>{f.original_size}</os>"
+    return f"<m><v>4</v><p>{p}</p><lm>{lm}</lm>{extra}</m>"
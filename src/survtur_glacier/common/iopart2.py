@@ -1,4 +1,5 @@
 import mmap
+import os
 from io import BytesIO, BufferedReader
 from typing import BinaryIO, NamedTuple, Any, Callable, Optional
 
@@ -27,12 +28,15 @@ class BytesIOWithCallback(BytesIO):
 
 class BufferedReaderWithCallback(BufferedReader):
     """
-    Works with opened binary files
+    Works with opened binary files.
+    `throttle` is called with count of bytes read. It may sleep to limit reading speed.
     """
 
     def __init__(self, raw: BinaryIO,
-                 callback: Callable[[ReadProgressInfo], Any]):
+                 callback: Callable[[ReadProgressInfo], Any],
+                 throttle: Optional[Callable[[int], Any]] = None):
         self._callback = callback
+        self._throttle = throttle
         self._total_read = 0
 
         # noinspection PyTypeChecker
@@ -41,6 +45,8 @@ class BufferedReaderWithCallback(BufferedReader):
     def read(self, n=-1):
         chunk = super().read(n)
         self._total_read += len(chunk)
+        if self._throttle:
+            self._throttle(len(chunk))
         if self._callback:
             self._callback(ReadProgressInfo(self.tell(), len(chunk), self._total_read))
         return chunk
@@ -49,13 +55,124 @@ class BufferedReaderWithCallback(BufferedReader):
 class MmapWithReadCallback(mmap.mmap):
 
     callback: Optional[Callable[[ReadProgressInfo], Any]] = None
+    throttle: Optional[Callable[[int], Any]] = None
     total_read: int = 0
 
     def read(self, n: Optional[int] = None) -> bytes:
         data = super().read(n)
+        if self.throttle:
+            self.throttle(len(data))
         if self.callback:
             read_now = len(data)
             self.total_read += read_now
             r = ReadProgressInfo(self.tell(), read=read_now, total_read=self.total_read)
             self.callback(r)
         return data
+
+
+class BufferBody:
+    """
+    Bytes-like object to be used as HTTP request body.
+
+    Unlike `MmapWithReadCallback`, `read()` returns memoryview slices of buffer instead of `bytes` copies,
+    and `readinto()` copies straight to the buffer of caller. So data goes to socket without
+    intermediate copies. Object has `__len__`, so botocore knows its size without reading.
+    """
+
+    def __init__(self, buffer, callback: Optional[Callable[[ReadProgressInfo], Any]] = None,
+                 throttle: Optional[Callable[[int], Any]] = None):
+        self.callback = callback
+        self.throttle = throttle
+        self.total_read = 0
+        self._pos = 0
+        self._closed = False
+        self._view = memoryview(buffer).cast('B')
+
+    def __len__(self):
+        return len(self._view)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _advance(self, n: int) -> int:
+        start = self._pos
+        n = len(self._view) - start if n is None or n < 0 else min(n, len(self._view) - start)
+        self._pos += n
+        if self.throttle:
+            self.throttle(n)
+        self.total_read += n
+        if self.callback:
+            self.callback(ReadProgressInfo(self._pos, read=n, total_read=self.total_read))
+        return start
+
+    def read(self, n: Optional[int] = -1) -> memoryview:
+        start = self._advance(n)
+        return self._view[start:self._pos]
+
+    def readinto(self, b) -> int:
+        start = self._advance(len(b))
+        n = self._pos - start
+        memoryview(b).cast('B')[:n] = self._view[start:self._pos]
+        return n
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._view.release()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+
+class MmapBody(BufferBody):
+    """Read-only region of file to be used as HTTP request body. Data goes from page cache to socket."""
+
+    def __init__(self, fileno: int, offset: int = 0, length: int = 0,
+                 callback: Optional[Callable[[ReadProgressInfo], Any]] = None,
+                 throttle: Optional[Callable[[int], Any]] = None):
+        """
+        :param offset: must be a multiple of `mmap.ALLOCATIONGRANULARITY`
+        :param length: 0 means up to the end of file
+        """
+        try:
+            self._mm: Optional[mmap.mmap] = mmap.mmap(fileno, length, access=mmap.ACCESS_READ, offset=offset)
+        except ValueError:
+            if length != 0 or os.fstat(fileno).st_size != offset:
+                raise
+            # Empty file can not be mapped
+            self._mm = None
+        super().__init__(self._mm if self._mm is not None else b"", callback, throttle)
+
+    def close(self):
+        if self._closed:
+            return
+        super().close()
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # Some slice returned by read() is still alive. Mapping is closed when it is collected.
+                pass
+            self._mm = None
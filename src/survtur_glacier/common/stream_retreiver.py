@@ -7,13 +7,15 @@ from ..common.helpers import KB
 def retrieve_with_progress(body_stream,
                            on_read_callback: Optional[Callable[[int], Any]],
                            interval: Union[int, float] = 0.2,
-                           read_size: int = 512*KB) -> Iterator[bytes]:
+                           read_size: int = 512*KB,
+                           throttle: Optional[Callable[[int], Any]] = None) -> Iterator[bytes]:
     """
     Sequentially read body_stream. Each `interval` of seconds calls `on_read_callback(total_read_bytes)`.
     :param body_stream: Stream to read
     :param on_read_callback:
     :param interval: Min interval between progress callbacks.
     :param read_size: Size of a read iteration
+    :param throttle: Called with size of every read. May sleep to limit reading speed.
     :return:
     """
 
@@ -29,6 +31,8 @@ def retrieve_with_progress(body_stream,
         if not read:
             break
         total_read += len(read)
+        if throttle:
+            throttle(len(read))
         if on_read_callback:
             now = datetime.now()
             if (now - last_progress).total_seconds() > interval:
@@ -0,0 +1,149 @@
+import logging
+import os
+import queue
+import threading
+from typing import NamedTuple, Iterator, Iterable, List, Optional, Dict
+
+_logger = logging.getLogger(__name__)
+
+_CHUNK = 1000
+"""Entries go from scanning threads to consumer by chunks, not one by one"""
+
+
+class ScanEntry(NamedTuple):
+    path: str
+    is_dir: bool
+    is_link: bool
+    size: int
+    modified_timestamp: float
+    empty: bool = False
+    """Directory has no files and subdirectories. Symlinks are not counted."""
+
+
+class ScanTotals:
+    """
+    Counters of scanned entries. Updated by one thread, read by any.
+    `smaller_than` counts files smaller than each of `small_sizes`.
+    """
+
+    def __init__(self, small_sizes: Iterable[int] = ()):
+        self.files = 0
+        self.dirs = 0
+        self.links = 0
+        self.size = 0
+        self.smaller_than: Dict[int, int] = {s: 0 for s in small_sizes}
+        self.done = False
+
+    def add(self, e: ScanEntry):
+        if e.is_link:
+            self.links += 1
+        elif e.is_dir:
+            self.dirs += 1
+        else:
+            self.files += 1
+            self.size += e.size
+            for s in self.smaller_than:
+                if e.size < s:
+                    self.smaller_than[s] += 1
+
+
+def _entry_of(path: str) -> ScanEntry:
+    st = os.stat(path, follow_symlinks=False)
+    return ScanEntry(path, False, os.path.islink(path), st.st_size, st.st_mtime)
+
+
+def scan_tree(roots: Iterable[str], threads: int = 8) -> Iterator[ScanEntry]:
+    """
+    Yields entries of `roots` and everything inside them. Symlinks are yielded, but not followed.
+
+    Directories are listed with `os.scandir` by `threads` threads, so slow disks and network shares
+    are read in parallel. Nothing is collected: entries are yielded as soon as they are found,
+    and scanning waits while consumer is behind. Directory is yielded after its content is listed,
+    so it is known whether it is empty. Order of entries is not defined.
+    Unreadable directories are logged and skipped.
+    """
+    out: 'queue.Queue[Optional[List[ScanEntry]]]' = queue.Queue(maxsize=100)
+    work: 'queue.Queue[Optional[str]]' = queue.Queue()
+    stop = threading.Event()
+    lock = threading.Lock()
+    pending = 0
+
+    def put_out(chunk: Optional[List[ScanEntry]]):
+        while not stop.is_set():
+            try:
+                out.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def add_dir(path: str):
+        nonlocal pending
+        with lock:
+            pending += 1
+        work.put(path)
+
+    def scan_dir(path: str):
+        chunk: List[ScanEntry] = []
+        has_content = False
+        try:
+            with os.scandir(path) as it:
+                for e in it:
+                    try:
+                        # Type is known from directory listing. Only files need stat() call.
+                        if e.is_symlink():
+                            chunk.append(ScanEntry(e.path, False, True, 0, 0))
+                        elif e.is_dir(follow_symlinks=False):
+                            has_content = True
+                            add_dir(e.path)
+                        else:
+                            st = e.stat(follow_symlinks=False)
+                            has_content = True
+                            chunk.append(ScanEntry(e.path, False, False, st.st_size, st.st_mtime))
+                    except OSError as err:
+                        _logger.warning(f"Skipping {e.path}: {err}")
+                    if len(chunk) >= _CHUNK:
+                        put_out(chunk)
+                        chunk = []
+        except OSError as err:
+            _logger.warning(f"Can't list {path}: {err}")
+        chunk.append(ScanEntry(path, True, False, 0, 0, empty=not has_content))
+        put_out(chunk)
+
+    def worker():
+        nonlocal pending
+        while True:
+            path = work.get()
+            if path is None:
+                return
+            if not stop.is_set():
+                scan_dir(path)
+            with lock:
+                pending -= 1
+                finished = pending == 0
+            if finished:
+                put_out(None)
+
+    files: List[ScanEntry] = []
+    for r in roots:
+        if os.path.isdir(r) and not os.path.islink(r):
+            add_dir(r)
+        elif os.path.lexists(r):
+            files.append(_entry_of(r))
+    yield from files
+    if not pending:
+        return
+
+    workers = [threading.Thread(target=worker, name="tree-scan", daemon=True) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    try:
+        while True:
+            chunk = out.get()
+            if chunk is None:
+                break
+            yield from chunk
+    finally:
+        # Consumer may stop early. Then waiting threads are released too.
+        stop.set()
+        for _ in workers:
+            work.put(None)
@@ -0,0 +1,118 @@
+import logging
+import os
+import sqlite3
+import stat
+import time
+from typing import Optional
+
+from ..common.file_copy import reflink_or_copy
+
+_logger = logging.getLogger(__name__)
+
+
+class ArchiveCache:
+    """
+    Local copies of downloaded archives, keyed by tree hash of archive as it is in inventory.
+    Archive that is cached is restored from disk instead of Glacier.
+
+    Cached files are read-only. Least recently used ones are removed when cache grows over `max_bytes`.
+    Cache is shared by all task processes: index is SQLite database, files are put by atomic rename.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "cache.db"), timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS "archives" (
+                "sha256" TEXT NOT NULL PRIMARY KEY,
+                "size" INTEGER NOT NULL,
+                "last_used" REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS last_used_index ON archives (last_used)")
+        self._db.commit()
+
+    def _file(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, sha256[:2], sha256)
+
+    def get(self, sha256: str) -> Optional[str]:
+        """Cached file of archive. None if it is not cached."""
+        row = self._db.execute("SELECT size FROM archives WHERE sha256=?", (sha256,)).fetchone()
+        if row is None:
+            return None
+        file = self._file(sha256)
+        try:
+            ok = os.path.getsize(file) == row[0]
+        except OSError:
+            ok = False
+        if not ok:
+            _logger.warning(f"Cached archive {sha256} is missing or broken. Forgetting it.")
+            self._remove(sha256)
+            return None
+        self._db.execute("UPDATE archives SET last_used=? WHERE sha256=?", (time.time(), sha256))
+        self._db.commit()
+        return file
+
+    def materialize(self, sha256: str, save_file: str) -> bool:
+        """
+        Makes `save_file` with content of cached archive. Reflink is used if file system can, otherwise copy.
+        Not hardlink: user may change restored file, and cached one would change too.
+        Returns False if archive is not cached.
+        """
+        file = self.get(sha256)
+        if file is None:
+            return False
+        try:
+            how = reflink_or_copy(file, save_file)
+        except FileNotFoundError:
+            # Evicted by other process just now
+            return False
+        _logger.info(f"{save_file} is restored from cache by {how}")
+        return True
+
+    def put(self, sha256: str, file: str):
+        """Copies `file` to cache. Least recently used archives are removed, if cache is too big."""
+        size = os.path.getsize(file)
+        if size > self.max_bytes or self.get(sha256) is not None:
+            return
+        cached = self._file(sha256)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        temp_file = f"{cached}.{os.getpid()}.tmp"
+        try:
+            # Not hardlink: user may change downloaded file, and cached one would change too
+            reflink_or_copy(file, temp_file)
+            os.chmod(temp_file, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(temp_file, cached)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        self._db.execute("""INSERT INTO archives (sha256, size, last_used) VALUES (?, ?, ?)
+                            ON CONFLICT (sha256) DO UPDATE SET size=excluded.size, last_used=excluded.last_used""",
+                         (sha256, size, time.time()))
+        self._db.commit()
+        self._evict()
+
+    def _evict(self):
+        total = self._db.execute("SELECT TOTAL(size) FROM archives").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for sha256, size in self._db.execute("SELECT sha256, size FROM archives ORDER BY last_used").fetchall():
+            self._remove(sha256)
+            _logger.debug(f"Archive {sha256} is evicted from cache")
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def _remove(self, sha256: str):
+        self._db.execute("DELETE FROM archives WHERE sha256=?", (sha256,))
+        self._db.commit()
+        try:
+            os.remove(self._file(sha256))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self._db.close()
+
@@ -0,0 +1,64 @@
+from typing import Tuple
+
+from ..common.helpers import MB
+
+ByteRange = Tuple[int, int]
+"""First and last byte, inclusive. As `RetrievalByteRange` of archive retrieval job."""
+
+
+def _check(offset: int, size: int, archive_size: int):
+    assert size > 0, size
+    assert 0 <= offset and offset + size <= archive_size, (offset, size, archive_size)
+
+
+def mb_aligned_range(offset: int, size: int, archive_size: int) -> ByteRange:
+    """
+    Returns the smallest range that contains `size` bytes from `offset` and may be retrieved by Glacier.
+    Range starts at megabyte boundary and ends at megabyte boundary or at the end of archive.
+    """
+    _check(offset, size, archive_size)
+    start = offset // MB * MB
+    end = min(-(-(offset + size) // MB) * MB, archive_size)
+    return start, end - 1
+
+
+def tree_hash_aligned_range(offset: int, size: int, archive_size: int) -> ByteRange:
+    """
+    Like `mb_aligned_range()`, but range is also aligned to tree hash:
+    it is `2^n` megabytes that start at multiple of `2^n` megabytes. Or it is cut by the end of archive.
+    Glacier gives sha256 tree hash for such ranges, so retrieved data can be verified.
+    Range is not limited in size: few bytes around `2^n` megabytes boundary make range of `2^(n+1)` megabytes.
+    See `retrieval_range()`.
+    """
+    _check(offset, size, archive_size)
+    first_mb = offset // MB
+    last_mb = (offset + size - 1) // MB
+    n = 0
+    while first_mb >> n != last_mb >> n:
+        n += 1
+    start = (first_mb >> n << n) * MB
+    end = min(start + (MB << n), archive_size)
+    return start, end - 1
+
+
+def retrieval_range(offset: int, size: int, archive_size: int, max_growth: float = 2) -> ByteRange:
+    """
+    Range to retrieve `size` bytes from `offset`. Tree hash aligned one, if it is no more than `max_growth` times
+    bigger than megabyte aligned one. Otherwise megabyte aligned one, that is retrieved without tree hash.
+    """
+    mb_start, mb_end = mb_aligned_range(offset, size, archive_size)
+    start, end = tree_hash_aligned_range(offset, size, archive_size)
+    if end - start + 1 <= max_growth * (mb_end - mb_start + 1):
+        return start, end
+    return mb_start, mb_end
+
+
+def is_tree_hash_aligned(r: ByteRange, archive_size: int) -> bool:
+    start, end = r
+    length = end - start + 1
+    if start % MB or length <= 0:
+        return False
+    block_mb = 1
+    while block_mb * MB < length:
+        block_mb *= 2
+    return start % (block_mb * MB) == 0 and (length == block_mb * MB or end == archive_size - 1)
@@ -0,0 +1,73 @@
+import itertools
+from typing import NamedTuple, List, Iterator, Dict, Iterable, Tuple
+
+from .inventory import Inventory, ArchiveInfo
+
+
+class DuplicateGroup(NamedTuple):
+    sha256: str
+    size: int
+    archives: List[ArchiveInfo]
+    """The oldest upload first"""
+
+    @property
+    def wasted(self) -> int:
+        return self.size * (len(self.archives) - 1)
+
+    def redundant(self) -> List[ArchiveInfo]:
+        """All copies but the oldest one"""
+        return self.archives[1:]
+
+
+def duplicate_groups(inventory: Inventory) -> Iterator[DuplicateGroup]:
+    """Groups of archives with the same content. Groups that waste the most go first."""
+    for (sha256, size), archives in itertools.groupby(inventory.find_duplicates(), lambda a: (a['sha256'], a['size'])):
+        yield DuplicateGroup(sha256, size, list(archives))
+
+
+class DedupReport:
+    """Totals of duplicate groups. Redundant copies are counted in folders they are in."""
+
+    def __init__(self):
+        self.groups = 0
+        self.redundant_copies = 0
+        self.wasted = 0
+        self.wasted_by_folder: Dict[str, int] = {}
+
+    def add(self, g: DuplicateGroup):
+        self.groups += 1
+        self.wasted += g.wasted
+        for a in g.redundant():
+            self.redundant_copies += 1
+            self.wasted_by_folder[a['parent']] = self.wasted_by_folder.get(a['parent'], 0) + g.size
+
+    def top_folders(self, n: int) -> List[Tuple[str, int]]:
+        """(folder, wasted bytes) of `n` most wasteful folders"""
+        return sorted(self.wasted_by_folder.items(), key=lambda x: x[1], reverse=True)[:n]
+
+
+class DownloadGroup(NamedTuple):
+    source: ArchiveInfo
+    """The only one to be downloaded"""
+    copies: List[ArchiveInfo]
+    """Archives of the same content. They are copied from downloaded source."""
+
+
+def download_groups(archives: Iterable[ArchiveInfo]) -> List[DownloadGroup]:
+    """Archives to download, grouped by content, in order of the first one of group. Folders are skipped."""
+    groups: Dict[str, DownloadGroup] = {}
+    for a in archives:
+        if a['is_dir']:
+            continue
+        g = groups.get(a['sha256'])
+        if g is None:
+            groups[a['sha256']] = DownloadGroup(a, [])
+        else:
+            g.copies.append(a)
+    return list(groups.values())
+
+
+def check_selection(group: DuplicateGroup, selected_archive_ids: Iterable[str]) -> bool:
+    """True if at least one copy of group is not selected. The last copy must never be removed."""
+    selected = set(selected_archive_ids)
+    return any(a['archive_id'] not in selected for a in group.archives)
@@ -0,0 +1,53 @@
+import sqlite3
+from typing import Optional, Callable, Any
+
+from .hasher import sha256_tree_hash_hex
+
+
+class HashCache:
+    """
+    Tree hashes of local files. Hash is valid while file has the same size and modification time.
+    So unchanged file is hashed once, no matter how many times it is compared with inventory.
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._db = sqlite3.connect(db_file, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS "tree_hashes" (
+                "path" TEXT NOT NULL PRIMARY KEY,
+                "size" INTEGER NOT NULL,
+                "modified_timestamp" REAL NOT NULL,
+                "sha256" TEXT NOT NULL
+            )""")
+        self._db.commit()
+
+    def get(self, path: str, size: int, modified_timestamp: float) -> Optional[str]:
+        row = self._db.execute("SELECT sha256 FROM tree_hashes WHERE path=? AND size=? AND modified_timestamp=?",
+                               (path, size, modified_timestamp)).fetchone()
+        return row[0] if row else None
+
+    def put(self, path: str, size: int, modified_timestamp: float, sha256: str):
+        self._db.execute("""INSERT INTO tree_hashes (path, size, modified_timestamp, sha256) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (path) DO UPDATE
+                            SET size=excluded.size, modified_timestamp=excluded.modified_timestamp,
+                                sha256=excluded.sha256""",
+                         (path, size, modified_timestamp, sha256))
+
+    def tree_hash(self, path: str, size: int, modified_timestamp: float,
+                  progress_cb: Optional[Callable[[int], Any]] = None) -> str:
+        """Returns cached hash. Or hashes the file and caches it."""
+        sha256 = self.get(path, size, modified_timestamp)
+        if sha256 is None:
+            with open(path, mode='br') as f:
+                sha256, _ = sha256_tree_hash_hex(f, 256, progress_cb=progress_cb)
+            self.put(path, size, modified_timestamp, sha256)
+        return sha256
+
+    def save(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
@@ -24,6 +24,53 @@ def sha256_tree_hash_hex(readable_io: Union[BinaryIO, BytesIO], chunk_size_mb: i
     return one.hex(), tuple((h.hex() for h in many))
 
 
+def sha256_tree_and_linear_hashes_hex(readable_io: Union[BinaryIO, BytesIO], chunk_size_mb: int,
+                                      progress_cb: Optional[Callable[[int], Any]] = None
+                                      ) -> Tuple[str, Tuple[str], Tuple[str]]:
+    """
+    Same as `sha256_tree_hash_hex()`, but also returns plain sha256 of every chunk. In the same single read.
+    Plain sha256 is required to sign upload request. So it is not calculated again while uploading.
+    :return: tree_hash of whole file, tree hashes of its chunks and plain hashes of its chunks
+    """
+    one, many, linear = _sha256_hashes(readable_io, chunk_size_mb, progress_cb, with_linear=True)
+    return one.hex(), tuple((h.hex() for h in many)), tuple((h.hex() for h in linear))
+
+
+def sha256_tree_and_linear_hash_of_buffer_hex(buffer) -> Tuple[str, str]:
+    """Tree hash and plain sha256 of bytes-like object. Buffer is hashed in place, without copying."""
+    view = memoryview(buffer).cast('B')
+    linear = hashlib.sha256(view)
+    chunk_hashes = [hashlib.sha256(view[i:i + MB]).digest() for i in range(0, len(view), MB)]
+    if not chunk_hashes:
+        chunk_hashes = [hashlib.sha256(b'').digest()]
+    return _tree_hash_of_hashes(chunk_hashes).hex(), linear.hexdigest()
+
+
+def sha256_tree_hash_of_parts_hex(part_hashes: List[str]) -> str:
+    """Tree hash of whole archive from tree hashes of its parts. Parts must be power of two megabytes."""
+    return _tree_hash_of_hashes([bytes.fromhex(h) for h in part_hashes]).hex()
+
+
+class TreeHasher:
+    """Calculates sha256 tree hash of data that comes by pieces, like downloaded stream."""
+
+    def __init__(self):
+        self._chunk_hashes: List[bytes] = []
+        self._pending = bytearray()
+
+    def update(self, data: bytes):
+        self._pending += data
+        while len(self._pending) >= MB:
+            self._chunk_hashes.append(hashlib.sha256(memoryview(self._pending)[:MB]).digest())
+            del self._pending[:MB]
+
+    def hexdigest(self) -> str:
+        hashes = self._chunk_hashes.copy()
+        if self._pending or not hashes:
+            hashes.append(hashlib.sha256(self._pending).digest())
+        return _tree_hash_of_hashes(hashes).hex()
+
+
 def sha256_tree_hash(readable_io: Union[BinaryIO, BytesIO], chunk_size_mb: int,
                      progress_cb: Optional[Callable[[int], Any]] = None) -> Tuple[bytes, Tuple[bytes]]:
     """
@@ -33,6 +80,14 @@ def sha256_tree_hash(readable_io: Union[BinaryIO, BytesIO], chunk_size_mb: int,
     :param chunk_size_mb:
     :return:
     """
+    one, many, _ = _sha256_hashes(readable_io, chunk_size_mb, progress_cb, with_linear=False)
+    return one, many
+
+
+def _sha256_hashes(readable_io: Union[BinaryIO, BytesIO], chunk_size_mb: int,
+                   progress_cb: Optional[Callable[[int], Any]],
+                   with_linear: bool) -> Tuple[bytes, Tuple[bytes], Tuple[bytes]]:
+    """Tree hash of whole file, tree hashes of chunks and, if `with_linear`, plain sha256 of chunks"""
 
     assert is_power_of_two(chunk_size_mb)
 
@@ -40,6 +95,8 @@ def sha256_tree_hash(readable_io: Union[BinaryIO, BytesIO], chunk_size_mb: int,
 
     this_chunk_hashes: List[bytes] = []
     all_hashes: List[bytes] = []
+    linear_hashes: List[bytes] = []
+    linear = hashlib.sha256()
     total_bytes_read = 0
     readable_io.seek(0)
 
@@ -55,17 +112,26 @@ def sha256_tree_hash(readable_io: Union[BinaryIO, BytesIO], chunk_size_mb: int,
             break
 
         this_chunk_hashes.append(hashlib.sha256(b).digest())
+        if with_linear:
+            linear.update(b)
         if len(this_chunk_hashes) == chunk_size_mb:
             all_hashes.append(_tree_hash_of_hashes(this_chunk_hashes))
             this_chunk_hashes = []
+            if with_linear:
+                linear_hashes.append(linear.digest())
+                linear = hashlib.sha256()
 
     if this_chunk_hashes:
         all_hashes.append(_tree_hash_of_hashes(this_chunk_hashes))
+        if with_linear:
+            linear_hashes.append(linear.digest())
 
     if total_bytes_read == 0:
         all_hashes = [hashlib.sha256(b'').digest()]
+        if with_linear:
+            linear_hashes = [hashlib.sha256(b'').digest()]
 
-    return _tree_hash_of_hashes(all_hashes), tuple(all_hashes)
+    return _tree_hash_of_hashes(all_hashes), tuple(all_hashes), tuple(linear_hashes)
 
 
 def _tree_hash_of_hashes(hashes: List[bytes]) -> bytes:
@@ -1,12 +1,29 @@
 import datetime
-import os.path
 import secrets
 import sqlite3
 import threading
-from typing import Iterator, Union, TypedDict, Optional, List
+from typing import Iterator, Union, TypedDict, Optional, List, Iterable, Tuple, Dict, Set
 
+from .pack import PackMember
 
-class ArchiveInfo(TypedDict):
+_NAMES_PER_QUERY = 900
+"""Old SQLite allows no more than 999 parameters in query"""
+
+_SCHEMA_VERSION = 1
+"""Stored as `PRAGMA user_version`. Increase it when tables, indexes or `entries` view change."""
+
+
+class _PackMemberInfoDict(TypedDict, total=False):
+    # Only files packed into pack have them. Then `archive_id` is id of the pack.
+    member_offset: Optional[int]
+    pack_size: Optional[int]
+    # Only archives compressed before upload have them. See `common.compression`.
+    # Then `size` and `sha256` are of compressed content.
+    codec: Optional[str]
+    original_size: Optional[int]
+
+
+class ArchiveInfo(_PackMemberInfoDict):
     archive_id: str
     parent: str
     name: str
@@ -21,46 +38,110 @@ class Inventory:
 
     def __init__(self, db_file: str):
         self._db_file: str = db_file
-        exists = os.path.isfile(self.db_file)
         self._db = sqlite3.connect(self.db_file)
         with threading.Lock():
-            if not exists:
-                self._db.executescript("""
-                    BEGIN TRANSACTION;
-                    CREATE TABLE IF NOT EXISTS "meta" (
-                        "name"	TEXT NOT NULL PRIMARY KEY,
-                        "value"	TEXT NOT NULL
-                    );
-                    CREATE TABLE IF NOT EXISTS "archives" (
-                        "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
-                        "archive_id" TEXT NOT NULL UNIQUE,
-                        "parent" TEXT NOT NULL,
-                        "name" TEXT NOT NULL,
-                        "name_search" TEXT NOT NULL,
-                        "upload_timestamp" NUMERIC,
-                        "modified_timestamp" NUMERIC,
-                        "sha256" TEXT NOT NULL,
-                        "size" INTEGER,
-                        "is_dir" INTEGER NOT NULL
-                    );
-                    CREATE INDEX IF NOT EXISTS "is_dir_index" ON "archives" (
-                        "is_dir" ASC
-                    );
-                    CREATE INDEX IF NOT EXISTS "SHA256TreeHash_index" ON "archives" (
-                        "sha256" ASC
-                    );
-                    CREATE INDEX IF NOT EXISTS "parent_index" ON "archives" (
-                        "parent" ASC
-                    );
-                    CREATE INDEX IF NOT EXISTS "name_index" ON "archives" (
-                        "name" ASC
-                    );
-                  
-                    COMMIT;
-                    """)
+            # Inventory is opened by many task processes. Schema is changed only once per version.
+            if self._db.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                self._upgrade_schema()
         self._db.row_factory = sqlite3.Row
         self._fix_non_existing_parents()
 
+    def _upgrade_schema(self):
+        """Creates or migrates everything in one transaction. Version is checked again after lock is taken."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            if self._db.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                self._create_archives_table()
+                self._add_compression_columns()
+                self._create_members_table()
+                self._create_deleted_archives_table()
+                self._db.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _create_archives_table(self):
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS "meta" (
+                "name"	TEXT NOT NULL PRIMARY KEY,
+                "value"	TEXT NOT NULL
+            )""")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS "archives" (
+                "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+                "archive_id" TEXT NOT NULL UNIQUE,
+                "parent" TEXT NOT NULL,
+                "name" TEXT NOT NULL,
+                "name_search" TEXT NOT NULL,
+                "upload_timestamp" NUMERIC,
+                "modified_timestamp" NUMERIC,
+                "sha256" TEXT NOT NULL,
+                "size" INTEGER,
+                "is_dir" INTEGER NOT NULL
+            )""")
+        self._db.execute('CREATE INDEX IF NOT EXISTS "is_dir_index" ON "archives" ("is_dir" ASC)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS "SHA256TreeHash_index" ON "archives" ("sha256" ASC)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS "parent_index" ON "archives" ("parent" ASC)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS "name_index" ON "archives" ("name" ASC)')
+
+    def _add_compression_columns(self):
+        columns = [r[1] for r in self._db.execute("PRAGMA table_info(archives)")]
+        if "codec" not in columns:
+            self._db.execute('ALTER TABLE archives ADD COLUMN "codec" TEXT')
+        if "original_size" not in columns:
+            self._db.execute('ALTER TABLE archives ADD COLUMN "original_size" INTEGER')
+
+    def _create_members_table(self):
+        """
+        Files that are packed into packs. See `glacier.pack`.
+        Member is linked with pack by sha256 of pack. So members are kept when inventory is updated,
+        and members are shown only while their pack is in inventory.
+        """
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS "members" (
+                "id" INTEGER NOT NULL PRIMARY KEY,
+                "pack_sha256" TEXT NOT NULL,
+                "parent" TEXT NOT NULL,
+                "name" TEXT NOT NULL,
+                "name_search" TEXT NOT NULL,
+                "offset" INTEGER NOT NULL,
+                "size" INTEGER NOT NULL,
+                "sha256" TEXT NOT NULL,
+                "modified_timestamp" NUMERIC,
+                UNIQUE ("pack_sha256", "offset")
+            )""")
+        self._db.execute('CREATE INDEX IF NOT EXISTS "members_parent_index" ON "members" ("parent" ASC)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS "members_sha256_index" ON "members" ("sha256" ASC)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS "members_parent_name_index" ON "members" '
+                         '("parent" ASC, "name" ASC)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS "parent_name_index" ON "archives" ("parent" ASC, "name" ASC)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS "sha256_size_index" ON "archives" '
+                         '("sha256" ASC, "size" ASC, "is_dir" ASC)')
+        self._db.execute('DROP VIEW IF EXISTS "entries"')
+        self._db.execute("""
+            CREATE VIEW "entries" AS
+                SELECT archive_id, parent, name, name_search, upload_timestamp, modified_timestamp,
+                       sha256, size, is_dir, NULL AS member_offset, NULL AS pack_size, codec, original_size
+                FROM archives
+                UNION ALL
+                SELECT a.archive_id, m.parent, m.name, m.name_search, a.upload_timestamp, m.modified_timestamp,
+                       m.sha256, m.size, 0 AS is_dir, m.offset AS member_offset, a.size AS pack_size,
+                       NULL AS codec, NULL AS original_size
+                FROM members m
+                JOIN archives a ON a.id = (SELECT MIN(id) FROM archives WHERE sha256=m.pack_sha256 AND is_dir=0)""")
+
+    def _create_deleted_archives_table(self):
+        """
+        Archives deleted from vault. Vault inventory is up to a day old, so it may still list them.
+        They are kept here till inventory does not list them any more. See `confirm_deletes()`.
+        """
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS "deleted_archives" (
+                "archive_id" TEXT NOT NULL PRIMARY KEY,
+                "deleted_timestamp" NUMERIC NOT NULL
+            )""")
+
     @property
     def db_file(self) -> str:
         return self._db_file
@@ -73,9 +154,10 @@ class Inventory:
         self._db.execute("""
                             INSERT INTO archives
                                 (archive_id, parent, name, upload_timestamp, modified_timestamp,
-                                 sha256, size, is_dir, name_search)
+                                 sha256, size, is_dir, name_search, codec, original_size)
                                 VALUES
-                                (:aid,     :p,     :n,   :u,          :t,             :sha,  :s,     :i, :ns)""",
+                                (:aid,     :p,     :n,   :u,          :t,             :sha,  :s,     :i, :ns,
+                                 :c, :os)""",
                          {
                              "aid": a['archive_id'],
                              "p": a['parent'],
@@ -85,9 +167,53 @@ class Inventory:
                              "sha": a['sha256'],
                              "s": a['size'],
                              "i": int(a['is_dir']),
-                             "ns": a['name'].upper()
+                             "ns": a['name'].upper(),
+                             "c": a.get('codec'),
+                             "os": a.get('original_size')
                          })
 
+    def put_dirs(self, dirs: Iterable[Tuple[str, str]]):
+        """
+        Puts virtual directories of (parent, name) at once. Existing ones are skipped.
+        They are kept only while there is something inside. See `_fix_non_existing_parents`.
+        """
+        existing = set(self._db.execute("SELECT parent, name FROM archives WHERE is_dir=1"))
+        for parent, name in dirs:
+            if (parent, name) in existing:
+                continue
+            existing.add((parent, name))
+            self._put_archive(self._virtual_dir(parent, name))
+        self._fix_non_existing_parents()
+
+    def put_members(self, pack_sha256: str, members: List[PackMember]):
+        self._db.executemany("""
+                            INSERT INTO members
+                                (pack_sha256, parent, name, name_search, offset, size, sha256, modified_timestamp)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                ON CONFLICT (pack_sha256, offset) DO NOTHING""",
+                             ((pack_sha256, m.parent, m.name, m.name.upper(), m.offset, m.size, m.sha256,
+                               m.modified_timestamp) for m in members))
+        self._fix_non_existing_parents()
+
+    def remove_archives(self, archive_ids: List[str]):
+        """Removes deleted archives. All at once, in one transaction."""
+        now = datetime.datetime.now().timestamp()
+        with self._db:
+            self._db.executemany("DELETE FROM archives WHERE archive_id=?", ((i,) for i in archive_ids))
+            self._db.executemany("""INSERT INTO deleted_archives (archive_id, deleted_timestamp) VALUES (?, ?)
+                                    ON CONFLICT (archive_id) DO UPDATE
+                                    SET deleted_timestamp=excluded.deleted_timestamp""",
+                                 ((i, now) for i in archive_ids))
+
+    def deleted_archive_ids(self) -> Set[str]:
+        return {row[0] for row in self._db.execute("SELECT archive_id FROM deleted_archives")}
+
+    def confirm_deletes(self, still_listed: Set[str]):
+        """Forgets deleted archives that are not listed by vault inventory any more"""
+        pending = self.deleted_archive_ids()
+        self._db.executemany("DELETE FROM deleted_archives WHERE archive_id=?",
+                             ((i,) for i in pending - still_listed))
+
     def save(self):
         self._db.commit()
 
@@ -136,7 +262,7 @@ class Inventory:
         order = "ASC" if asc else "DESC"
         upper = like.upper()
         # noinspection SqlResolve
-        cur = self._db.execute(f"SELECT * FROM archives WHERE name_search LIKE ? ESCAPE ?" +
+        cur = self._db.execute(f"SELECT * FROM entries WHERE name_search LIKE ? ESCAPE ?" +
                                f"ORDER BY is_dir DESC, name, `{sort_by}` {order}",
                                (upper, escape))
         for row in cur:
@@ -146,7 +272,7 @@ class Inventory:
         assert self._is_column_exists(sort_by)
         order = "ASC" if asc else "DESC"
         # noinspection SqlResolve
-        cur = self._db.execute(f"SELECT * FROM archives WHERE parent=? ORDER BY is_dir DESC, `{sort_by}` {order}",
+        cur = self._db.execute(f"SELECT * FROM entries WHERE parent=? ORDER BY is_dir DESC, `{sort_by}` {order}",
                                (parent,))
         for row in cur:
             yield dict(row)
@@ -168,18 +294,61 @@ class Inventory:
 
         where_str = " AND ".join(where)
 
-        query = f"SELECT * FROM archives WHERE {where_str}"
+        query = f"SELECT * FROM entries WHERE {where_str}"
         cur = self._db.execute(query, {"size": size, "sha256": sha256_tree_hash})
         for row in cur:
             yield dict(row)
 
+    def find_paths(self, paths: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[ArchiveInfo]]:
+        """
+        Looks for many (parent, name) at once. Returns found files by (parent, name).
+        Inventory may have several archives of the same path.
+        """
+        by_parent: Dict[str, List[str]] = {}
+        for parent, name in paths:
+            by_parent.setdefault(parent, []).append(name)
+
+        found: Dict[Tuple[str, str], List[ArchiveInfo]] = {}
+        for parent, names in by_parent.items():
+            for i in range(0, len(names), _NAMES_PER_QUERY):
+                chunk = names[i:i + _NAMES_PER_QUERY]
+                # Condition on is_dir would make SQLite prefer is_dir_index to (parent, name) index.
+                # Names of directories end with "/", so they are not found anyway.
+                # noinspection SqlResolve
+                cur = self._db.execute(f"SELECT * FROM entries WHERE parent=? AND name IN "
+                                       f"({','.join('?' * len(chunk))})", [parent, *chunk])
+                for row in cur:
+                    found.setdefault((parent, row['name']), []).append(dict(row))
+        return found
+
+    def find_duplicates(self) -> Iterator[ArchiveInfo]:
+        """
+        Archives of the same content as some other archives. Packed files are not there.
+        Archives of the same content go one after another, the oldest upload first.
+        Groups that waste the most go first.
+        """
+        # "+is_dir" keeps SQLite from using is_dir_index. Groups are read from sha256_size_index only.
+        # noinspection SqlResolve
+        cur = self._db.execute("""
+            WITH duplicates AS (
+                SELECT sha256, size, (COUNT(*) - 1) * size AS wasted FROM archives
+                WHERE +is_dir=0
+                GROUP BY sha256, size
+                HAVING COUNT(*) > 1
+            )
+            SELECT a.* FROM duplicates d
+            JOIN archives a ON a.sha256=d.sha256 AND a.size=d.size AND +a.is_dir=0
+            ORDER BY d.wasted DESC, d.sha256, d.size, a.upload_timestamp, a.id""")
+        for row in cur:
+            yield dict(row)
+
     def _is_column_exists(self, name: str) -> bool:
         # noinspection SqlResolve
         cur = self._db.execute("SELECT COUNT(*) FROM pragma_table_info('archives') where name=?", (name,))
         return bool(cur.fetchone()[0])
 
     def _fix_non_existing_parents(self):
-        cur = self._db.execute("SELECT DISTINCT(parent) FROM archives WHERE parent!=''")
+        cur = self._db.execute("SELECT DISTINCT(parent) FROM entries WHERE parent!=''")
         parents_to_check: List[str] = [row[0] for row in cur]
         while parents_to_check:
             p = parents_to_check.pop()
@@ -197,17 +366,20 @@ class Inventory:
             if found:
                 continue
 
-            urlsafe = secrets.token_urlsafe()
-            virtual_dir = ArchiveInfo(
-                archive_id="VIRTUAL_DIR " + urlsafe,
-                parent=its_parent,
-                name=its_name,
-                upload_timestamp=0,
-                modified_timestamp=0,
-                sha256="VIRTUAL_DIR " + urlsafe,
-                size=None,
-                is_dir=True
-            )
-            self._put_archive(virtual_dir)
+            self._put_archive(self._virtual_dir(its_parent, its_name))
             if its_parent != "":
                 parents_to_check.append(its_parent)
+
+    @staticmethod
+    def _virtual_dir(parent: str, name: str) -> ArchiveInfo:
+        urlsafe = secrets.token_urlsafe()
+        return ArchiveInfo(
+            archive_id="VIRTUAL_DIR " + urlsafe,
+            parent=parent,
+            name=name,
+            upload_timestamp=0,
+            modified_timestamp=0,
+            sha256="VIRTUAL_DIR " + urlsafe,
+            size=None,
+            is_dir=True
+        )
@@ -0,0 +1,135 @@
+import json
+import os
+import struct
+from io import BytesIO
+from typing import NamedTuple, List, BinaryIO, Iterable, Tuple, Optional, Callable, Any, Iterator, TypeVar
+
+from .hasher import sha256_tree_hash_hex
+
+_T = TypeVar('_T')
+
+PACK_MAGIC = b"SVPK"
+PACK_VERSION = 1
+PACKS_FOLDER = ".packs/"
+"""Inventory folder where packs are uploaded to."""
+
+_TRAILER = struct.Struct("<4sIQ")
+
+
+class PackFormatError(ValueError):
+    pass
+
+
+class PackMember(NamedTuple):
+    parent: str
+    name: str
+    offset: int
+    size: int
+    sha256: str
+    """sha256 tree hash of member content. The same as it would have as separate archive."""
+    modified_timestamp: float
+
+
+def member_sha256(data: bytes) -> str:
+    return sha256_tree_hash_hex(BytesIO(data), chunk_size_mb=1)[0]
+
+
+class PackWriter:
+    """
+    Writes pack: archive that contains many small files.
+
+    Layout of pack:
+        content of members, one after another
+        index: JSON list of members
+        trailer: b"SVPK", format version (uint32), offset of index (uint64). Little-endian.
+
+    Index is at the end, so members are streamed without knowing their count in advance.
+    """
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self._offset = 0
+        self.members: List[PackMember] = []
+
+    @property
+    def size(self) -> int:
+        """Size of written members"""
+        return self._offset
+
+    def add(self, data: bytes, parent: str, name: str, modified_timestamp: float,
+            sha256: Optional[str] = None) -> PackMember:
+        """
+        Appends file content to pack. Files are small, so they are added at once.
+        :param sha256: `member_sha256(data)` if it is already calculated
+        """
+        m = PackMember(parent=parent,
+                       name=name,
+                       offset=self._offset,
+                       size=len(data),
+                       sha256=sha256 or member_sha256(data),
+                       modified_timestamp=modified_timestamp)
+        self._f.write(data)
+        self._offset += len(data)
+        self.members.append(m)
+        return m
+
+    def finish(self):
+        index = json.dumps([m._asdict() for m in self.members], ensure_ascii=False).encode()
+        self._f.write(index)
+        self._f.write(_TRAILER.pack(PACK_MAGIC, PACK_VERSION, self._offset))
+
+
+def read_pack_index(f: BinaryIO) -> List[PackMember]:
+    """
+    :raises PackFormatError: if `f` is not a pack
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size < _TRAILER.size:
+        raise PackFormatError("Too short for pack")
+    f.seek(size - _TRAILER.size)
+    magic, version, index_offset = _TRAILER.unpack(f.read(_TRAILER.size))
+    if magic != PACK_MAGIC:
+        raise PackFormatError("Not a pack")
+    if version != PACK_VERSION:
+        raise PackFormatError(f"Unsupported pack version {version}")
+    f.seek(index_offset)
+    index = f.read(size - _TRAILER.size - index_offset)
+    return [PackMember(**d) for d in json.loads(index)]
+
+
+def extract_member(pack: BinaryIO, offset: int, size: int, out: BinaryIO,
+                   progress_cb: Optional[Callable[[int], Any]] = None, read_size: int = 1024 * 1024):
+    """Copies member content from pack to `out`."""
+    pack.seek(offset)
+    left = size
+    while left > 0:
+        chunk = pack.read(min(read_size, left))
+        if not chunk:
+            raise PackFormatError("Pack is shorter than member")
+        out.write(chunk)
+        left -= len(chunk)
+        if progress_cb:
+            progress_cb(size - left)
+
+
+def iter_packs(items: Iterable[Tuple[_T, int]], pack_size: int) -> Iterator[List[_T]]:
+    """
+    Groups (item, size) pairs to packs as they come, so the whole list is never needed.
+    Every group is no bigger than `pack_size`, unless it has only one item.
+    """
+    current: List[_T] = []
+    current_size = 0
+    for item, size in items:
+        if current and current_size + size > pack_size:
+            yield current
+            current, current_size = [], 0
+        current.append(item)
+        current_size += size
+    if current:
+        yield current
+
+
+def plan_packs(files: Iterable[Tuple[str, int]], pack_size: int) -> List[List[str]]:
+    """Splits (file, size) list to groups of files, that are packed together. See `iter_packs`."""
+    return list(iter_packs(files, pack_size))
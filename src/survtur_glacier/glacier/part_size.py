@@ -0,0 +1,39 @@
+from typing import Optional
+
+from ..common.helpers import MB
+
+MIN_PART_SIZE_MB = 1
+MAX_PART_SIZE_MB = 4 * 1024
+MAX_PARTS_COUNT = 10000
+"""Glacier limits for multipart upload. Part size must also be a power of two."""
+
+
+def _smallest_part_size_mb(file_size: int, parts_count: int) -> int:
+    """Returns the smallest allowed part size that splits file to no more than `parts_count` parts"""
+    part_size_mb = MIN_PART_SIZE_MB
+    while part_size_mb < MAX_PART_SIZE_MB and part_size_mb * MB * parts_count < file_size:
+        part_size_mb *= 2
+    return part_size_mb
+
+
+def choose_part_size_mb(file_size: int, target_parts_count: int,
+                        throughput: Optional[float] = None, max_part_seconds: Optional[float] = None,
+                        min_part_size_mb: int = MIN_PART_SIZE_MB, single_upload_max_size: int = 0) -> int:
+    """
+    Returns the smallest power of two part size that splits file to no more than `target_parts_count` parts.
+
+    If upload `throughput` (bytes per second for one part) is known, part is made smaller, so it is uploaded
+    in no more than `max_part_seconds`. That is how much is lost when connection breaks.
+    Anyway, file is not split to more than 10000 parts.
+
+    Every part costs a request, so part is never smaller than `min_part_size_mb`.
+    File up to `single_upload_max_size` bytes gets one part, so it is uploaded in one request.
+    """
+    if file_size <= min(single_upload_max_size, MAX_PART_SIZE_MB * MB):
+        return _smallest_part_size_mb(file_size, 1)
+    part_size_mb = max(_smallest_part_size_mb(file_size, target_parts_count), min_part_size_mb)
+    if throughput and max_part_seconds:
+        while part_size_mb > min_part_size_mb and part_size_mb * MB > throughput * max_part_seconds:
+            part_size_mb //= 2
+        part_size_mb = max(part_size_mb, _smallest_part_size_mb(file_size, MAX_PARTS_COUNT))
+    return part_size_mb
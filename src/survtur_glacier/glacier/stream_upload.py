@@ -0,0 +1,181 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import BinaryIO, Callable, Optional, Any, List, NamedTuple
+
+from ..common.compression import CompressingReader
+from ..common.helpers import MB, is_power_of_two
+from ..common.iopart2 import BufferBody
+from .hasher import sha256_tree_and_linear_hash_of_buffer_hex, sha256_tree_hash_of_parts_hex
+from .part_size import MAX_PARTS_COUNT, MIN_PART_SIZE_MB, MAX_PART_SIZE_MB
+from .survtur_glacier import SurvturGlacier
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_PART_SIZE_MB = 64
+"""Size of stream is not known in advance. 64 MB parts allow streams up to 640 GB (10000 parts)."""
+
+_PART_ATTEMPTS = 3
+
+
+class StreamUploadResult(NamedTuple):
+    archive_id: str
+    size: int
+    sha256: str
+    original_size: int
+    """Size of stream before compression"""
+
+
+def _read_full(stream: BinaryIO, buffer: bytearray) -> int:
+    """Fills buffer from stream. Returns less than buffer size only at the end of stream."""
+    view = memoryview(buffer)
+    filled = 0
+    while filled < len(buffer):
+        n = stream.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    view.release()
+    return filled
+
+
+class StreamUploader:
+    """
+    Multipart upload from stream of unknown size, like stdin or pipe.
+
+    Stream is read to a ring of `ring_size` part buffers. Every filled buffer is hashed and uploaded
+    by one of `threads` workers, then it is reused for next part. Reading waits while all buffers are busy,
+    so memory is limited to `ring_size * part_size_mb`. Tree hash and size of archive are known at the end.
+
+    Botocore does not retry uploads (see `SurvturGlacier`), so part is retried here: it is still in memory
+    and stream can not be read again.
+
+    If `codec` is set, stream is compressed on the fly. Parts and tree hash are of compressed content.
+    """
+
+    def __init__(self, make_glacier: Callable[[], SurvturGlacier], vault_name: str, save_as: str, *,
+                 use_glacier_format: bool = True,
+                 part_size_mb: int = DEFAULT_STREAM_PART_SIZE_MB,
+                 threads: int = 4,
+                 ring_size: Optional[int] = None,
+                 progress_cb: Optional[Callable[[int], Any]] = None,
+                 throttle: Optional[Callable[[int], Any]] = None,
+                 file: Optional[str] = None,
+                 codec: Optional[str] = None,
+                 compression_level: Optional[int] = None,
+                 original_size: Optional[int] = None):
+        """
+        :param make_glacier: creates Glacier client for every worker thread
+        :param progress_cb: called with total bytes uploaded
+        :param throttle: called with count of bytes sent. May sleep to limit upload speed.
+        :param file: local file that is the stream, if any. Its modification time goes to description.
+        :param codec: see `common.compression`
+        :param original_size: size of stream before compression, if known in advance. Goes to description.
+        """
+        if not (MIN_PART_SIZE_MB <= part_size_mb <= MAX_PART_SIZE_MB and is_power_of_two(part_size_mb)):
+            raise ValueError(f"Part size must be power of two from {MIN_PART_SIZE_MB} to {MAX_PART_SIZE_MB} MB, "
+                             f"not {part_size_mb}")
+        self._make_glacier = make_glacier
+        self._local = threading.local()
+        self.vault_name = vault_name
+        self.save_as = save_as
+        self.use_glacier_format = use_glacier_format
+        self.part_size = part_size_mb * MB
+        self.part_size_mb = part_size_mb
+        self.threads = threads
+        self.ring_size = ring_size or threads + 1
+        self._progress_cb = progress_cb
+        self._throttle = throttle
+        self.file = file
+        self.codec = codec
+        self.compression_level = compression_level
+        self.original_size = original_size
+        self._uploaded = 0
+        self._lock = threading.Lock()
+
+    def _glacier(self) -> SurvturGlacier:
+        """
+        Every thread has its own client.
+        `SurvturGlacier` registers per-request event handlers, that must not be shared by parallel requests.
+        """
+        g = getattr(self._local, 'glacier', None)
+        if g is None:
+            g = self._local.glacier = self._make_glacier()
+        return g
+
+    def upload(self, stream: BinaryIO) -> StreamUploadResult:
+        glacier = self._glacier()
+        reader = CompressingReader(stream, self.codec, self.compression_level) if self.codec else stream
+        upload_id = glacier.initiate_archive_upload(file=self.file, vault_name=self.vault_name, save_as=self.save_as,
+                                                    use_glacier_format=self.use_glacier_format,
+                                                    part_size_mb=self.part_size_mb,
+                                                    codec=self.codec, original_size=self.original_size)
+        _logger.info(f"Uploading stream as {self.save_as} with parts of {self.part_size_mb} MB. Upload {upload_id}")
+        try:
+            size, part_hashes = self._upload_parts(reader, upload_id)
+            if size == 0:
+                raise ValueError("Stream is empty. Nothing to upload.")
+            sha256 = sha256_tree_hash_of_parts_hex(part_hashes)
+            archive_id = glacier.complete_multipart_upload(self.vault_name, upload_id, size, sha256)
+        except BaseException:
+            _logger.error(f"Stream upload failed. Aborting upload {upload_id}")
+            glacier.abort_multipart_upload(self.vault_name, upload_id)
+            raise
+        original_size = reader.raw_read if self.codec else size
+        return StreamUploadResult(archive_id=archive_id, size=size, sha256=sha256, original_size=original_size)
+
+    def _upload_parts(self, stream: BinaryIO, upload_id: str):
+        free: 'queue.Queue[bytearray]' = queue.Queue()
+        for _ in range(self.ring_size):
+            free.put(bytearray(self.part_size))
+
+        part_hashes: List[str] = []
+        futures: List[Future] = []
+        size = 0
+        with ThreadPoolExecutor(self.threads, thread_name_prefix="stream-upload") as pool:
+            while True:
+                buffer = free.get()
+                failed = [f for f in futures if f.done() and f.exception()]
+                if failed:
+                    raise failed[0].exception()
+
+                n = _read_full(stream, buffer)
+                if n == 0:
+                    break
+                if len(part_hashes) == MAX_PARTS_COUNT:
+                    raise ValueError(f"Stream is too big for {self.part_size_mb} MB parts")
+                tree_hash, linear_hash = sha256_tree_and_linear_hash_of_buffer_hex(memoryview(buffer)[:n])
+                part_hashes.append(tree_hash)
+                futures.append(pool.submit(self._upload_part, upload_id, buffer, size, n, tree_hash, linear_hash,
+                                           free))
+                size += n
+                if n < self.part_size:
+                    break
+
+            for f in futures:
+                f.result()
+        return size, part_hashes
+
+    def _upload_part(self, upload_id: str, buffer: bytearray, offset: int, size: int, tree_hash: str,
+                     linear_hash: str, free: 'queue.Queue[bytearray]'):
+        try:
+            for attempt in range(1, _PART_ATTEMPTS + 1):
+                try:
+                    with BufferBody(memoryview(buffer)[:size], throttle=self._throttle) as body:
+                        self._glacier().upload_archive_part(vault_name=self.vault_name, upload_id=upload_id,
+                                                            part_checksum=tree_hash, body=body, part_offset=offset,
+                                                            part_size=size, payload_sha256=linear_hash)
+                    break
+                except Exception as e:
+                    if attempt == _PART_ATTEMPTS:
+                        raise
+                    _logger.warning(f"Part at {offset} failed ({e!r}). Attempt {attempt}/{_PART_ATTEMPTS}")
+                    time.sleep(5 * attempt)
+            with self._lock:
+                self._uploaded += size
+                if self._progress_cb:
+                    self._progress_cb(self._uploaded)
+        finally:
+            free.put(buffer)
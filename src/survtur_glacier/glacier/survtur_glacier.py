@@ -1,4 +1,5 @@
 import base64
+import contextlib
 import datetime
 import enum
 import hashlib
@@ -7,6 +8,7 @@ import os.path
 import random
 import typing
 import urllib.parse
+from io import BytesIO
 from typing import Callable, Any
 from typing import List, Optional, Iterator, NamedTuple, Tuple
 from typing.io import IO
@@ -15,8 +17,9 @@ import boto3
 
 from ..common.fast_glacier import to_fast_glacier, FastGlacierArchiveInfo
 from ..common.helpers import MB, KB
-from ..common.iopart2 import BufferedReaderWithCallback, ReadProgressInfo
+from ..common.iopart2 import MmapBody, ReadProgressInfo
 from ..common.stream_retreiver import retrieve_with_progress
+from .byte_range import ByteRange
 from .stubs.vaultdict import VaultDict
 from botocore.client import Config
 
@@ -52,6 +55,12 @@ def _ranges(whole_size: int, part_size: int) -> Iterator[PartRangeInfo]:
     yield PartRangeInfo(start, whole_size - start, f"bytes {start}-{whole_size - 1}/*")
 
 
+class UploadedPartInfo(NamedTuple):
+    offset: int
+    size: int
+    sha256_tree_hash: str
+
+
 def vault_name_from_arn(arn: str):
     return os.path.basename(arn)
 
@@ -101,19 +110,28 @@ class SurvturGlacier:
                                         "Description": f"<a><b>4</b><e>{e}</e><f>0:0::0</f><g>0</g></a>"
                                     })
 
-    def request_archive(self, vault_name: str, archive_id: str, tier: GlacierTier):
-        return self._b.initiate_job(vaultName=vault_name,
-                                    jobParameters={
-                                        "Type": "archive-retrieval",
-                                        "ArchiveId": archive_id,
-                                        "Description": f"Getting {archive_id}",
-                                        "Tier": tier.value
-                                    })
+    def request_archive(self, vault_name: str, archive_id: str, tier: GlacierTier,
+                        bytes_range: Optional[ByteRange] = None):
+        """
+        :param bytes_range: Part of archive to retrieve. Whole archive if None.
+            Must be megabyte aligned, see `byte_range.mb_aligned_range()`.
+            For tree hash aligned range (`byte_range.tree_hash_aligned_range()`) job will have its SHA256TreeHash.
+        """
+        job_parameters = {
+            "Type": "archive-retrieval",
+            "ArchiveId": archive_id,
+            "Description": f"Getting {archive_id}",
+            "Tier": tier.value
+        }
+        if bytes_range:
+            job_parameters["RetrievalByteRange"] = f"{bytes_range[0]}-{bytes_range[1]}"
+        return self._b.initiate_job(vaultName=vault_name, jobParameters=job_parameters)
 
     def get_job_output(self, vault_name: str, job_id: str,
                        bytes_range: Optional[Tuple[int, int]] = None,
                        on_read_callback: Optional[Callable[[int], Any]] = None,
-                       read_size: int = 512 * KB) -> Iterator[bytes]:
+                       read_size: int = 512 * KB,
+                       throttle: Optional[Callable[[int], Any]] = None) -> Iterator[bytes]:
         """
 
         :param vault_name:
@@ -121,22 +139,29 @@ class SurvturGlacier:
         :param on_read_callback: Called while downloading with total received bytes parameter
         :param bytes_range:
         :param read_size:
+        :param throttle: Called with size of every received piece. May sleep to limit download speed.
         :return:
         """
         extra_params = {}
         if bytes_range:
             extra_params['range'] = f'bytes={bytes_range[0]}-{bytes_range[1]}'
         response = self._b.get_job_output(vaultName=vault_name, jobId=job_id, **extra_params)
-        for b in retrieve_with_progress(response['body'], on_read_callback, read_size):
+        for b in retrieve_with_progress(response['body'], on_read_callback, read_size=read_size, throttle=throttle):
             yield b
 
-    def initiate_archive_upload(self, *, file: str, vault_name: str, save_as: Optional[str] = None,
+    def initiate_archive_upload(self, *, file: Optional[str], vault_name: str, save_as: Optional[str] = None,
                                 use_glacier_format: bool = True,
-                                part_size_mb: int) -> str:
+                                part_size_mb: int,
+                                codec: Optional[str] = None,
+                                original_size: Optional[int] = None) -> str:
+        """
+        :param file: local file. None for upload from stream, then `save_as` is required.
+        :param codec: if content is compressed. Kept in description with `original_size`.
+        """
 
         part_size = part_size_mb * MB
 
-        description = self._make_archive_description(file, save_as, use_glacier_format)
+        description = self._make_archive_description(file, save_as, use_glacier_format, codec, original_size)
 
         response = self._b.initiate_multipart_upload(
             vaultName=vault_name,
@@ -147,25 +172,86 @@ class SurvturGlacier:
         upload_id = response['uploadId']
         return upload_id
 
+    def find_multipart_uploads(self, *, file: str, vault_name: str, save_as: Optional[str] = None,
+                               use_glacier_format: bool = True,
+                               part_size_mb: int) -> List[str]:
+        """
+        Returns ids of not completed multipart uploads that were initiated
+        by `initiate_archive_upload()` with the same parameters.
+        """
+        description = self._make_archive_description(file, save_as, use_glacier_format)
+        part_size = part_size_mb * MB
+
+        found = []
+        kwargs = {}
+        while True:
+            response = self._b.list_multipart_uploads(vaultName=vault_name, **kwargs)
+            for u in response['UploadsList']:
+                if u.get('ArchiveDescription') == description and u['PartSizeInBytes'] == part_size:
+                    found.append(u['MultipartUploadId'])
+            if not response.get('Marker'):
+                break
+            kwargs['marker'] = response['Marker']
+        return found
+
+    def list_parts(self, vault_name: str, upload_id: str) -> List[UploadedPartInfo]:
+        """Returns parts that were already uploaded to multipart upload"""
+        parts = []
+        kwargs = {}
+        while True:
+            response = self._b.list_parts(vaultName=vault_name, uploadId=upload_id, **kwargs)
+            for p in response['Parts']:
+                start, end = (int(x) for x in p['RangeInBytes'].split("-"))
+                parts.append(UploadedPartInfo(offset=start, size=end - start + 1, sha256_tree_hash=p['SHA256TreeHash']))
+            if not response.get('Marker'):
+                break
+            kwargs['marker'] = response['Marker']
+        return parts
+
     def describe_job(self, vault_name: str, job_id: str):
         return self._b.describe_job(vaultName=vault_name, jobId=job_id)
 
     def upload_archive_part(self, *, vault_name: str, upload_id: str, part_checksum: str,
-                            body: IO[bytes], part_offset: int, part_size: int) -> str:
+                            body: IO[bytes], part_offset: int, part_size: int,
+                            payload_sha256: Optional[str] = None) -> str:
         """
         Returns AWS calculated sha256TreeHash of uploaded part.
         It is the same as `part_checksum` parameter.
+        :param payload_sha256: Plain sha256 of part, if known. Saves one more reading of part.
         """
         range_str = f"bytes {part_offset}-{part_offset + part_size - 1}/*"
-        result = self._b.upload_multipart_part(
-            vaultName=vault_name,
-            uploadId=upload_id,
-            checksum=part_checksum,
-            range=range_str,
-            body=body,
-        )
+        with self._known_payload_sha256('UploadMultipartPart', payload_sha256):
+            result = self._b.upload_multipart_part(
+                vaultName=vault_name,
+                uploadId=upload_id,
+                checksum=part_checksum,
+                range=range_str,
+                body=body,
+            )
         return result['checksum']
 
+    @contextlib.contextmanager
+    def _known_payload_sha256(self, operation_name: str, payload_sha256: Optional[str]):
+        """
+        Puts `payload_sha256` to x-amz-content-sha256 header of `operation_name` request.
+        If header is there, botocore neither calculates it for glacier checksums, nor for request signature.
+        Otherwise, it reads whole body once more to hash it.
+        """
+        if not payload_sha256:
+            yield
+            return
+
+        def add_header(params, **_):
+            params['headers']['x-amz-content-sha256'] = payload_sha256
+
+        event_name = f'before-call.glacier.{operation_name}'
+        unique_id = f'survtur-payload-sha256-{id(add_header)}'
+        self._b.meta.events.register_first(event_name, add_header, unique_id=unique_id)
+        try:
+            yield
+        finally:
+            self._b.meta.events.unregister(event_name, unique_id=unique_id)
+
     def complete_multipart_upload(self, vault_name: str, upload_id: str, size: int, archive_checksum: str) -> str:
         """
         Returns AWS calculated sha256TreeHash of whole archive.
@@ -179,33 +265,60 @@ class SurvturGlacier:
         )
         return result['archiveId']
 
+    def abort_multipart_upload(self, vault_name: str, upload_id: str):
+        self._b.abort_multipart_upload(vaultName=vault_name, uploadId=upload_id)
+
+    def delete_archive(self, vault_name: str, archive_id: str) -> bool:
+        """Returns False if there was no such archive. Like it was deleted before."""
+        try:
+            self._b.delete_archive(vaultName=vault_name, archiveId=archive_id)
+        except self._b.exceptions.ResourceNotFoundException:
+            return False
+        return True
+
     def upload_archive(self, *, vault_name: str, file: str,
                        checksum: str,
                        save_name: Optional[str] = None,
                        use_glacier_format: bool = True,
-                       progress_cb: Optional[Callable[[ReadProgressInfo], Any]] = None
+                       progress_cb: Optional[Callable[[ReadProgressInfo], Any]] = None,
+                       throttle: Optional[Callable[[int], Any]] = None,
+                       payload_sha256: Optional[str] = None
                        ) -> str:
         """
+        :param payload_sha256: Plain sha256 of file, if known. Saves one more reading of file.
         :return: ArchiveId
         """
 
         archive_description = self._make_archive_description(file, save_name, use_glacier_format)
         _logger.debug(f"Archive description: {repr(archive_description)}")
-        with BufferedReaderWithCallback(open(file, mode='br'), progress_cb) as b:
+        if os.path.isdir(file):
+            # FastGlacier's way: folder is an archive of single "0" byte. `checksum` is hash of it.
+            result = self._b.upload_archive(
+                vaultName=vault_name,
+                archiveDescription=archive_description,
+                checksum=checksum,
+                body=BytesIO(b"0")
+            )
+            return result['archiveId']
+
+        with open(file, mode='br') as f, \
+                MmapBody(f.fileno(), callback=progress_cb, throttle=throttle) as b, \
+                self._known_payload_sha256('UploadArchive', payload_sha256):
             result = self._b.upload_archive(
                 vaultName=vault_name,
                 archiveDescription=archive_description,
                 checksum=checksum,
-                body=b
+                body=typing.cast(IO[bytes], b)
             )
 
         return result['archiveId']
 
     @staticmethod
-    def _make_archive_description(file: str, save_as: str, use_glacier_format: bool) -> str:
+    def _make_archive_description(file: Optional[str], save_as: str, use_glacier_format: bool,
+                                  codec: Optional[str] = None, original_size: Optional[int] = None) -> str:
         """
 
-        :param file: local file
+        :param file: local file. None if there is no file, like for upload from stream.
 
         :param save_as:
         :param use_glacier_format:
@@ -215,12 +328,16 @@ class SurvturGlacier:
             For virtual folder: "FOLDER/SUBFOLDER/"
             For files: "FOLDER/SUBFOLDER/file.zip"
             Notice that last slash defines is it file or directory.
+        :param codec: compression of content. Only glacier formatted description can keep it.
         """
+        if codec and not use_glacier_format:
+            raise ValueError("Compressed archive requires glacier formatted description")
         if not save_as:
+            assert file, "File or name to save as is required"
             save_as = os.path.basename(file)
         if use_glacier_format:
             try:
-                lm = datetime.datetime.fromtimestamp(os.path.getmtime(file))
+                lm = datetime.datetime.fromtimestamp(os.path.getmtime(file)) if file else datetime.datetime.now()
             except FileNotFoundError:
                 lm = datetime.datetime.now()
 
@@ -228,7 +345,9 @@ class SurvturGlacier:
                 parent='',
                 name=save_as,
                 is_dir=save_as.endswith("/"),
-                last_modified=lm
+                last_modified=lm,
+                codec=codec,
+                original_size=original_size
             )
             archive_description = to_fast_glacier(f)
         else:
@@ -0,0 +1,116 @@
+import logging
+import os
+from enum import Enum
+from typing import NamedTuple, List, Optional, Callable, Any, Tuple
+
+from ..common.tree_scan import scan_tree, ScanEntry
+from .hash_cache import HashCache
+from .inventory import Inventory, ArchiveInfo
+
+_logger = logging.getLogger(__name__)
+
+_BATCH = 1000
+"""Scanned files are looked for in inventory by batches"""
+
+_MTIME_TOLERANCE = 1
+"""FastGlacier-style description keeps modification time in whole seconds"""
+
+
+class SyncStatus(Enum):
+    NEW = "new"
+    CHANGED = "changed"
+    IDENTICAL = "identical"
+
+
+class SyncItem(NamedTuple):
+    entry: ScanEntry
+    save_as_path: str
+    save_as_name: str
+    status: SyncStatus
+
+
+class SyncPlan:
+    """Files of local folder, split by what is in inventory. Counters grow while planning."""
+
+    def __init__(self):
+        self.new: List[SyncItem] = []
+        self.changed: List[SyncItem] = []
+        self.identical: List[SyncItem] = []
+        self.checked = 0
+        self.done = False
+        self.error: Optional[str] = None
+
+    def to_upload(self) -> List[SyncItem]:
+        return self.new + self.changed
+
+    @property
+    def size_to_upload(self) -> int:
+        return sum(i.entry.size for i in self.to_upload())
+
+
+def plan_sync(local_dir: str, remote_dir: str, inventory: Inventory, *, exact: bool = False,
+              hash_cache: Optional[HashCache] = None, plan: Optional[SyncPlan] = None,
+              should_stop: Callable[[], Any] = lambda: False) -> SyncPlan:
+    """
+    Compares content of `local_dir` with inventory folder `remote_dir`, like "backups/project/".
+
+    Quick mode compares size and modification time. Exact mode compares tree hashes, but only with archives
+    of the same size. Hashes are taken from `hash_cache`, so files that did not change are not read again.
+    Compressed archives have hash of compressed content, so they are compared quickly in both modes.
+
+    Files are looked for in inventory by batches as they are scanned. Symlinks are ignored.
+    :param plan: to be filled. Pass it to watch counters from other thread.
+    """
+    plan = plan or SyncPlan()
+    if exact and hash_cache is None:
+        raise ValueError("Exact comparison requires hash cache")
+    prefix = os.path.join(local_dir, "")
+
+    def save_as(path: str) -> Tuple[str, str]:
+        parent, _, name = path[len(prefix):].replace(os.sep, "/").rpartition("/")
+        return (remote_dir + parent + "/" if parent else remote_dir), name
+
+    def compare(batch: List[ScanEntry]):
+        paths = [save_as(e.path) for e in batch]
+        found = inventory.find_paths(paths)
+        for e, (parent, name) in zip(batch, paths):
+            archives = found.get((parent, name))
+            if not archives:
+                plan.new.append(SyncItem(e, parent, name, SyncStatus.NEW))
+            elif _is_identical(e, archives, exact, hash_cache):
+                plan.identical.append(SyncItem(e, parent, name, SyncStatus.IDENTICAL))
+            else:
+                plan.changed.append(SyncItem(e, parent, name, SyncStatus.CHANGED))
+        plan.checked += len(batch)
+        if hash_cache:
+            hash_cache.save()
+
+    batch: List[ScanEntry] = []
+    for e in scan_tree([local_dir]):
+        if should_stop():
+            return plan
+        if e.is_dir or e.is_link:
+            continue
+        batch.append(e)
+        if len(batch) >= _BATCH:
+            compare(batch)
+            batch = []
+    compare(batch)
+    plan.done = True
+    _logger.info(f"Sync plan of {local_dir}: {len(plan.new)} new, {len(plan.changed)} changed, "
+                 f"{len(plan.identical)} identical")
+    return plan
+
+
+def _is_identical(e: ScanEntry, archives: List[ArchiveInfo], exact: bool, hash_cache: Optional[HashCache]) -> bool:
+    for a in archives:
+        size = a['original_size'] if a.get('codec') else a['size']
+        if size != e.size:
+            continue
+        if not exact or a.get('codec'):
+            mtime = a['modified_timestamp']
+            if mtime is not None and abs(mtime - e.modified_timestamp) < _MTIME_TOLERANCE:
+                return True
+        elif hash_cache.tree_hash(e.path, e.size, e.modified_timestamp) == a['sha256']:
+            return True
+    return False
@@ -0,0 +1,78 @@
+import logging
+import multiprocessing
+import threading
+import time
+from typing import NamedTuple, List
+
+_logger = logging.getLogger(__name__)
+
+_BURST_SECONDS = 0.5
+"""How many seconds of traffic may be accumulated by bucket while nobody uses it."""
+
+
+class TokenBucket:
+    """
+    Transfer rate limit shared between processes.
+
+    Budget of bytes lives in shared memory. Task processes take bytes from it with `consume()`,
+    `BandwidthRefiller` thread of main process puts them back with `refill()`.
+    Consumer may take more than available. Then it sleeps until the debt is covered with refills,
+    so all consumers together transfer with constant rate.
+    """
+
+    def __init__(self, rate: int = 0):
+        """
+        :param rate: bytes per second. 0 means no limit.
+        """
+        self._tokens = multiprocessing.Value('d', 0.0)
+        self._rate = multiprocessing.Value('q', max(0, rate), lock=False)
+
+    @property
+    def rate(self) -> int:
+        return self._rate.value
+
+    @rate.setter
+    def rate(self, rate: int):
+        self._rate.value = max(0, int(rate))
+
+    def refill(self, seconds: float):
+        rate = self._rate.value
+        with self._tokens.get_lock():
+            if rate == 0:
+                self._tokens.value = 0
+            else:
+                self._tokens.value = min(self._tokens.value + rate * seconds, rate * _BURST_SECONDS)
+
+    def consume(self, n: int):
+        """Takes `n` bytes from the bucket. Sleeps if there was not enough."""
+        rate = self._rate.value
+        if rate == 0 or n <= 0:
+            return
+        with self._tokens.get_lock():
+            self._tokens.value -= n
+            debt = -self._tokens.value
+        if debt > 0:
+            time.sleep(debt / rate)
+
+
+class BandwidthLimits(NamedTuple):
+    upload: TokenBucket
+    download: TokenBucket
+
+
+class BandwidthRefiller(threading.Thread):
+    buckets: List[TokenBucket]
+    interval: float = 0.05
+
+    def __init__(self, *a, **kwa):
+        super().__init__(*a, daemon=True, **kwa)
+        self.stop = threading.Event()
+
+    def run(self):
+        last = time.monotonic()
+        while not self.stop.wait(self.interval):
+            now = time.monotonic()
+            for b in self.buckets:
+                b.refill(now - last)
+            last = now
+        _logger.info(f"BandwidthRefiller #{self.native_id} STOPPED")
@@ -1,16 +1,21 @@
+import datetime
 import logging
 import multiprocessing
 import threading
 import time
 import typing
-from typing import List, Callable, Any
+from typing import List, Callable, Any, Dict, Optional
 
 from ..common.config import Config
+from ..common.helpers import KB
+from .bandwidth import BandwidthLimits, TokenBucket, BandwidthRefiller
 from .progress_processor import OutputProcessor
+from .scheduling import get_policy
 from .sqlite_tasks_queue import SqliteTasksQueue
-from .stubs import CommonTaskDict, TaskOutputDict
+from .stubs import CommonTaskDict, TaskOutputDict, TaskCategory
 from .task_adder import TaskAdder
 from .tasks_processor import TasksProcessor
+from .time_window import TimeWindow
 
 _logger = logging.getLogger(__name__)
 
@@ -20,6 +25,10 @@ class TasksGeneralManager(threading.Thread):
     _task_adder_thread: TaskAdder
     _task_processor_threads: List[TasksProcessor]
     _output_processor_thread: OutputProcessor
+    _bandwidth_refiller_thread: BandwidthRefiller
+
+    _bandwidth: BandwidthLimits
+    # Upload and download speed limits shared by all task processes.
 
     _tasks_queue: SqliteTasksQueue
     # Queue with task dicts. It is consumed by TaskProcessors. Fills up only with TaskAdder.
@@ -32,8 +41,11 @@ class TasksGeneralManager(threading.Thread):
     # Queue with information about task progress|results.
     # Fills up with TaskProcessors and TaskAdder. Consumed by OutputProcessor.
 
-    tp_count: int = 2
-    """Max quantity of task processors. Default = 2"""
+    tp_counts: Dict[TaskCategory, int] = {c: 2 for c in TaskCategory}
+    """Max quantity of task processors for each tasks category. Default = 2"""
+
+    time_windows: Dict[TaskCategory, Optional[TimeWindow]] = {}
+    """Daily time windows when tasks of category may start. Category that is not here runs anytime."""
 
     on_output_callback: Callable[[TaskOutputDict], Any] = None
 
@@ -42,28 +54,32 @@ class TasksGeneralManager(threading.Thread):
     # It is possible that task will be finished before cancellation to item will stay in this list forever.
     # I use timestamp to remove too old items from this list.
 
-    def get_all_tasks_in_queue(self) -> List[CommonTaskDict]:
-        return self._tasks_queue.get_all_tasks_in_queue()
+    def get_all_tasks_in_queue(self, with_data: bool = True) -> List[CommonTaskDict]:
+        return self._tasks_queue.get_all_tasks_in_queue(with_data)
 
     def __init__(self, *a, tasks_db: str = ":memory:", config: Config, **kwa):
         self._config = config
-        self._tasks_queue = SqliteTasksQueue(database_file=tasks_db)
+        policy = get_policy(config.scheduling_policy, config.aging_interval)
+        self._tasks_queue = SqliteTasksQueue(database_file=tasks_db, policy=policy)
         self._queue_of_tasks_to_be_added = multiprocessing.Queue()
+        self._bandwidth = BandwidthLimits(upload=TokenBucket(config.upload_speed_limit_kb * KB),
+                                          download=TokenBucket(config.download_speed_limit_kb * KB))
         super().__init__(*a, **kwa)
 
     def run(self):
         self.output_queue = multiprocessing.Queue()
         self._task_processor_threads = []
 
-        for _ in range(self.tp_count):
-            tp = TasksProcessor()
-            tp.tasks_to_cancel = self.tasks_to_cancel
-            tp.tasks_queue = self._tasks_queue
-            tp.output_queue = self.output_queue
-            tp.queue_of_tasks_to_be_added = self._queue_of_tasks_to_be_added
-            tp.config = self._config
-            tp.start()
-            self._task_processor_threads.append(tp)
+        for category, window in self.time_windows.items():
+            self._tasks_queue.set_time_window(category, window)
+
+        self._bandwidth_refiller_thread = BandwidthRefiller()
+        self._bandwidth_refiller_thread.buckets = list(self._bandwidth)
+        self._bandwidth_refiller_thread.start()
+
+        for category, count in self.tp_counts.items():
+            for _ in range(count):
+                self._start_task_processor(category)
 
         self._task_adder_thread = TaskAdder()
         self._task_adder_thread.tasks_queue = self._tasks_queue
@@ -76,6 +92,18 @@ class TasksGeneralManager(threading.Thread):
         self._output_processor_thread.on_output = self._on_output
         self._output_processor_thread.start()
 
+    def _start_task_processor(self, category: TaskCategory):
+        tp = TasksProcessor()
+        tp.category = category
+        tp.tasks_to_cancel = self.tasks_to_cancel
+        tp.tasks_queue = self._tasks_queue
+        tp.output_queue = self.output_queue
+        tp.queue_of_tasks_to_be_added = self._queue_of_tasks_to_be_added
+        tp.config = self._config
+        tp.bandwidth = self._bandwidth
+        tp.start()
+        self._task_processor_threads.append(tp)
+
     def stop(self):
         with threading.Lock():
             self._tasks_queue.stop()
@@ -89,12 +117,35 @@ class TasksGeneralManager(threading.Thread):
             self.output_queue.put(typing.cast(TaskOutputDict, None))
             self._output_processor_thread.stop.set()
 
+            self._bandwidth_refiller_thread.stop.set()
+
     def add_task(self, d: CommonTaskDict):
         self._queue_of_tasks_to_be_added.put(d)
 
+    def add_tasks(self, tasks: List[CommonTaskDict]):
+        """Adds many tasks at once. They go to tasks queue in one transaction. Safe to call from any thread."""
+        if tasks:
+            self._queue_of_tasks_to_be_added.put(typing.cast(CommonTaskDict, tasks))
+
     def _on_output(self, x):
         self.on_output_callback(x)
 
+    def set_upload_speed_limit(self, bytes_per_second: int):
+        """Limits total upload speed of all task processes. 0 means no limit. Applies immediately."""
+        self._bandwidth.upload.rate = bytes_per_second
+
+    def set_download_speed_limit(self, bytes_per_second: int):
+        """Limits total download speed of all task processes. 0 means no limit. Applies immediately."""
+        self._bandwidth.download.rate = bytes_per_second
+
+    def get_queue_depths(self) -> Dict[TaskCategory, int]:
+        """Returns count of tasks waiting for free processor in every category"""
+        return self._tasks_queue.qsize_by_category()
+
+    def get_next_window_starts(self) -> Dict[TaskCategory, datetime.datetime]:
+        """Returns time when tasks held by closed time window will be started, for every category that has them"""
+        return self._tasks_queue.next_window_starts()
+
     def find_tasks(self, *_, **kwargs) -> List[CommonTaskDict]:
         return self._tasks_queue.find_task(**kwargs)
 
@@ -107,6 +158,9 @@ class TasksGeneralManager(threading.Thread):
         """
         _logger.info(f"Cancelling tasks: {task_ids}")
         self.tasks_to_cancel.update({t: time.time() for t in task_ids})
+        for tp in self._task_processor_threads:
+            if tp.current_task_id in self.tasks_to_cancel:
+                tp.check_cancellations()
 
         with threading.RLock():
             to_clean = []
@@ -2,12 +2,15 @@ import logging
 import multiprocessing
 
 from ..common.config import Config
+from .bandwidth import BandwidthLimits
 from .stubs import CommonTaskDict, TaskOutputDict, TaskStatus, TaskType
+from .tasks.delete import ArchiveDeleteTask
 from .tasks.downloads import InitiateArchiveRequestTask, ReceiveArchiveTask
 from .tasks.dummy import DummyTask
 from .tasks.errors import AcceptableTaskError
 from .tasks.initiate_upload import InitiateArchiveUploadTask
 from .tasks.inventory import InitiateInventoryRequestTask, RetrieveInventoryContentTask
+from .tasks.pack import PackUploadTask
 from .tasks.upload_part import UploadPartTask
 
 _logger = logging.getLogger(__name__)
@@ -20,7 +23,8 @@ class UnknownTaskType(RuntimeError):
 def process_task(d: CommonTaskDict,
                  queue_of_tasks_to_be_added: 'multiprocessing.Queue[CommonTaskDict]',
                  output_queue: 'multiprocessing.Queue[TaskOutputDict]',
-                 config: Config):
+                 config: Config,
+                 bandwidth: BandwidthLimits):
 
     _logger.debug(f"Starting \"{d['meta']['name']}\"")
 
@@ -38,6 +42,10 @@ def process_task(d: CommonTaskDict,
             task_class = InitiateArchiveRequestTask
         elif t == TaskType.ARCHIVE_RECEIVE:
             task_class = ReceiveArchiveTask
+        elif t == TaskType.PACK_UPLOAD:
+            task_class = PackUploadTask
+        elif t == TaskType.ARCHIVE_DELETE:
+            task_class = ArchiveDeleteTask
         elif t == TaskType.DUMMY:
             task_class = DummyTask
         else:
@@ -46,6 +54,7 @@ def process_task(d: CommonTaskDict,
         task = task_class.from_dict(task_dict=d,
                                     output_queue=output_queue,
                                     config=config,
+                                    bandwidth=bandwidth,
                                     queue_of_tasks_to_be_added=queue_of_tasks_to_be_added)
 
         task.process()
@@ -0,0 +1,74 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple, Union
+
+ScheduleKey = Tuple[Union[int, float], ...]
+"""Tasks with lower key are executed first. The last element of every key is task rowid."""
+
+
+class SchedulingPolicy(ABC):
+    """
+    Defines order of ready tasks in `SqliteTasksQueue`.
+
+    Key of a task is calculated once, when it becomes ready, and is kept in a heap.
+    So policy decides in O(log n) per dequeue, but key must not depend on current time.
+    """
+
+    name: str
+
+    @abstractmethod
+    def key(self, *, priority: int, rowid: int, ready_since: Union[int, float], size: Optional[int]) -> ScheduleKey:
+        """
+        :param priority: task priority. Lower is more important.
+        :param rowid: grows with every added task
+        :param ready_since: timestamp when task became ready to be executed
+        :param size: bytes to transfer if known
+        """
+        pass
+
+
+class FifoPolicy(SchedulingPolicy):
+    """By priority, then in order of adding"""
+
+    name = "fifo"
+
+    def key(self, *, priority, rowid, ready_since, size):
+        return priority, rowid
+
+
+class AgingPolicy(SchedulingPolicy):
+    """
+    Effective priority improves by 1 every `aging_interval` seconds of waiting,
+    so old tasks of lower priority are not starved by flood of newer ones.
+
+    Effective priority at moment `now` is `priority - (now - ready_since) / aging_interval`.
+    `now` is the same for all tasks, so they may be ordered by `priority + ready_since / aging_interval`.
+    """
+
+    name = "aging"
+
+    def __init__(self, aging_interval: Union[int, float] = 600):
+        assert aging_interval > 0, aging_interval
+        self.aging_interval = aging_interval
+
+    def key(self, *, priority, rowid, ready_since, size):
+        return priority + ready_since / self.aging_interval, rowid
+
+
+class ShortestJobFirstPolicy(SchedulingPolicy):
+    """By priority, then smaller transfers first. Tasks with unknown size are considered small."""
+
+    name = "sjf"
+
+    def key(self, *, priority, rowid, ready_since, size):
+        return priority, size or 0, rowid
+
+
+def get_policy(name: str, aging_interval: Union[int, float] = 600) -> SchedulingPolicy:
+    name = name.strip().lower()
+    if name == FifoPolicy.name:
+        return FifoPolicy()
+    elif name == AgingPolicy.name:
+        return AgingPolicy(aging_interval)
+    elif name == ShortestJobFirstPolicy.name:
+        return ShortestJobFirstPolicy()
+    raise ValueError(f"Unknown scheduling policy {name!r}")
@@ -1,37 +1,137 @@
+import datetime
+import heapq
 import json
 import logging
+import pickle
 import queue
 import sqlite3
 import threading
 from time import time
-from typing import Set, List, Optional, Union
+from typing import Set, List, Optional, Union, Tuple, Dict
 
-from .stubs import CommonTaskDict, TaskCategory, TaskType
+from .scheduling import SchedulingPolicy, FifoPolicy, ScheduleKey
+from .stubs import CommonTaskDict, TaskCategory, TaskType, TaskMetaDict
+from .time_window import TimeWindow
 
 _logger = logging.getLogger(__name__)
 
+_SCHEMA_VERSION = 1
+
+_HOT_DATA_FIELDS: Tuple[Tuple[str, str], ...] = (
+    # (column name, task data key)
+    ("vault", "vault_name"),
+    ("file", "file"),
+    ("file_offset", "part_offset"),
+    ("size", "part_size"),
+    ("job_id", "job_id"),
+)
+"""Task data fields that are stored in their own columns. Other task data is pickled into `payload` column."""
+
+_META_COLUMNS = "task_id, group_id, name, type, priority, start_after, created, category"
+_TASK_COLUMNS = _META_COLUMNS + ", " + ", ".join(c for (c, _) in _HOT_DATA_FIELDS) + ", payload"
+_TASK_PLACEHOLDERS = ", ".join(":" + c.strip() for c in _TASK_COLUMNS.split(","))
+
+
+def _task_to_row(td: CommonTaskDict) -> dict:
+    m = td['meta']
+    row = {
+        "task_id": m['id'],
+        "group_id": m['group_id'],
+        "name": m['name'],
+        "type": TaskType(m['type']).value,
+        "priority": m['priority'],
+        "start_after": m['start_after'],
+        "created": m['created'],
+        "category": TaskCategory(m['category']).value,
+    }
+    data = dict(td['data'])
+    for column, key in _HOT_DATA_FIELDS:
+        row[column] = data.pop(key, None)
+    row['payload'] = pickle.dumps(data, protocol=4)
+    return row
+
+
+def _row_to_task(row: tuple) -> CommonTaskDict:
+    """`row` is expected to contain `_TASK_COLUMNS`, or `_META_COLUMNS` only. In last case data will be empty."""
+    task_id, group_id, name, type_, priority, start_after, created, category, *data_columns = row
+    meta = TaskMetaDict(id=task_id,
+                        group_id=group_id,
+                        name=name,
+                        type=TaskType(type_),
+                        priority=priority,
+                        start_after=start_after,
+                        created=created,
+                        category=TaskCategory(category))
+    data = {}
+    if data_columns:
+        *hot_values, payload = data_columns
+        data = pickle.loads(payload)
+        for (_, key), value in zip(_HOT_DATA_FIELDS, hot_values):
+            if value is not None:
+                data[key] = value
+    return CommonTaskDict(meta=meta, data=data)
+
 
 class QueueExit(BaseException):
     pass
 
 
 class SqliteTasksQueue(queue.Queue):
+    """
+    Tasks queue persisted in sqlite.
+
+    Ready tasks are indexed in memory separately for each category, so `qsize()`, `get()`
+    and `get_many()` do not touch the database for anything but reading the tasks themselves.
+    Order of ready tasks is defined by `policy`. By default, it is priority, then order of adding.
+
+    Changes of executing/done state are collected and committed in groups every `flush_interval` seconds.
+    If app crashes before the commit, these tasks are simply executed again after restart,
+    as it is with tasks that were executing at the moment of crash.
+
+    Task meta and most used data fields are stored in their own columns, the rest of task data is pickled.
+
+    Category may have a time window (see `set_time_window()`). Outside of it, ready tasks of the category
+    are held in the index: they are not counted by `qsize()` and not returned by `get()`.
+    Waiting consumers wake up by themselves when the window opens.
+    """
 
-    def __init__(self, database_file, maxsize: int = 0, ) -> None:
+    flush_interval: float = 0.2
+    """Max delay in seconds between task state change and its commit to database."""
+
+    def __init__(self, database_file, maxsize: int = 0, policy: Optional[SchedulingPolicy] = None) -> None:
         self._lock = threading.RLock()
         self.database_file = database_file
+        self.policy = policy or FifoPolicy()
         self._exit_requested = False
         self._timers: Set[threading.Timer] = set()
+
+        self._ready: Dict[str, List[ScheduleKey]] = {c.value: [] for c in TaskCategory}
+        # Heaps of policy keys of tasks that can be executed right now. One heap for each category.
+        # The last element of key is rowid.
+        # Deleted tasks are not removed from heap. They are skipped on pop, because they are not in `_ready_rowids`.
+        self._ready_rowids: Dict[str, Set[int]] = {c.value: set() for c in TaskCategory}
+        self._windows: Dict[str, TimeWindow] = {}
+        # Time windows of categories. Category without window runs anytime.
+
+        self._pending_executing: List[int] = []
+        self._pending_done: List[str] = []
+        self._stop_flushing = threading.Event()
+
         super().__init__(maxsize)
         self.unfinished_tasks = self._qsize()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
 
-    def get_all_tasks_in_queue(self) -> List[CommonTaskDict]:
+    def get_all_tasks_in_queue(self, with_data: bool = True) -> List[CommonTaskDict]:
+        """
+        Returns tasks that are not executing.
+        If `with_data` is False, only meta is read from database and `data` of every task is empty.
+        """
+        columns = _TASK_COLUMNS if with_data else _META_COLUMNS
         with self._lock:
-            cur = self.db.execute("SELECT json FROM tasks WHERE executing = 0 ORDER BY priority")
-            tasks = []
-            for j in cur:
-                tasks.append(json.loads(j[0]))
-        return tasks
+            self._flush()
+            cur = self.db.execute(f"SELECT {columns} FROM tasks WHERE status=0 ORDER BY priority, id")
+            return [_row_to_task(row) for row in cur]
 
     def allow_next_task(self):
         super().task_done()
@@ -41,13 +141,26 @@ class SqliteTasksQueue(queue.Queue):
             raise RuntimeError("Please, add task_id parameter to task_done()")
 
         with self._lock:
+            self._pending_done.append(task_id)
+        super().task_done()
+
+    def _flush_periodically(self):
+        while not self._stop_flushing.wait(self.flush_interval):
+            self._flush()
+
+    def _flush(self):
+        """Commits collected executing/done state changes in one transaction"""
+        with self._lock:
+            if not self._pending_executing and not self._pending_done:
+                return
+            executing, self._pending_executing = self._pending_executing, []
+            done, self._pending_done = self._pending_done, []
+
             self.db.execute("BEGIN EXCLUSIVE")
-            cur = self.db.execute("DELETE FROM tasks WHERE task_id=:task_id", {'task_id': task_id})
+            self.db.executemany("UPDATE tasks SET status=1 WHERE id=?", ((r,) for r in executing))
+            self.db.executemany("DELETE FROM tasks WHERE task_id=?", ((t,) for t in done))
             self.db.execute('COMMIT')
 
-            assert cur.rowcount == 1, cur.rowcount
-        super().task_done()
-
     # Override these methods to implement other queue organizations
     # (e.g. stack or priority queue).
     # These will only be called with appropriate locks held
@@ -56,36 +169,10 @@ class SqliteTasksQueue(queue.Queue):
     def _init(self, maxsize):
         with self._lock:
             self.db = sqlite3.connect(self.database_file, check_same_thread=False, isolation_level='EXCLUSIVE')
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
             self.db.executescript("""
                 BEGIN TRANSACTION;
-                CREATE TABLE IF NOT EXISTS "tasks" (
-                    "task_id"	TEXT NOT NULL UNIQUE,
-                    "group_id"	TEXT NOT NULL,
-                    "priority"	INTEGER NOT NULL,
-                    "category"	TEXT NOT NULL,
-                    "name"	TEXT NOT NULL,
-                    "executing" INTEGER NOT NULL,
-                    "start_after"   INTEGER NOT NULL,
-                    "json"	    TEXT NOT NULL,
-                    "created" NUMERIC NOT NULL,
-                    PRIMARY KEY("task_id")
-                );
-                CREATE INDEX IF NOT EXISTS "priority_index" ON "tasks" (
-                    "priority"	ASC
-                );
-                CREATE INDEX IF NOT EXISTS "executing_index" ON "tasks" (
-                    "executing"	ASC
-                );
-                CREATE INDEX IF NOT EXISTS "group_id_index" ON "tasks" (
-                    "group_id"	ASC
-                );
-                CREATE INDEX IF NOT EXISTS "created_index" ON "tasks" (
-                    "created"	ASC
-                );
-                
-                UPDATE tasks SET executing=0 WHERE executing !=0;
-                
-              
                 CREATE TABLE IF NOT EXISTS "uploads" (
                     "upload_id" TEXT NOT NULL,
                     "part_index" INTEGER NOT NULL
@@ -94,34 +181,192 @@ class SqliteTasksQueue(queue.Queue):
                     "upload_id" ASC,
                     "part_index" ASC
                 );
-                
                 COMMIT;
                 """)
 
-            self._set_initial_timers()
+            version = self.db.execute("PRAGMA user_version").fetchone()[0]
+            if (version == 0 and self._is_table_exists("tasks")) or self._is_table_exists("tasks_v0"):
+                self._migrate_from_json_tasks()
+            elif version < _SCHEMA_VERSION:
+                self.db.execute("BEGIN EXCLUSIVE")
+                self._create_tasks_table()
+                self.db.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+                self.db.execute("COMMIT")
 
-    def _set_initial_timers(self):
-        with self._lock:
             self.db.execute("BEGIN EXCLUSIVE")
+            self.db.execute("UPDATE tasks SET status=0 WHERE status!=0")
+            self.db.execute("COMMIT")
+
             now = int(time())
-            cur = self.db.execute("SELECT task_id, start_after FROM tasks WHERE start_after>?", (now,))
-            for row in cur:
-                till_start = row[1] - now
-                t = threading.Timer(till_start + 1, self._on_task_timer_finished, kwargs={'task_id': row[0]})
-                self._timers.add(t)
-                t.start()
-                _logger.debug(f'Task added to timer {till_start} {row[0]}')
+            self._load_ready_index(now)
+            self._set_initial_timers(now)
+
+    def _is_table_exists(self, name: str) -> bool:
+        cur = self.db.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name=?", (name,))
+        return bool(cur.fetchone()[0])
+
+    def _create_tasks_table(self):
+        """Must be called inside transaction. Schema version is set by caller, when everything else is done."""
+        # Column `status`: 0 - waiting, 1 - executing.
+        # Index `ready_index` covers everything that is needed to build in-memory index of ready tasks on start.
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS "tasks" (
+                "id"	INTEGER NOT NULL PRIMARY KEY,
+                "task_id"	TEXT NOT NULL UNIQUE,
+                "group_id"	TEXT NOT NULL,
+                "name"	TEXT NOT NULL,
+                "type"	TEXT NOT NULL,
+                "status"	INTEGER NOT NULL DEFAULT 0,
+                "priority"	INTEGER NOT NULL,
+                "category"	TEXT NOT NULL,
+                "start_after"	INTEGER NOT NULL,
+                "created"	NUMERIC NOT NULL,
+                "vault"	TEXT,
+                "file"	TEXT,
+                "file_offset"	INTEGER,
+                "size"	INTEGER,
+                "job_id"	TEXT,
+                "payload"	BLOB NOT NULL
+            )""")
+        self.db.execute("""CREATE INDEX IF NOT EXISTS "ready_index" ON "tasks" (
+                               "status", "start_after", "category", "priority"
+                           )""")
+        self.db.execute('CREATE INDEX IF NOT EXISTS "group_id_index" ON "tasks" ("group_id" ASC)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS "name_index" ON "tasks" ("name" ASC)')
+
+    def _migrate_from_json_tasks(self):
+        """
+        Converts tasks table of first version, where every task was stored as JSON text, to current schema.
+        Everything but VACUUM is done in one transaction, and schema version is set last. So it is safe to
+        interrupt it. Migration that was interrupted by older version of this code (`tasks_v0` is left) is
+        finished too.
+        """
+        _logger.info(f"Migrating tasks database to schema version {_SCHEMA_VERSION}")
+        self.db.execute("BEGIN EXCLUSIVE")
+        try:
+            if not self._is_table_exists("tasks_v0"):
+                self.db.execute('ALTER TABLE "tasks" RENAME TO "tasks_v0"')
+            for index in ("priority_index", "executing_index", "group_id_index", "created_index"):
+                self.db.execute(f'DROP INDEX IF EXISTS "{index}"')
+            self._create_tasks_table()
+            cur = self.db.execute("SELECT json FROM tasks_v0 ORDER BY ROWID")
+            self.db.executemany(f"""INSERT OR IGNORE INTO tasks ({_TASK_COLUMNS})
+                                    VALUES ({_TASK_PLACEHOLDERS})""",
+                                (_task_to_row(json.loads(row[0])) for row in cur))
+            self.db.execute('DROP TABLE "tasks_v0"')
+            self.db.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("VACUUM")
+
+    def _load_ready_index(self, now: int):
+        with self._lock:
+            cur = self.db.execute("""SELECT category, priority, id, created, start_after, size
+                                     FROM tasks WHERE status=0 and start_after<=?""", (now,))
+            for category, priority, rowid, created, start_after, size in cur:
+                self._ready[category].append(self._key(priority, rowid, created, start_after, size))
+                self._ready_rowids[category].add(rowid)
+            for heap in self._ready.values():
+                heapq.heapify(heap)
+            _logger.debug(f'Ready tasks loaded: {self._qsize()}')
+
+    def _set_initial_timers(self, now: int):
+        with self._lock:
+            self.db.execute("BEGIN EXCLUSIVE")
+            cur = self.db.execute("""SELECT id, task_id, category, priority, created, start_after, size
+                                     FROM tasks WHERE start_after>?""", (now,))
+            for rowid, task_id, category, priority, created, start_after, size in cur:
+                till_start = start_after - now
+                key = self._key(priority, rowid, created, start_after, size)
+                self._start_timer(till_start, rowid, task_id, category, key)
+                _logger.debug(f'Task added to timer {till_start} {task_id}')
 
             self.db.execute("ROLLBACK")
 
-    def _qsize(self):
+    def _key(self, priority: int, rowid: int, created: Union[int, float], start_after: Union[int, float],
+             size: Optional[int]) -> ScheduleKey:
+        return self.policy.key(priority=priority, rowid=rowid, ready_since=max(created, start_after), size=size)
+
+    def _start_timer(self, till_start: Union[int, float], rowid: int, task_id: str, category: str, key: ScheduleKey):
+        t = threading.Timer(till_start + 1, self._on_task_timer_finished,
+                            kwargs={'rowid': rowid, 'task_id': task_id, 'category': category, 'key': key})
+        self._timers.add(t)
+        t.start()
+
+    def _push_ready(self, category: str, key: ScheduleKey):
+        heapq.heappush(self._ready[category], key)
+        self._ready_rowids[category].add(key[-1])
+
+    def _peek_ready(self, category: str) -> Optional[ScheduleKey]:
+        """Returns top of category heap. Drops deleted tasks from the top on its way."""
+        heap = self._ready[category]
+        while heap:
+            if heap[0][-1] in self._ready_rowids[category]:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def _pop_ready(self, category: Optional[TaskCategory] = None) -> int:
+        """
+        Removes the most prioritized ready task from index and returns its rowid.
+        If `category` is None, the task is picked among all categories with open time window.
+        """
+        if category is None:
+            tops = []
+            for c in self._open_categories():
+                top = self._peek_ready(c)
+                if top is not None:
+                    tops.append((top, c))
+            _, c = min(tops)
+        else:
+            c = category.value
+            self._peek_ready(c)
+        rowid = heapq.heappop(self._ready[c])[-1]
+        self._ready_rowids[c].remove(rowid)
+        return rowid
+
+    def _qsize(self, category: Optional[TaskCategory] = None):
         if self._exit_requested:
             return 1
-        with self._lock:
-            now = int(time())
-            cursor = self.db.execute("SELECT Count(*) FROM tasks WHERE executing=0 and start_after<=:now",
-                                     {"now": now})
-            return cursor.fetchone()[0]
+        return sum(len(self._ready_rowids[c]) for c in self._open_categories(category))
+
+    def _open_categories(self, category: Optional[TaskCategory] = None) -> List[str]:
+        """Returns `category` (or all categories if None) if its time window is open now"""
+        now = datetime.datetime.now()
+        categories = self._ready.keys() if category is None else [category.value]
+        return [c for c in categories if c not in self._windows or self._windows[c].is_open(now)]
+
+    def _till_window_opens(self, category: Optional[TaskCategory] = None) -> Optional[float]:
+        """
+        Returns seconds till the nearest opening of window of `category` (or any category if None)
+        that holds ready tasks. Returns None if no ready tasks are held.
+        """
+        now = datetime.datetime.now()
+        categories = self._ready.keys() if category is None else [category.value]
+        waits = [self._windows[c].seconds_till_open(now) for c in categories
+                 if c in self._windows and self._ready_rowids[c]]
+        return min(waits) if waits else None
+
+    def set_time_window(self, category: TaskCategory, window: Optional[TimeWindow]):
+        """
+        Tasks of `category` will be given to consumers only during `window`. If `window` is None, at any time.
+        """
+        with self.not_empty:
+            if window is None:
+                self._windows.pop(category.value, None)
+            else:
+                self._windows[category.value] = window
+            self.not_empty.notify_all()
+
+    def next_window_starts(self) -> Dict[TaskCategory, datetime.datetime]:
+        """Returns when held tasks will be released, for every category that has them."""
+        now = datetime.datetime.now()
+        with self.mutex:
+            return {c: self._windows[c.value].next_start(now) for c in TaskCategory
+                    if c.value in self._windows and self._ready_rowids[c.value]
+                    and not self._windows[c.value].is_open(now)}
 
     def put(self, tasks: Union[CommonTaskDict, List[CommonTaskDict]], block=True, timeout=None):
         """Put an item into the queue.
@@ -158,71 +403,99 @@ class SqliteTasksQueue(queue.Queue):
             with self._lock:
                 self.db.execute("BEGIN EXCLUSIVE")
                 for td in tasks:
-
-                    td['meta']['category'] = td['meta']['category'].value
-                    td['meta']['type'] = td['meta']['type'].value
-                    j = json.dumps(td)
-                    p = td['meta']['priority']
-                    i = td['meta']['id']
-                    s = td['meta']['start_after']
-                    c = td['meta']['category']
-                    g = td['meta']['group_id']
-                    n = td['meta']['name']
-                    cr = td['meta']['created']
-
-                    self.db.execute(
-                        """INSERT INTO tasks(task_id,
-                                             priority,
-                                             json,
-                                             executing, -- 0
-                                             start_after,
-                                             category,
-                                             group_id,
-                                             name,
-                                             created)
-                                     VALUES (:i, :p, :j, 0, :s, :c, :g, :n, :cr)""",
-                        {"i": i, "p": p, "j": j, "s": s, "c": c, "g": g, "n": n, "cr": cr})
+                    row = _task_to_row(td)
+                    cur = self.db.execute(f"""INSERT INTO tasks ({_TASK_COLUMNS})
+                                              VALUES ({_TASK_PLACEHOLDERS})""", row)
+                    i = row['task_id']
+                    s = row['start_after']
+                    c = row['category']
+                    key = self._key(row['priority'], cur.lastrowid, row['created'], s, row['size'])
                     till_start = s - time()
                     if till_start > 0:
-                        t = threading.Timer(till_start + 1, self._on_task_timer_finished, kwargs={'task_id': i})
-                        self._timers.add(t)
-                        t.start()
+                        self._start_timer(till_start, cur.lastrowid, i, c, key)
                         _logger.debug(f'Task added to timer {till_start} {i}')
                     else:
+                        self._push_ready(c, key)
                         self.unfinished_tasks += 1
-                        self.not_empty.notify()
-            self.db.execute('COMMIT')
+                        self.not_empty.notify_all()
+                self.db.execute('COMMIT')
 
-    def _on_task_timer_finished(self, task_id: str):
-        """Mark task as ready to be processed"""
+    def _on_task_timer_finished(self, rowid: int, task_id: str, category: str, key: ScheduleKey):
+        """
+        Mark task as ready to be processed.
+        Rowid of deleted task may be given to new task, so it is checked that row is still the same task.
+        """
         with self.mutex, self._lock:
-            cur = self.db.execute("SELECT executing FROM tasks WHERE task_id=?", (task_id,))
-            if cur.fetchone()[0] == 0:
-                self.not_empty.notify()
-                _logger.debug(f'Task restored by timer {task_id}')
+            row = self.db.execute("SELECT task_id, status, category FROM tasks WHERE id=?", (rowid,)).fetchone()
+            if row is None or row[0] != task_id or row[2] != category:
+                _logger.debug(f'Task was deleted before its timer finished')
+            elif row[1] == 0:
+                self._push_ready(category, key)
+                self.unfinished_tasks += 1
+                self.not_empty.notify_all()
+                _logger.debug(f'Task restored by timer {row[0]}')
             else:
                 _logger.warning(f'Task was already executing')
-            self.unfinished_tasks += 1
             self._clean_timers()
 
-    # Get an item from the queue
-    def _get(self) -> CommonTaskDict:
-        if self._exit_requested:
-            raise QueueExit
-        with self._lock:
-            now = int(time())
-            self.db.execute("BEGIN EXCLUSIVE")
-            cursor = self.db.execute(
-                """SELECT ROWID, json FROM tasks WHERE executing=0 and start_after<=:now
-                ORDER BY priority, ROWID LIMIT 1""", {'now': now})
-            rowid, j = cursor.fetchone()
-            data: CommonTaskDict = json.loads(j)
-            data['meta']['category'] = TaskCategory(data['meta']['category'])
-            data['meta']['type'] = TaskType(data['meta']['type'])
-            self.db.execute("UPDATE tasks SET executing=1 WHERE ROWID=:rowid", {"rowid": rowid})
-            self.db.execute('COMMIT')
+    def get(self, block: bool = True, timeout: Optional[float] = None,
+            category: Optional[TaskCategory] = None) -> CommonTaskDict:
+        """
+        Remove and return the most prioritized ready task of `category`.
+        If `category` is None, task of any category is returned.
+
+        Waiting threads are notified with `notify_all()`, because every one of them may wait for its own category.
+        """
+        return self.get_many(1, category, block, timeout)[0]
+
+    def qsize_by_category(self) -> Dict[TaskCategory, int]:
+        """Returns count of ready tasks for every category. Including tasks held till time window opens."""
+        with self.mutex:
+            return {c: len(self._ready_rowids[c.value]) for c in TaskCategory}
+
+    def get_many(self, n: int, category: Optional[TaskCategory] = None,
+                 block: bool = True, timeout: Optional[float] = None) -> List[CommonTaskDict]:
+        """
+        Claims up to `n` ready tasks at once. Tasks are returned in the order they would be returned by `get()`.
+        All of them are marked as executing in a single transaction.
 
-        return data
+        Blocks like `get()` until at least one task of `category` is ready. If `category` is None,
+        tasks of any category are returned.
+        While tasks are held by closed time window, sleeps till it opens. No timers needed for that.
+        """
+        assert n > 0, n
+        with self.not_empty:
+            if not block:
+                if not self._qsize(category):
+                    raise queue.Empty
+            elif timeout is None:
+                while not self._qsize(category):
+                    self.not_empty.wait(self._till_window_opens(category))
+            elif timeout < 0:
+                raise ValueError("'timeout' must be a non-negative number")
+            else:
+                end_time = time() + timeout
+                while not self._qsize(category):
+                    remaining = end_time - time()
+                    if remaining <= 0.0:
+                        raise queue.Empty
+                    till_open = self._till_window_opens(category)
+                    self.not_empty.wait(remaining if till_open is None else min(remaining, till_open))
+
+            if self._exit_requested:
+                raise QueueExit
+
+            with self._lock:
+                count = min(n, self._qsize(category))
+                rowids = [self._pop_ready(category) for _ in range(count)]
+                placeholders = ",".join("?" * len(rowids))
+                cur = self.db.execute(f"SELECT id, {_TASK_COLUMNS} FROM tasks WHERE id IN ({placeholders})", rowids)
+                by_rowid = {row[0]: row[1:] for row in cur}
+                self._pending_executing.extend(rowids)
+
+            self.not_full.notify()
+
+        return [_row_to_task(by_rowid[r]) for r in rowids]
 
     def _clean_timers(self):
         """Forgets about finished timers"""
@@ -237,6 +510,8 @@ class SqliteTasksQueue(queue.Queue):
                 t.cancel()
             self._exit_requested = True
             self.not_empty.notify_all()
+        self._stop_flushing.set()
+        self._flush()
 
     def find_task(self, *,
                   name: Optional[str] = None,
@@ -254,7 +529,7 @@ class SqliteTasksQueue(queue.Queue):
             ('priority', priority),
             ('category', category),
             ('name', name),
-            ('executing', executing),
+            ('status', None if executing is None else int(executing)),
             ('delayed', delayed),
         ]
 
@@ -263,15 +538,21 @@ class SqliteTasksQueue(queue.Queue):
         where_part = " and ".join([f"{n}=:{n}" for (n, _) in conditions])
         where_dict = {k: v for (k, v) in conditions}
         with self._lock:
-            c = self.db.execute(f"SELECT json FROM tasks WHERE {where_part} ORDER BY priority, ROWID", where_dict)
-            return [json.loads(row[0]) for row in c]
+            self._flush()
+            c = self.db.execute(f"SELECT {_TASK_COLUMNS} FROM tasks WHERE {where_part} ORDER BY priority, id",
+                                where_dict)
+            return [_row_to_task(row) for row in c]
 
     def delete_tasks(self, task_ids: List[str]):
-        with self._lock:
+        with self.mutex, self._lock:
+            self._flush()
             self.db.execute("BEGIN EXCLUSIVE")
             for tis in task_ids:
-                cur = self.db.execute("DELETE FROM tasks WHERE task_id=?", (tis, ))
-                if cur.rowcount == 1:
+                row = self.db.execute("SELECT id FROM tasks WHERE task_id=?", (tis, )).fetchone()
+                if row is not None:
+                    self.db.execute("DELETE FROM tasks WHERE id=?", row)
+                    for rowids in self._ready_rowids.values():
+                        rowids.discard(row[0])
                     _logger.debug(f"Deleted task {tis}")
                 else:
                     _logger.debug(f"Can't delete task {tis} - already removed")
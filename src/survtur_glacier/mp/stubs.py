@@ -20,6 +20,8 @@ class TaskType(enum.Enum):
     ARCHIVE_RECEIVE = "ARCHIVE_RECEIVE"
     ARCHIVE_UPLOAD = "ARCHIVE_UPLOAD"
     ARCHIVE_PART_UPLOAD = "ARCHIVE_PART_UPLOAD"
+    PACK_UPLOAD = "PACK_UPLOAD"
+    ARCHIVE_DELETE = "ARCHIVE_DELETE"
 
 
 class TaskCategory(enum.Enum):
@@ -52,13 +54,19 @@ class TaskMetaDict(TypedDict):
     start_after: int
     created: Union[int, float]
 
-    # It will help to pick task.
-    # Imagine you have upload channel full, then pick another one Download
-    # Exists, but NOT IMPLEMENTED
+    # Every category has its own pool of task processors.
+    # So cheap META tasks never wait behind long uploads and downloads.
     category: TaskCategory
 
 
-class TaskOutputDict(TypedDict):
+class _TaskTransferOutputDict(TypedDict, total=False):
+    # Only transfer tasks have these keys. Used to aggregate progress of tasks of the same group.
+    transferred: int
+    transfer_size: int
+    group_transfer_size: int
+
+
+class TaskOutputDict(_TaskTransferOutputDict):
     meta: TaskMetaDict
     percent: float
     string: str
@@ -13,6 +13,7 @@ _logger = logging.getLogger(__name__)
 class TaskAdder(threading.Thread):
     """
     Gets tasks from `queue_of_tasks_to_be_added` and puts it into `tasks_queue`.
+    Item of queue may be a list of tasks. See `TasksGeneralManager.add_tasks`.
     Also sends information to output_queue that new task was created.
 
     Has `stop` event to stop thread.  If you don't want exception about empty queue to be raised,
@@ -53,7 +54,11 @@ class TaskAdder(threading.Thread):
     def _collect_tasks_group(self) -> List[CommonTaskDict]:
         collected: List[CommonTaskDict] = []
         while True:
-            collected.append(self.queue_of_tasks_to_be_added.get())
+            item = self.queue_of_tasks_to_be_added.get()
+            if isinstance(item, list):
+                collected.extend(item)
+            else:
+                collected.append(item)
             if self.queue_of_tasks_to_be_added.empty():
                 break
         return collected
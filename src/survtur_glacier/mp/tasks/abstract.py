@@ -4,12 +4,13 @@ import multiprocessing
 import time
 from abc import ABC, abstractmethod
 from copy import deepcopy
-from typing import Callable, Any, Union
+from typing import Callable, Any, Union, Optional
 
 from ...common.config import Config
 from ...common.human_readable import human_readable_bytes
 from ...glacier.survtur_glacier import SurvturGlacier
-from ...mp.stubs import CommonTaskDict, TaskStatus, TaskOutputDict
+from ...mp.bandwidth import BandwidthLimits
+from ...mp.stubs import CommonTaskDict, TaskStatus, TaskOutputDict, TaskCategory
 from ...mp.tasks import id_gen
 
 _logger = logging.getLogger(__name__)
@@ -18,6 +19,7 @@ _logger = logging.getLogger(__name__)
 class AbstractTask(ABC):
     original_dict: CommonTaskDict
     config: Config
+    bandwidth: BandwidthLimits
     output_queue: 'multiprocessing.Queue[TaskOutputDict]'
 
     queue_of_tasks_to_be_added: 'multiprocessing.Queue[CommonTaskDict]'
@@ -27,10 +29,12 @@ class AbstractTask(ABC):
     def from_dict(cls, *, task_dict: dict,
                   output_queue: 'multiprocessing.Queue[TaskOutputDict]',
                   queue_of_tasks_to_be_added: 'multiprocessing.Queue[CommonTaskDict]',
-                  config: Config):
+                  config: Config,
+                  bandwidth: BandwidthLimits):
         task = cls()
         task.original_dict = deepcopy(task_dict)
         task.config = config
+        task.bandwidth = bandwidth
         task.output_queue = output_queue
         task.queue_of_tasks_to_be_added = queue_of_tasks_to_be_added
         task.glacier = SurvturGlacier(access_key_id=config.access_key_id,
@@ -50,12 +54,18 @@ class AbstractTask(ABC):
             'status': status
         })
 
-    def recreate_current_task(self, retry_delay: int):
+    def recreate_current_task(self, retry_delay: int, category: Optional[TaskCategory] = None):
+        """
+        Puts same task to queue again. It will start after `retry_delay` seconds.
+        If `category` specified, new task will be processed by workers of that category.
+        """
         self.emit_progress('Not ready yet', 0)
         new_meta = deepcopy(self.original_dict['meta'])
         new_meta['id'] = id_gen.task_id()
         new_meta['group_id'] = id_gen.group_id("")
         new_meta['start_after'] = int(time.time()) + retry_delay
+        if category is not None:
+            new_meta['category'] = category
 
         # show info
         name = self.original_dict['meta']['name']
@@ -84,6 +94,23 @@ class AbstractTask(ABC):
 
 class AbstractTransferTask(AbstractTask, ABC):
     last_transfer_progress: float = 0
+    group_transfer_size: Optional[int] = None
+    """Total size of transfers of task group. If task is a part of something bigger."""
+
+    def emit_transfer(self, text: str, percent: int, transferred: int, transfer_size: int,
+                      status: TaskStatus = TaskStatus.ACTIVE):
+        """Same as `emit_progress()`, but also tells how many bytes are transferred"""
+        t: TaskOutputDict = {
+            'meta': self.original_dict['meta'],
+            'percent': percent,
+            'string': text,
+            'status': status,
+            'transferred': transferred,
+            'transfer_size': transfer_size
+        }
+        if self.group_transfer_size is not None:
+            t['group_transfer_size'] = self.group_transfer_size
+        self.output_queue.put(t)
 
     def emit_transfer_progress(self, transferred: int, prefix: str,
                                planned_transfer_size: int, interval: Union[int, float] = 0.2):
@@ -111,4 +138,4 @@ class AbstractTransferTask(AbstractTask, ABC):
 
         s = f'{prefix}{hr_transferred}{percent_str}'
         self.last_transfer_progress = now
-        self.emit_progress(s, percent)
+        self.emit_transfer(s, percent, transferred, planned_transfer_size)
@@ -0,0 +1,76 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TypedDict, List
+
+from ...glacier.inventory import Inventory
+from .abstract import AbstractTask
+from ..stubs import TaskStatus
+
+_logger = logging.getLogger(__name__)
+
+DELETE_BATCH = 500
+"""Archives deleted by one task"""
+
+_DELETE_THREADS = 8
+"""Parallel requests. Client keeps 10 connections, so all of them are reused."""
+
+_DELETE_ATTEMPTS = 3
+
+
+class ArchiveDeleteTaskDict(TypedDict):
+    vault_name: str
+    vault_arn: str
+    archive_ids: List[str]
+
+
+class ArchiveDeleteTask(AbstractTask):
+    """
+    Deletes batch of archives by parallel requests of the same client, then removes them from inventory at once.
+    Archives that are not deleted make task fail. Restarted task deletes them again: ones that are already
+    deleted are skipped by Glacier.
+    """
+    data: ArchiveDeleteTaskDict
+
+    def process(self):
+        self.data = self.original_dict['data']
+        archive_ids = self.data['archive_ids']
+        deleted: List[str] = []
+        failed: List[str] = []
+
+        self.emit_progress("Deleting…", 0)
+        with ThreadPoolExecutor(_DELETE_THREADS, thread_name_prefix="delete") as pool:
+            futures = {pool.submit(self._delete, archive_id): archive_id for archive_id in archive_ids}
+            for done, f in enumerate(as_completed(futures), 1):
+                archive_id = futures[f]
+                try:
+                    f.result()
+                    deleted.append(archive_id)
+                except Exception as e:
+                    _logger.error(f"Archive {archive_id} is not deleted: {e!r}")
+                    failed.append(archive_id)
+                self.emit_progress(f"Deleting {done}/{len(archive_ids)}", int(100 * done / len(archive_ids)))
+
+        inv = self.get_inventory()
+        inv.remove_archives(deleted)
+        inv.close()
+
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(archive_ids)} archives are not deleted")
+        self.emit_progress(f"Deleted {len(deleted)}", 0, TaskStatus.SUCCESS)
+
+    def _delete(self, archive_id: str):
+        for attempt in range(1, _DELETE_ATTEMPTS + 1):
+            try:
+                if not self.glacier.delete_archive(self.data['vault_name'], archive_id):
+                    _logger.info(f"Archive {archive_id} was already deleted")
+                return
+            except Exception as e:
+                if attempt == _DELETE_ATTEMPTS:
+                    raise
+                _logger.warning(f"Deleting {archive_id} failed ({e!r}). Attempt {attempt}/{_DELETE_ATTEMPTS}")
+                time.sleep(2 * attempt)
+
+    def get_inventory(self) -> Inventory:
+        inv_file = self.glacier.inventory_filename(self.data['vault_arn'])
+        return Inventory(self.config.get_inventories_location(inv_file))
@@ -1,10 +1,16 @@
 import logging
 import os.path
 import time
-from typing import TypedDict, NamedTuple, Dict, List
+from typing import TypedDict, NamedTuple, Dict, List, Optional, Union
 
+from ...common.compression import Decompressor
+from ...common.config import Config
+from ...common.file_copy import reflink_or_copy
 from ...common.helpers import MB
-from ...glacier.hasher import sha256_tree_hash_hex
+from ...glacier.archive_cache import ArchiveCache
+from ...glacier.byte_range import ByteRange
+from ...glacier.hasher import sha256_tree_hash_hex, TreeHasher
+from ...glacier.pack import extract_member
 from ...glacier.survtur_glacier import GlacierTier
 from . import id_gen
 from .abstract import AbstractTask, AbstractTransferTask
@@ -14,6 +20,12 @@ from ..stubs import TaskStatus, CommonTaskDict, TaskMetaDict, TaskType, TaskCate
 _logger = logging.getLogger(__name__)
 
 
+class DownloadCopyDict(TypedDict):
+    """Where else downloaded archive is saved. Relative to `save_dir`, like archive itself."""
+    dirs_to_create: List[str]
+    save_name: str
+
+
 class InitiateArchiveRequestTaskDataDict(TypedDict):
     vault_name: str
     archive_id: str
@@ -22,6 +34,16 @@ class InitiateArchiveRequestTaskDataDict(TypedDict):
     dirs_to_create: List[str]
     hash: str
     tier: str
+    # For file packed into pack: where it is in pack. See `glacier.pack`. Tasks of older versions have no these keys.
+    member_offset: Optional[int]
+    member_size: Optional[int]
+    # Part of archive to retrieve, if not whole. See `glacier.byte_range`.
+    retrieval_range: Optional[ByteRange]
+    # For archive compressed before upload. See `common.compression`.
+    codec: Optional[str]
+    original_size: Optional[int]
+    # Archives of the same content, that are not downloaded separately. See `glacier.dedup.download_groups`.
+    copies: List[DownloadCopyDict]
 
 
 class RetrieveArchiveTaskDataDict(TypedDict):
@@ -32,6 +54,12 @@ class RetrieveArchiveTaskDataDict(TypedDict):
     dirs_to_create: List[str]
     hash: str
     tier: str  # Used to set proper delay between retries
+    member_offset: Optional[int]
+    member_size: Optional[int]
+    retrieval_range: Optional[ByteRange]
+    codec: Optional[str]
+    original_size: Optional[int]
+    copies: List[DownloadCopyDict]
 
 
 class _Delay(NamedTuple):
@@ -46,15 +74,65 @@ _tier_delays: Dict[GlacierTier, _Delay] = {
 }
 
 
+def _open_archive_cache(config: Config) -> Optional[ArchiveCache]:
+    if config.archive_cache_mb <= 0:
+        return None
+    return ArchiveCache(config.get_archive_cache_location(), config.archive_cache_mb * MB)
+
+
+def _make_dirs(save_dir: str, dirs_to_create: List[str]) -> str:
+    """Creates missing dirs. Returns the deepest one."""
+    assert os.path.isdir(save_dir)
+    for dir_name in dirs_to_create:
+        save_dir = os.path.join(save_dir, dir_name)
+        if not os.path.isdir(save_dir):
+            os.mkdir(save_dir)
+    return save_dir
+
+
+def _prepare_save_file(data: Union[InitiateArchiveRequestTaskDataDict, RetrieveArchiveTaskDataDict]) -> str:
+    """Creates missing dirs. Returns path to save archive to."""
+    save_file = os.path.join(_make_dirs(data['save_dir'], data['dirs_to_create']), data['save_name'])
+    assert not os.path.exists(save_file)
+    return save_file
+
+
+def _save_copies(data: Union[InitiateArchiveRequestTaskDataDict, RetrieveArchiveTaskDataDict], save_file: str):
+    """Saved archive is copied to paths of other archives of the same content"""
+    for c in data.get('copies') or []:
+        copy_file = os.path.join(_make_dirs(data['save_dir'], c['dirs_to_create']), c['save_name'])
+        if copy_file == save_file:
+            # The same file uploaded again
+            continue
+        if os.path.exists(copy_file):
+            _logger.warning(f"{copy_file} already exists. Not overwritten.")
+            continue
+        # Not hardlink: they were different files, and change of one must not change others
+        how = reflink_or_copy(save_file, copy_file)
+        _logger.info(f"{copy_file} is made by {how} of {save_file}")
+
+
 class InitiateArchiveRequestTask(AbstractTask):
 
     def process(self):
         data: InitiateArchiveRequestTaskDataDict = self.original_dict['data']
 
+        cache = _open_archive_cache(self.config)
+        if cache:
+            try:
+                save_file = _prepare_save_file(data)
+                if cache.materialize(data['hash'], save_file):
+                    _save_copies(data, save_file)
+                    self.emit_progress("Saved from cache", 0, TaskStatus.SUCCESS)
+                    return
+            finally:
+                cache.close()
+
         self.emit_progress('Requesting…', 0)
         tier = GlacierTier(data['tier'])
 
-        output = self.glacier.request_archive(data['vault_name'], data['archive_id'], tier)
+        output = self.glacier.request_archive(data['vault_name'], data['archive_id'], tier,
+                                              bytes_range=data.get('retrieval_range'))
         job_id = output['jobId']
 
         new_meta = TaskMetaDict(id=id_gen.task_id(),
@@ -64,7 +142,7 @@ class InitiateArchiveRequestTask(AbstractTask):
                                 priority=TaskPriority.DOWNLOAD_FILE,
                                 start_after=int(time.time()) + _tier_delays[tier].initial,
                                 created=self.original_dict['meta']['created'],
-                                category=TaskCategory.DOWNLOAD)
+                                category=TaskCategory.META)  # Checking the job is cheap. See ReceiveArchiveTask.
 
         new_data = RetrieveArchiveTaskDataDict(
             vault_name=data['vault_name'],
@@ -73,7 +151,13 @@ class InitiateArchiveRequestTask(AbstractTask):
             save_name=data['save_name'],
             dirs_to_create=data['dirs_to_create'],
             hash=data['hash'],
-            tier=data['tier']
+            tier=data['tier'],
+            member_offset=data.get('member_offset'),
+            member_size=data.get('member_size'),
+            retrieval_range=data.get('retrieval_range'),
+            codec=data.get('codec'),
+            original_size=data.get('original_size'),
+            copies=data.get('copies') or []
         )
 
         t: CommonTaskDict = {'meta': new_meta, 'data': new_data}
@@ -96,20 +180,26 @@ class ReceiveArchiveTask(AbstractTransferTask):
         self.check_job(self.data['vault_name'], self.data['job_id'], self._download_archive, next_check_delay)
 
     def _download_archive(self, job_info: dict):
+        # Task is created in META category to check job status without waiting behind other downloads.
+        # Downloading itself must not occupy META worker, so task goes to DOWNLOAD workers now.
+        if self.original_dict['meta']['category'] != TaskCategory.DOWNLOAD:
+            _logger.debug("Job is ready. Handing over task to download workers.")
+            self.recreate_current_task(0, TaskCategory.DOWNLOAD)
+            return
+
+        save_file = _prepare_save_file(self.data)
+
+        retrieval_range = self.data.get('retrieval_range')
+        if retrieval_range:
+            self.archive_size_in_bytes = retrieval_range[1] - retrieval_range[0] + 1
+        else:
+            self.archive_size_in_bytes = job_info['ArchiveSizeInBytes']
+        temp_file = save_file + ".tmp"
 
-        assert os.path.isdir(self.data['save_dir'])
-
-        save_dir = self.data['save_dir']
-        for dir_name in self.data['dirs_to_create']:
-            save_dir = os.path.join(save_dir, dir_name)
-            if not os.path.isdir(save_dir):
-                os.mkdir(save_dir)
-
-        save_file = os.path.join(save_dir, self.data['save_name'])
-        assert not os.path.exists(save_file)
+        if self.data.get('codec'):
+            self._download_decompressed(temp_file, save_file)
+            return
 
-        self.archive_size_in_bytes = job_info['ArchiveSizeInBytes']
-        temp_file = save_file + ".tmp"
         if os.path.exists(temp_file):
             self.start_download_from = os.path.getsize(temp_file)
             start_percent = (self.start_download_from / self.archive_size_in_bytes) * 100
@@ -124,12 +214,19 @@ class ReceiveArchiveTask(AbstractTransferTask):
                 job_id=self.data['job_id'],
                 bytes_range=(self.start_download_from, self.archive_size_in_bytes - 1),
                 on_read_callback=self.emit_download_progress_plus,
-                read_size=1 * MB
+                read_size=1 * MB,
+                throttle=self.bandwidth.download.consume
             )
 
             for b in body_flow:
                 f.write(b)
 
+        if retrieval_range:
+            self._check_retrieved_range(temp_file, job_info)
+
+        if self.data.get('member_offset') is not None:
+            temp_file = self._extract_member(temp_file, save_file)
+
         with open(temp_file, mode='br') as f:
             sha, _ = sha256_tree_hash_hex(f, 256, progress_cb=self.sha_progress)
         if sha == self.data['hash']:
@@ -141,8 +238,97 @@ class ReceiveArchiveTask(AbstractTransferTask):
             raise BadHash
 
         os.renames(temp_file, save_file)
+        self._put_to_cache(save_file)
+        _save_copies(self.data, save_file)
         self.emit_progress("Saved", 0, TaskStatus.SUCCESS)
 
+    def _put_to_cache(self, save_file: str):
+        """Saved file is cached by hash of archive as it is in inventory. Failed caching does not fail download."""
+        cache = _open_archive_cache(self.config)
+        if not cache:
+            return
+        try:
+            cache.put(self.data['hash'], save_file)
+        except Exception as e:
+            _logger.warning(f"{save_file} is not cached: {e!r}")
+        finally:
+            cache.close()
+
+    def _download_decompressed(self, temp_file: str, save_file: str):
+        """
+        Archive is decompressed while downloading. Tree hash is of compressed content, so it is calculated
+        on the way too. State of decompressor can not be restored, so download is never resumed.
+        """
+        self.start_download_from = 0
+        hasher = TreeHasher()
+        decompressor = Decompressor(self.data['codec'])
+        with open(temp_file, mode='bw') as f:
+            body_flow = self.glacier.get_job_output(
+                vault_name=self.data['vault_name'],
+                job_id=self.data['job_id'],
+                bytes_range=(0, self.archive_size_in_bytes - 1),
+                on_read_callback=self.emit_download_progress_plus,
+                read_size=1 * MB,
+                throttle=self.bandwidth.download.consume
+            )
+            for b in body_flow:
+                hasher.update(b)
+                f.write(decompressor.decompress(b))
+            f.write(decompressor.flush())
+
+        original_size = self.data.get('original_size')
+        if hasher.hexdigest() != self.data['hash']:
+            _logger.critical("Incorrect hash of compressed archive!")
+        elif original_size is not None and os.path.getsize(temp_file) != original_size:
+            _logger.critical(f"Decompressed size {os.path.getsize(temp_file)} is not {original_size}!")
+        else:
+            _logger.info("Hash is ok")
+            os.renames(temp_file, save_file)
+            self._put_to_cache(save_file)
+            _save_copies(self.data, save_file)
+            self.emit_progress("Saved", 0, TaskStatus.SUCCESS)
+            return
+
+        new_name = save_file + f".badHash.{int(time.time())}"
+        _logger.critical(f"Bad file saved to {new_name}")
+        os.renames(temp_file, new_name)
+        raise BadHash
+
+    def _check_retrieved_range(self, temp_file: str, job_info: dict):
+        """
+        Glacier gives tree hash of retrieved range, if range is tree hash aligned.
+        It is checked before extracting, so broken download is not confused with broken member.
+        """
+        range_hash = job_info.get('SHA256TreeHash')
+        if not range_hash:
+            _logger.info("Retrieved range is not tree hash aligned. Only extracted member is checked.")
+            return
+        with open(temp_file, mode='br') as f:
+            sha, _ = sha256_tree_hash_hex(f, 256, progress_cb=self.sha_progress)
+        if sha != range_hash:
+            new_name = temp_file + f".badHash.{int(time.time())}"
+            _logger.critical(f"Incorrect hash of retrieved range! Bad range saved to {new_name}")
+            os.renames(temp_file, new_name)
+            raise BadHash
+        _logger.info("Hash of retrieved range is ok")
+
+    def _extract_member(self, pack_file: str, save_file: str) -> str:
+        """
+        Extracts packed file from downloaded pack or from retrieved range of pack.
+        Returns extracted temporary file. Pack is removed.
+        """
+        member_file = save_file + ".member.tmp"
+        retrieval_range = self.data.get('retrieval_range')
+        offset = self.data['member_offset'] - (retrieval_range[0] if retrieval_range else 0)
+        with open(pack_file, mode='br') as src, open(member_file, mode='bw') as dst:
+            extract_member(src, offset, self.data['member_size'], dst,
+                           progress_cb=lambda n: self.emit_transfer_progress(n, "Extracting ",
+                                                                             self.data['member_size']))
+        os.remove(pack_file)
+        # Hash is checked for extracted file only
+        self.archive_size_in_bytes = self.data['member_size']
+        return member_file
+
     def sha_progress(self, total_bytes_read: int):
         self.emit_transfer_progress(total_bytes_read, "Checking", self.archive_size_in_bytes)
 
@@ -1,4 +1,3 @@
-import datetime
 import secrets
 from typing import NewType
 
@@ -11,10 +10,7 @@ GroupId = NewType('GroupId', str)
 
 
 def task_id() -> TaskId:
-    s = secrets.token_urlsafe(64)
-    s += " @ " + datetime.datetime.utcnow().isoformat()
-
-    return TaskId(s)
+    return TaskId(secrets.token_urlsafe(12))
 
 
 def group_id(name: str) -> GroupId:
@@ -3,21 +3,29 @@ import logging
 import os.path
 import threading
 from io import BytesIO
-from typing import TypedDict, List
+from typing import TypedDict, List, Optional, Tuple, BinaryIO
 
 from ...common.helpers import MB
 from ...common.human_readable import human_readable_bytes
 from ...common.iopart2 import ReadProgressInfo
-from ...glacier.hasher import sha256_tree_hash_hex
+from ...glacier.hasher import sha256_tree_hash_hex, sha256_tree_and_linear_hashes_hex
 from ...glacier.inventory import Inventory, ArchiveInfo
+from ...glacier.pack import read_pack_index
+from ...glacier.part_size import choose_part_size_mb, MAX_PARTS_COUNT
+from ...glacier.stream_upload import StreamUploader, DEFAULT_STREAM_PART_SIZE_MB
+from ...glacier.survtur_glacier import SurvturGlacier
 from . import id_gen
 from .abstract import AbstractTransferTask
 from .errors import AcceptableTaskError
-from .upload_part import UploadPartTaskDict
-from ..stubs import TaskStatus, TaskMetaDict, TaskType, TaskPriority, TaskCategory, CommonTaskDict
+from .upload_part import enqueue_next_parts, complete_upload, remove_uploaded_pack
+from ..stubs import TaskStatus
+from ..uploads_db import UploadsDB, UploadPlanDict
 
 _logger = logging.getLogger(__name__)
 
+_COMPRESSED_UPLOAD_THREADS = 2
+"""Parts of compressed file are kept in memory while uploading. See `StreamUploader`."""
+
 
 class Duplicate(AcceptableTaskError):
     new_file: str = ""
@@ -31,6 +39,7 @@ class InitiateUploadTaskDict(TypedDict):
     save_as_path: str
     save_as_name: str
     check_for_duplicates: bool
+    pack: bool  # File is a pack made by PackUploadTask. Tasks of older versions have no this key.
 
 
 class InitiateArchiveUploadTask(AbstractTransferTask):
@@ -40,6 +49,8 @@ class InitiateArchiveUploadTask(AbstractTransferTask):
     size: int
     sha256: str = ""
     part_hashes: List[str]
+    linear_part_hashes: List[str]
+    part_size_mb: int
 
     def process(self):
         self.data = self.original_dict['data']
@@ -48,16 +59,51 @@ class InitiateArchiveUploadTask(AbstractTransferTask):
         is_dir = os.path.isdir(file)
 
         self.size = 1 if is_dir else os.path.getsize(file)
+        self.part_size_mb = self._choose_part_size_mb()
+
+        codec = None if is_dir else self._codec()
+        if codec:
+            if self.data['check_for_duplicates']:
+                # Only uncompressed uploads of the same file are found. Compressed ones have other hash.
+                self._calculate_hash()
+                self._exit_on_duplicate()
+            self._upload_compressed(codec)
+            return
 
         self._calculate_hash()
+        if self.data.get('pack'):
+            self._put_pack_members()
         if not is_dir and self.data['check_for_duplicates']:
             self._exit_on_duplicate()
         _logger.info(f"Initiating upload {self.data['save_as_path']}{self.data['save_as_name']}")
-        if is_dir or self.size <= self.config.chunk_size_mb * MB:
+        if is_dir or self.size <= self.part_size_mb * MB:
             self._upload_in_one_step()
         else:
             self._initiate_multipart_upload()
 
+    def _codec(self) -> Optional[str]:
+        """Codec to compress file with. Packs are never compressed: offsets of members must stay valid."""
+        codec = self.config.compression
+        if not codec or self.data.get('pack'):
+            return None
+        if not self.config.fast_glacier_style_naming:
+            _logger.warning(f"Compression requires fast_glacier_style_naming. {self.data['file']} "
+                            f"is uploaded uncompressed.")
+            return None
+        return codec
+
+    def _choose_part_size_mb(self) -> int:
+        """Part size from config. Or the best for this file if config says "auto"."""
+        if self.config.chunk_size_mb is not None:
+            return self.config.chunk_size_mb
+        throughput = UploadsDB.shared(os.path.join(self.config.workdir, "uploads.db")).get_throughput()
+        part_size_mb = choose_part_size_mb(self.size, self.config.target_parts_count,
+                                           throughput, self.config.max_part_seconds,
+                                           min_part_size_mb=self.config.min_part_size_mb,
+                                           single_upload_max_size=self.config.single_upload_max_mb * MB)
+        _logger.info(f"Part size for {self.data['file']}: {part_size_mb} MB")
+        return part_size_mb
+
     def _calculate_hash(self):
         # FastGlacier's way of hashing directories
         if os.path.isdir(self.data['file']):
@@ -74,9 +120,10 @@ class InitiateArchiveUploadTask(AbstractTransferTask):
                 self.emit_progress(f"Checksum {percent}%", percent)
 
         with open(self.data['file'], mode='br') as f:
-            self.sha256, self.part_hashes = sha256_tree_hash_hex(
+            # Plain hashes are calculated in the same read. So they are not calculated again while uploading.
+            self.sha256, self.part_hashes, self.linear_part_hashes = sha256_tree_and_linear_hashes_hex(
                 readable_io=f,
-                chunk_size_mb=self.config.chunk_size_mb,
+                chunk_size_mb=self.part_size_mb,
                 progress_cb=hashing_callback if self.size > 0 else None)
 
     def _process_cb(self, i: ReadProgressInfo):
@@ -89,19 +136,83 @@ class InitiateArchiveUploadTask(AbstractTransferTask):
             hr = human_readable_bytes(read)
             self.emit_progress(f"Uploading {hr} {percent}%", percent)
 
+    def _upload_compressed(self, codec: str):
+        """
+        Compressed size is not known in advance, so file is uploaded as a stream. See `StreamUploader`.
+        Such upload is not resumed after restart.
+        """
+        file = self.data['file']
+        # Compressed file is rarely bigger than original, but parts must fit it anyway
+        part_size_mb = max(min(self.part_size_mb, DEFAULT_STREAM_PART_SIZE_MB),
+                           choose_part_size_mb(self.size + self.size // 100 + MB, MAX_PARTS_COUNT))
+        _logger.info(f"Compressing {file} with {codec}")
+
+        def make_glacier() -> SurvturGlacier:
+            return SurvturGlacier(access_key_id=self.config.access_key_id,
+                                  secret_access_key=self.config.secret_access_key,
+                                  region_name=self.config.region_name)
+
+        with open(file, mode='br') as f:
+            uploader = StreamUploader(make_glacier, self.data['vault_name'],
+                                      self.data['save_as_path'] + self.data['save_as_name'],
+                                      use_glacier_format=True,
+                                      part_size_mb=part_size_mb,
+                                      threads=_COMPRESSED_UPLOAD_THREADS,
+                                      progress_cb=lambda n: self._compressed_progress_cb(f, n),
+                                      throttle=self.bandwidth.upload.consume,
+                                      file=file,
+                                      codec=codec,
+                                      compression_level=self.config.compression_level,
+                                      original_size=self.size)
+            result = uploader.upload(f)
+        _logger.info(f"{file} compressed to {human_readable_bytes(result.size)} "
+                     f"of {human_readable_bytes(result.original_size)}")
+
+        inv = self.get_inventory()
+        a = ArchiveInfo(
+            archive_id=result.archive_id,
+            parent=self.data['save_as_path'],
+            name=self.data['save_as_name'],
+            upload_timestamp=datetime.datetime.now().timestamp(),
+            modified_timestamp=os.path.getmtime(file),
+            sha256=result.sha256,
+            size=result.size,
+            is_dir=False,
+            codec=codec,
+            original_size=result.original_size
+        )
+        with threading.Lock():
+            inv.put_archive(a)
+            inv.save()
+            inv.close()
+
+        self.emit_progress("Uploaded", 0, TaskStatus.SUCCESS)
+
+    def _compressed_progress_cb(self, f: BinaryIO, uploaded: int):
+        """Percent is of original file read. Compressed size is not known till the end."""
+        now = datetime.datetime.now()
+        if (now - self.last_status_update).total_seconds() > 0.2:
+            self.last_status_update = now
+            percent = min(100, int(100 * f.tell() / self.size)) if self.size else 100
+            self.emit_progress(f"Uploading compressed {human_readable_bytes(uploaded)} {percent}%", percent)
+
     def _upload_in_one_step(self):
         file = self.data['file']
+        is_dir = os.path.isdir(file)
+        # File of one part: its plain hash is hash of the whole body
+        payload_sha256 = None if is_dir else self.linear_part_hashes[0]
         archive_id: str = self.glacier.upload_archive(
             vault_name=self.data['vault_name'],
             file=file,
             checksum=self.sha256,
             save_name=self.data['save_as_path'] + self.data['save_as_name'],
             use_glacier_format=self.config.fast_glacier_style_naming,
-            progress_cb=self._process_cb
+            progress_cb=self._process_cb,
+            throttle=self.bandwidth.upload.consume,
+            payload_sha256=payload_sha256
         )
 
         inv = self.get_inventory()
-        is_dir = os.path.isdir(file)
         a = ArchiveInfo(
             archive_id=archive_id,
             parent=self.data['save_as_path'],
@@ -116,57 +227,91 @@ class InitiateArchiveUploadTask(AbstractTransferTask):
             inv.put_archive(a)
             inv.save()
             inv.close()
+        remove_uploaded_pack(self.config, file)
 
         self.emit_progress("Uploaded", 0, TaskStatus.SUCCESS)
 
     def _initiate_multipart_upload(self):
-        upload_id = self.glacier.initiate_archive_upload(file=self.data['file'],
+        udb = UploadsDB.shared(os.path.join(self.config.workdir, "uploads.db"))
+        upload_id, uploaded_parts = None, []
+        if self.config.resume_lost_uploads or udb.has_upload_plan(self.data['file'], self.sha256):
+            upload_id, uploaded_parts = self._find_upload_to_resume()
+        if upload_id is None:
+            upload_id = self.glacier.initiate_archive_upload(
+                file=self.data['file'],
+                vault_name=self.data['vault_name'],
+                save_as=self.data['save_as_path'] + self.data['save_as_name'],
+                use_glacier_format=self.config.fast_glacier_style_naming,
+                part_size_mb=self.part_size_mb)
+
+        # Parts are not enqueued all at once. Plan is saved, and every uploaded part enqueues the next one.
+        plan = UploadPlanDict(
+            upload_id=upload_id,
+            vault_arn=self.data['vault_arn'],
+            vault_name=self.data['vault_name'],
+            file=self.data['file'],
+            original_file_size=self.size,
+            sha256_of_file=self.sha256,
+            part_size=self.part_size_mb * MB,
+            total_parts_count=len(self.part_hashes),
+            save_as_path=self.data['save_as_path'],
+            save_as_name=self.data['save_as_name'],
+            group_id=id_gen.group_id(os.path.basename(self.data['file'])),
+        )
+        udb.put_upload_plan(plan, self.part_hashes, self.linear_part_hashes)
+        if uploaded_parts:
+            record = udb.record_parts(upload_id, uploaded_parts, plan['total_parts_count'])
+            if record.should_complete:
+                complete_upload(self.glacier, udb, plan, self.get_inventory())
+                remove_uploaded_pack(self.config, plan['file'])
+                self.emit_progress("Uploaded", 0, TaskStatus.SUCCESS)
+                return
+        enqueue_next_parts(udb, upload_id, self.config.max_parts_in_queue, self.queue_of_tasks_to_be_added)
+
+        self.emit_progress('', 0, TaskStatus.REMOVED_SILENTLY)
+
+    def _find_upload_to_resume(self) -> Tuple[Optional[str], List[Tuple[int, int]]]:
+        """
+        Looks for not completed multipart upload of the same file, that was initiated with the same part size.
+        Returns its id and (part_index, part_size) of parts which tree hashes match local file.
+        Only these parts will not be uploaded again. Returns (None, []) if there is nothing to resume.
+        """
+        self.emit_progress("Looking for upload to resume…", self.percent)
+        part_size = self.part_size_mb * MB
+        upload_ids = self.glacier.find_multipart_uploads(file=self.data['file'],
                                                          vault_name=self.data['vault_name'],
                                                          save_as=self.data['save_as_path'] + self.data['save_as_name'],
                                                          use_glacier_format=self.config.fast_glacier_style_naming,
-                                                         part_size_mb=self.config.chunk_size_mb)
-
-        part_size = self.config.chunk_size_mb * MB
-        filename = os.path.basename(self.data['file'])
-        group_id = id_gen.group_id(filename)
-        total_parts = len(self.part_hashes)
-        for part_index, part_hash in enumerate(self.part_hashes):
-            part_offset = part_index * part_size
-            data = UploadPartTaskDict(
-                vault_arn=self.data['vault_arn'],
-                vault_name=self.data['vault_name'],
-                file=self.data['file'],
-                original_file_size=self.size,
-                sha256_of_file=self.sha256,
-                sha256_of_part=part_hash,
-                part_offset=part_offset,
-                part_size=min(self.size - part_offset, part_size),
-                total_parts_count=total_parts,
-                upload_id=upload_id,
-                part_index=part_index,
-                save_as_name=self.data['save_as_name'],
-                save_as_path=self.data['save_as_path'],
-            )
-
-            meta = TaskMetaDict(
-                id=id_gen.task_id(),
-                group_id=group_id,
-                name=f"Upload {filename} {part_index + 1}/{total_parts}",
-                type=TaskType.ARCHIVE_PART_UPLOAD,
-                priority=TaskPriority.UPLOAD_FILE,
-                start_after=0,
-                created=datetime.datetime.now().timestamp(),
-                category=TaskCategory.UPLOAD
-            )
-
-            new_task = CommonTaskDict(
-                meta=meta,
-                data=data
-            )
-
-            self.queue_of_tasks_to_be_added.put(new_task)
+                                                         part_size_mb=self.part_size_mb)
+        best_upload_id, best_parts = None, []
+        for upload_id in upload_ids:
+            verified = []
+            for p in self.glacier.list_parts(self.data['vault_name'], upload_id):
+                i, remainder = divmod(p.offset, part_size)
+                if remainder or i >= len(self.part_hashes) or p.size != min(part_size, self.size - p.offset):
+                    _logger.info(f"Upload {upload_id} has part {p} that does not fit the file. Not resuming it.")
+                    break
+                if p.sha256_tree_hash == self.part_hashes[i]:
+                    verified.append((i, p.size))
+                else:
+                    _logger.warning(f"Part {i} of upload {upload_id} differs from file. It will be uploaded again.")
+            else:
+                if best_upload_id is None or len(verified) > len(best_parts):
+                    best_upload_id, best_parts = upload_id, verified
 
-        self.emit_progress('', 0, TaskStatus.REMOVED_SILENTLY)
+        if best_upload_id is not None:
+            _logger.info(f"Resuming upload {best_upload_id}. Parts already uploaded: "
+                         f"{len(best_parts)}/{len(self.part_hashes)}")
+        return best_upload_id, best_parts
+
+    def _put_pack_members(self):
+        """Members are shown in inventory as soon as archive with the same hash as pack is there"""
+        with open(self.data['file'], mode='br') as f:
+            members = read_pack_index(f)
+        inv = self.get_inventory()
+        inv.put_members(self.sha256, members)
+        inv.save()
+        inv.close()
 
     def _exit_on_duplicate(self):
         """
@@ -92,7 +92,9 @@ def _parse_fast_glacier(d: Archive) -> ArchiveInfo:
         modified_timestamp=info.last_modified.timestamp(),
         sha256=d['SHA256TreeHash'],
         size=d['Size'] if not info.is_dir else None,
-        is_dir=info.is_dir
+        is_dir=info.is_dir,
+        codec=info.codec,
+        original_size=info.original_size
     )
     return a
 
@@ -123,10 +125,17 @@ class RetrieveInventoryContentTask(AbstractTransferTask):
         inv.set_vault_info(self.data['vault_arn'], datetime.now().timestamp())
         cvs_reader = csv.DictReader((b.decode('ascii') for b in BytesToLinesIterator(inventory_getter)))
         temp_db = db_fullpath + ".temp_data"
+        # Inventory of vault may be older than deletion of archive. Deleted archives must not come back.
+        deleted = inv.deleted_archive_ids()
+        still_listed = set()
         with open(temp_db, mode='tw') as f:
             for d in cvs_reader:
                 print(d, file=f)
+                if d['ArchiveId'] in deleted:
+                    still_listed.add(d['ArchiveId'])
+                    continue
                 inv.put_archive(_archive_from_aws_dict(d))
+        inv.confirm_deletes(still_listed)
 
         inv.save()
         os.remove(temp_db)
@@ -0,0 +1,90 @@
+import datetime
+import logging
+import os.path
+from typing import TypedDict, List
+
+from ...common.human_readable import human_readable_bytes
+from ...glacier.inventory import Inventory
+from ...glacier.pack import PackWriter, PACKS_FOLDER, member_sha256
+from . import id_gen
+from .abstract import AbstractTransferTask
+from .initiate_upload import InitiateUploadTaskDict
+from ..stubs import TaskStatus, CommonTaskDict, TaskMetaDict, TaskType, TaskPriority, TaskCategory
+
+_logger = logging.getLogger(__name__)
+
+
+class PackFileDict(TypedDict):
+    file: str
+    save_as_path: str
+    save_as_name: str
+
+
+class PackUploadTaskDict(TypedDict):
+    vault_name: str
+    vault_arn: str
+    files: List[PackFileDict]
+    check_for_duplicates: bool
+
+
+class PackUploadTask(AbstractTransferTask):
+    """
+    Packs many small files to one pack (see `glacier.pack`) and hands it over to usual upload task.
+    Packed files are put to inventory when pack is hashed. They are shown when pack is uploaded.
+    """
+    data: PackUploadTaskDict
+
+    def process(self):
+        self.data = self.original_dict['data']
+        total_size = sum(os.path.getsize(f['file']) for f in self.data['files'])
+        pack_name = f"{self.original_dict['meta']['id']}.svpk"
+        pack_file = self.config.get_packs_location(pack_name)
+
+        inv = self.get_inventory()
+        skipped = 0
+        read = 0
+        with open(pack_file, mode='bw') as f:
+            w = PackWriter(f)
+            for pf in self.data['files']:
+                with open(pf['file'], mode='br') as src:
+                    data = src.read()
+                read += len(data)
+                sha256 = member_sha256(data)
+                if self.data['check_for_duplicates'] and any(inv.find(size=len(data), sha256_tree_hash=sha256)):
+                    _logger.info(f"Same file exists. Not packing {pf['file']}")
+                    skipped += 1
+                    continue
+                w.add(data, pf['save_as_path'], pf['save_as_name'], os.path.getmtime(pf['file']), sha256)
+                self.emit_transfer_progress(read, "Packing ", total_size)
+            w.finish()
+        inv.close()
+
+        if not w.members:
+            os.remove(pack_file)
+            self.emit_progress(f"All {skipped} files exist", 0, TaskStatus.SUCCESS)
+            return
+
+        meta = TaskMetaDict(id=id_gen.task_id(),
+                            group_id=id_gen.group_id(""),
+                            name=f"Upload pack of {len(w.members)} files {human_readable_bytes(w.size)}",
+                            type=TaskType.ARCHIVE_UPLOAD,
+                            priority=TaskPriority.INITIATE_UPLOAD,
+                            category=TaskCategory.UPLOAD,
+                            start_after=0,
+                            created=datetime.datetime.now().timestamp())
+        data = InitiateUploadTaskDict(
+            vault_name=self.data['vault_name'],
+            vault_arn=self.data['vault_arn'],
+            file=pack_file,
+            save_as_path=PACKS_FOLDER,
+            save_as_name=pack_name,
+            check_for_duplicates=False,
+            pack=True
+        )
+        self.queue_of_tasks_to_be_added.put(CommonTaskDict(meta=meta, data=data))
+        self.emit_progress('', 0, TaskStatus.REMOVED_SILENTLY)
+
+    def get_inventory(self) -> Inventory:
+        inv_file = self.glacier.inventory_filename(self.data['vault_arn'])
+        inv_file_full = self.config.get_inventories_location(inv_file)
+        return Inventory(inv_file_full)
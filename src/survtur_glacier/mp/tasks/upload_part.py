@@ -1,15 +1,20 @@
-import mmap
+import datetime
+import multiprocessing
 import os.path
 import time
 import typing
-from typing import TypedDict
+from typing import TypedDict, Optional
 from typing.io import IO
 
-from ...common.iopart2 import MmapWithReadCallback, ReadProgressInfo
+from ...common.config import Config
+from ...common.human_readable import human_readable_bytes
+from ...common.iopart2 import MmapBody, ReadProgressInfo
 from ...glacier.inventory import Inventory, ArchiveInfo
+from ...glacier.survtur_glacier import SurvturGlacier
+from . import id_gen
 from .abstract import AbstractTransferTask
-from ...mp.uploads_db import UploadsDB
-from ..stubs import TaskStatus
+from ...mp.uploads_db import UploadsDB, UploadPlanDict
+from ..stubs import TaskStatus, CommonTaskDict, TaskMetaDict, TaskType, TaskPriority, TaskCategory
 
 
 class UploadPartTaskDict(TypedDict):
@@ -20,6 +25,7 @@ class UploadPartTaskDict(TypedDict):
     total_parts_count: int
     sha256_of_file: str
     sha256_of_part: str
+    linear_sha256_of_part: Optional[str]
     part_offset: int
     part_size: int
     part_index: int
@@ -28,6 +34,90 @@ class UploadPartTaskDict(TypedDict):
     save_as_name: str
 
 
+def make_part_task(plan: UploadPlanDict, part_index: int, part_hash: str,
+                   linear_part_hash: Optional[str] = None) -> CommonTaskDict:
+    """Creates task to upload one part of multipart upload"""
+    part_offset = part_index * plan['part_size']
+    total_parts = plan['total_parts_count']
+    data = UploadPartTaskDict(
+        vault_arn=plan['vault_arn'],
+        vault_name=plan['vault_name'],
+        file=plan['file'],
+        original_file_size=plan['original_file_size'],
+        sha256_of_file=plan['sha256_of_file'],
+        sha256_of_part=part_hash,
+        linear_sha256_of_part=linear_part_hash,
+        part_offset=part_offset,
+        part_size=min(plan['original_file_size'] - part_offset, plan['part_size']),
+        total_parts_count=total_parts,
+        upload_id=plan['upload_id'],
+        part_index=part_index,
+        save_as_name=plan['save_as_name'],
+        save_as_path=plan['save_as_path'],
+    )
+
+    meta = TaskMetaDict(
+        id=id_gen.task_id(),
+        group_id=plan['group_id'],
+        name=f"Upload {os.path.basename(plan['file'])} {part_index + 1}/{total_parts}",
+        type=TaskType.ARCHIVE_PART_UPLOAD,
+        priority=TaskPriority.UPLOAD_FILE,
+        start_after=0,
+        created=datetime.datetime.now().timestamp(),
+        category=TaskCategory.UPLOAD
+    )
+
+    return CommonTaskDict(meta=meta, data=data)
+
+
+def enqueue_next_parts(udb: UploadsDB, upload_id: str, max_in_flight: int,
+                       queue_of_tasks_to_be_added: 'multiprocessing.Queue[CommonTaskDict]'):
+    """Adds tasks for next parts of upload, keeping at most `max_in_flight` parts queued or uploading"""
+    part_indexes = udb.claim_next_parts(upload_id, max_in_flight)
+    if not part_indexes:
+        return
+    plan = udb.get_upload_plan(upload_id)
+    for i in part_indexes:
+        queue_of_tasks_to_be_added.put(make_part_task(plan, i, *udb.get_part_hashes(upload_id, i)))
+
+
+def complete_upload(glacier: SurvturGlacier, udb: UploadsDB, d: typing.Union[UploadPartTaskDict, UploadPlanDict],
+                    inv: Inventory):
+    """
+    Completes multipart upload and puts archive to inventory.
+    Must be called only by the one who got `should_complete` from `UploadsDB.record_part()`.
+    """
+    try:
+        archive_id = glacier.complete_multipart_upload(
+            vault_name=d['vault_name'],
+            upload_id=d['upload_id'],
+            size=d['original_file_size'],
+            archive_checksum=d['sha256_of_file']
+        )
+    except BaseException:
+        udb.release_completion(d['upload_id'])
+        raise
+    udb.delete_upload_info(d['upload_id'])
+
+    inv.put_archive(ArchiveInfo(
+        archive_id=archive_id,
+        parent=d['save_as_path'],
+        name=d['save_as_name'],
+        upload_timestamp=time.time(),
+        modified_timestamp=os.path.getmtime(d['file']),
+        sha256=d['sha256_of_file'],
+        size=d['original_file_size'],
+        is_dir=False
+    ))
+    inv.save()
+
+
+def remove_uploaded_pack(config: Config, file: str):
+    """Packs are made in packs directory just to be uploaded. They are not needed when upload is completed."""
+    if os.path.dirname(os.path.abspath(file)) == os.path.abspath(config.get_packs_location()):
+        os.remove(file)
+
+
 class UploadPartTask(AbstractTransferTask):
 
     data: UploadPartTaskDict
@@ -42,51 +132,51 @@ class UploadPartTask(AbstractTransferTask):
     def process(self):
 
         self.data = self.original_dict['data']
+        self.group_transfer_size = self.data['original_file_size']
         if os.path.getsize(self.data['file']) != self.data['original_file_size']:
             raise RuntimeError(f"File size changed!")
 
         with open(self.data['file'], mode='br') as file:
-            with MmapWithReadCallback(file.fileno(), access=mmap.ACCESS_READ, offset=self.data['part_offset'],
-                                      length=self.data['part_size']) as mm:
-                mm.callback = self._upload_progress_callback
+            with MmapBody(file.fileno(), offset=self.data['part_offset'], length=self.data['part_size'],
+                          callback=self._upload_progress_callback,
+                          throttle=self.bandwidth.upload.consume) as body:
+                started = time.monotonic()
                 self.glacier.upload_archive_part(
                     vault_name=self.data['vault_name'],
                     upload_id=self.data['upload_id'],
                     part_checksum=self.data['sha256_of_part'],
-                    body=typing.cast(IO[bytes], mm),
+                    body=typing.cast(IO[bytes], body),
                     part_offset=self.data['part_offset'],
-                    part_size=self.data['part_size']
+                    part_size=self.data['part_size'],
+                    # Tasks created by older versions have no plain hash
+                    payload_sha256=self.data.get('linear_sha256_of_part')
                 )
 
-        with UploadsDB(os.path.join(self.config.workdir, "uploads.db")) as udb:
-            uploaded = udb.put_upload_info(self.data['upload_id'], self.data['part_index'])
-            total_parts = self.data['total_parts_count']
-            if uploaded != total_parts:
-                self.emit_progress(f"Uploaded part {uploaded}/{total_parts}", 0, TaskStatus.SUCCESS)
-                return
-            udb.delete_upload_info(self.data['upload_id'])
-
-        archive_id = self.glacier.complete_multipart_upload(
-            vault_name=self.data['vault_name'],
-            upload_id=self.data['upload_id'],
-            size=self.data['original_file_size'],
-            archive_checksum=self.data['sha256_of_file']
-        )
+        udb = UploadsDB.shared(os.path.join(self.config.workdir, "uploads.db"))
+        udb.record_throughput(self.data['part_size'] / max(time.monotonic() - started, 0.001))
+        record = udb.record_part(upload_id=self.data['upload_id'],
+                                 part_index=self.data['part_index'],
+                                 part_size=self.data['part_size'],
+                                 total_parts=self.data['total_parts_count'])
+        if not record.should_complete:
+            # Not all parts uploaded yet, or another task is completing the upload right now
+            enqueue_next_parts(udb, self.data['upload_id'], self.config.max_parts_in_queue,
+                               self.queue_of_tasks_to_be_added)
+            self.emit_transfer(self._upload_progress_text(udb, record.uploaded_parts), 0,
+                               self.data['part_size'], self.data['part_size'], TaskStatus.SUCCESS)
+            return
+
+        complete_upload(self.glacier, udb, self.data, self.get_inventory())
+        remove_uploaded_pack(self.config, self.data['file'])
+        self.emit_transfer("Uploaded", 0, self.data['part_size'], self.data['part_size'], TaskStatus.SUCCESS)
 
-        inv = self.get_inventory()
-        inv.put_archive(ArchiveInfo(
-            archive_id=archive_id,
-            parent=self.data['save_as_path'],
-            name=self.data['save_as_name'],
-            upload_timestamp=time.time(),
-            modified_timestamp=os.path.getmtime(self.data['file']),
-            sha256=self.data['sha256_of_file'],
-            size=self.data['original_file_size'],
-            is_dir=False
-        ))
-        inv.save()
-
-        self.emit_progress("Uploaded", 0, TaskStatus.SUCCESS)
+    def _upload_progress_text(self, udb: UploadsDB, uploaded: int) -> str:
+        progress = udb.get_upload_progress(self.data['upload_id'])
+        if progress is None:
+            return f"Uploaded part {uploaded}/{self.data['total_parts_count']}"
+        percent = int(100 * progress.uploaded_bytes / progress.total_bytes)
+        return (f"Uploaded part {progress.uploaded_parts}/{progress.total_parts}, "
+                f"{human_readable_bytes(progress.uploaded_bytes)}/{percent}% of file")
 
     def get_inventory(self) -> Inventory:
         inv_file = self.glacier.inventory_filename(self.data['vault_arn'])
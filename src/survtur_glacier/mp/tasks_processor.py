@@ -1,12 +1,13 @@
 import logging
 import multiprocessing
+import multiprocessing.connection
 import threading
-import time
 from typing import Optional, Dict
 
+from .bandwidth import BandwidthLimits
 from .one_task import process_task
 from .sqlite_tasks_queue import SqliteTasksQueue, QueueExit
-from .stubs import TaskOutputDict, CommonTaskDict, TaskStatus
+from .stubs import TaskOutputDict, CommonTaskDict, TaskStatus, TaskCategory
 from ..common.config import Config
 
 _logger = logging.getLogger(__name__)
@@ -19,13 +20,24 @@ class TasksProcessor(threading.Thread):
     current_process: Optional[multiprocessing.Process] = None
     current_task_id: str = ""
     config: Config
+    bandwidth: BandwidthLimits
     tasks_to_cancel: Dict[str, int]
+    category: Optional[TaskCategory] = None
+    """Processor takes tasks of this category only. If None, takes tasks of any category."""
+
+    def __init__(self, *a, **kwa):
+        super().__init__(*a, **kwa)
+        self._cancel_reader, self._cancel_writer = multiprocessing.Pipe(duplex=False)
+
+    def check_cancellations(self):
+        """Wakes up processor, so it checks `tasks_to_cancel` for current task right now."""
+        self._cancel_writer.send(None)
 
     def run(self):
         while True:
 
             try:
-                d: CommonTaskDict = self.tasks_queue.get()
+                d: CommonTaskDict = self.tasks_queue.get(category=self.category)
             except QueueExit:
                 _logger.info(f'TasksProcessor #{self.native_id} STOPPED (QueueExit)')
                 break
@@ -33,7 +45,8 @@ class TasksProcessor(threading.Thread):
             kwargs = dict(d=d,
                           queue_of_tasks_to_be_added=self.queue_of_tasks_to_be_added,
                           output_queue=self.output_queue,
-                          config=self.config)
+                          config=self.config,
+                          bandwidth=self.bandwidth)
             p = multiprocessing.Process(target=process_task, kwargs=kwargs)
             self.current_process = p
             self.current_task_id = d['meta']['id']
@@ -48,8 +61,12 @@ class TasksProcessor(threading.Thread):
                     manually_terminated = True
                     break
 
-                time.sleep(0.5)
-                if not p.is_alive():
+                # Sleep until process finished or someone asked to check cancellations
+                ready = multiprocessing.connection.wait([p.sentinel, self._cancel_reader])
+                while self._cancel_reader.poll():
+                    self._cancel_reader.recv()
+                if p.sentinel in ready:
+                    p.join()
                     break
 
             if p.exitcode == 0:
@@ -0,0 +1,50 @@
+import datetime
+import re
+from typing import NamedTuple, Optional
+
+_WINDOW_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+
+class TimeWindow(NamedTuple):
+    """
+    Daily period of local time when tasks are allowed to run. Like 22:00-06:00.
+    Window may go over midnight. If `start` equals `end`, window is open all day long.
+    """
+    start: datetime.time
+    end: datetime.time
+
+    @classmethod
+    def parse(cls, s: str) -> Optional['TimeWindow']:
+        """
+        Parses "HH:MM-HH:MM" string. Returns None for empty string, that means "no window, run anytime".
+        """
+        if not s.strip():
+            return None
+        m = _WINDOW_RE.match(s)
+        if not m:
+            raise ValueError(f"Bad time window {s!r}. Expected something like 22:00-06:00")
+        h1, m1, h2, m2 = (int(x) for x in m.groups())
+        return cls(datetime.time(h1, m1), datetime.time(h2, m2))
+
+    def __str__(self):
+        return f"{self.start:%H:%M}-{self.end:%H:%M}"
+
+    def is_open(self, at: datetime.datetime) -> bool:
+        t = at.time()
+        if self.start == self.end:
+            return True
+        if self.start < self.end:
+            return self.start <= t < self.end
+        return t >= self.start or t < self.end
+
+    def next_start(self, at: datetime.datetime) -> datetime.datetime:
+        """Returns `at` if window is open. Otherwise, returns moment when it opens."""
+        if self.is_open(at):
+            return at
+        start = datetime.datetime.combine(at.date(), self.start)
+        if start <= at:
+            start += datetime.timedelta(days=1)
+        return start
+
+    def seconds_till_open(self, at: datetime.datetime) -> float:
+        return (self.next_start(at) - at).total_seconds()
@@ -1,48 +1,328 @@
 # Initialize the queue representation
+import os
 import sqlite3
 import threading
+import time
+from typing import TypedDict, List, Optional, NamedTuple, Dict, Tuple
+
+
+class UploadPlanDict(TypedDict):
+    """Everything that is needed to create task for any part of multipart upload"""
+    upload_id: str
+    vault_arn: str
+    vault_name: str
+    file: str
+    original_file_size: int
+    sha256_of_file: str
+    part_size: int
+    total_parts_count: int
+    save_as_path: str
+    save_as_name: str
+    group_id: str
+
+
+class UploadProgress(NamedTuple):
+    uploaded_parts: int
+    total_parts: int
+    uploaded_bytes: int
+    total_bytes: int
+
+
+class PartRecord(NamedTuple):
+    uploaded_parts: int
+    should_complete: bool
+    """True for exactly one worker: the one that has to complete multipart upload."""
+
+
+_PLAN_COLUMNS = ("upload_id", "vault_arn", "vault_name", "file", "original_file_size", "sha256_of_file",
+                 "part_size", "total_parts_count", "save_as_path", "save_as_name", "group_id")
+
+_THROUGHPUT_SMOOTHING = 0.2
+"""Weight of the latest measurement in moving average of part upload throughput"""
+
+_STALE_COMPLETION_SECONDS = 3600
+"""Completion that is not finished or released in this time is considered crashed and may be taken over."""
+
+_SCHEMA_VERSION = 1
+"""Stored as `PRAGMA user_version`. Increase it when `_SCHEMA` or migrations change."""
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS "upload_parts" (
+           "upload_id" TEXT NOT NULL,
+           "part_index" INTEGER NOT NULL,
+           "part_size" INTEGER NOT NULL DEFAULT 0,
+           PRIMARY KEY ("upload_id", "part_index")
+       ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS "upload_completions" (
+           "upload_id" TEXT NOT NULL PRIMARY KEY,
+           "completing_since" REAL
+       )""",
+    """CREATE TABLE IF NOT EXISTS "upload_plans" (
+           "upload_id" TEXT NOT NULL PRIMARY KEY,
+           "vault_arn" TEXT NOT NULL,
+           "vault_name" TEXT NOT NULL,
+           "file" TEXT NOT NULL,
+           "original_file_size" INTEGER NOT NULL,
+           "sha256_of_file" TEXT NOT NULL,
+           "part_size" INTEGER NOT NULL,
+           "total_parts_count" INTEGER NOT NULL,
+           "save_as_path" TEXT NOT NULL,
+           "save_as_name" TEXT NOT NULL,
+           "group_id" TEXT NOT NULL,
+           "next_part_index" INTEGER NOT NULL DEFAULT 0
+       )""",
+    """CREATE TABLE IF NOT EXISTS "upload_part_hashes" (
+           "upload_id" TEXT NOT NULL,
+           "part_index" INTEGER NOT NULL,
+           "sha256" TEXT NOT NULL,
+           "linear_sha256" TEXT,
+           PRIMARY KEY ("upload_id", "part_index")
+       ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS "upload_throughput" (
+           "id" INTEGER NOT NULL PRIMARY KEY CHECK ("id" = 1),
+           "bytes_per_second" REAL NOT NULL
+       )""",
+)
 
 
 class UploadsDB:
+    """
+    Shared by all task processes.
+
+    `upload_parts` is a ledger of uploaded parts. Part is recorded once, no matter how many times it was uploaded.
+    `upload_completions` makes sure that only one worker completes multipart upload.
+    `upload_plans` and `upload_part_hashes` keep multipart uploads which parts are not all enqueued yet.
+    Part tasks are created lazily from the plan, few at a time. See `claim_next_parts()`.
+    `upload_throughput` keeps average speed of part uploads. It is used to choose part size.
+
+    Use `shared()` to get connection that is opened once per process.
+    """
+
+    _shared: Dict[Tuple[int, str], 'UploadsDB'] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, db_file: str) -> 'UploadsDB':
+        """Returns connection to `db_file` that is reused by everyone in current process"""
+        key = (os.getpid(), db_file)
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(db_file)
+            return cls._shared[key]
+
     def __init__(self, db_file: str):
         self.db_file = db_file
-        with threading.Lock():
-            self.db = sqlite3.connect(self.db_file)
-            self.db.executescript("""
-                  BEGIN TRANSACTION;
-                  CREATE TABLE IF NOT EXISTS "uploads" (
-                      "upload_id" TEXT NOT NULL,
-                      "part_index" INTEGER NOT NULL
-                  );
-                  CREATE INDEX IF NOT EXISTS "pair_index" ON "uploads" (
-                      "upload_id" ASC,
-                      "part_index" ASC
-                  );
-    
-                  COMMIT;
-                  """)
-
-    def put_upload_info(self, upload_id: str, part_index: int) -> int:
-        """Puts information about finished upload and return total count of uploads for this upload_id"""
-        with threading.Lock():
-            self.db.execute("INSERT INTO uploads (upload_id, part_index) VALUES (?, ?)", (upload_id, part_index))
-            self.db.commit()
-            return self.get_upload_part_count(upload_id)
+        self._lock = threading.RLock()
+        with self._lock:
+            # Transactions are started explicitly
+            self.db = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+            # Every task runs in its own process, so schema is checked by single cheap query most of the times
+            if self.db.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        """Creates tables and migrates older ones. In one transaction, so processes don't race for it."""
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if self.db.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                for statement in _SCHEMA:
+                    self.db.execute(statement)
+                self._migrate_from_uploads_table()
+                self._add_linear_sha256_column()
+                self.db.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _migrate_from_uploads_table(self):
+        """Moves parts from old `uploads` table, that allowed same part to be counted twice"""
+        if self.db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='uploads'").fetchone():
+            self.db.execute("""INSERT INTO upload_parts (upload_id, part_index)
+                               SELECT upload_id, part_index FROM uploads WHERE 1
+                               ON CONFLICT DO NOTHING""")
+            self.db.execute("DROP TABLE uploads")
+
+    def _add_linear_sha256_column(self):
+        columns = [r[1] for r in self.db.execute("PRAGMA table_info(upload_part_hashes)")]
+        if "linear_sha256" not in columns:
+            self.db.execute("ALTER TABLE upload_part_hashes ADD COLUMN linear_sha256 TEXT")
+
+    def put_upload_plan(self, plan: UploadPlanDict, part_hashes: List[str],
+                        linear_part_hashes: Optional[List[str]] = None):
+        """
+        Saves plan of upload. If upload already has a plan (upload is resumed), all its parts that are not
+        recorded as uploaded will be claimed again.
+        :param part_hashes: tree hashes of parts
+        :param linear_part_hashes: plain sha256 of parts
+        """
+        assert len(part_hashes) == plan['total_parts_count']
+        if linear_part_hashes is None:
+            linear_part_hashes = [None] * len(part_hashes)
+        assert len(linear_part_hashes) == len(part_hashes)
+        with self._lock:
+            placeholders = ", ".join(":" + c for c in _PLAN_COLUMNS)
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute(f"""INSERT INTO upload_plans ({', '.join(_PLAN_COLUMNS)}) VALUES ({placeholders})
+                                ON CONFLICT (upload_id) DO UPDATE SET next_part_index=0""", plan)
+            self.db.executemany("""INSERT INTO upload_part_hashes (upload_id, part_index, sha256, linear_sha256)
+                                   VALUES (?, ?, ?, ?)
+                                   ON CONFLICT (upload_id, part_index) DO NOTHING""",
+                                ((plan['upload_id'], i, h, lh)
+                                 for i, (h, lh) in enumerate(zip(part_hashes, linear_part_hashes))))
+            self.db.execute("COMMIT")
+
+    def has_upload_plan(self, file: str, sha256_of_file: str) -> bool:
+        """True if multipart upload of this file content was started and is not completed"""
+        with self._lock:
+            cur = self.db.execute("SELECT 1 FROM upload_plans WHERE file=? AND sha256_of_file=? LIMIT 1",
+                                  (file, sha256_of_file))
+            return cur.fetchone() is not None
+
+    def get_upload_plan(self, upload_id: str) -> Optional[UploadPlanDict]:
+        with self._lock:
+            cur = self.db.execute(f"SELECT {', '.join(_PLAN_COLUMNS)} FROM upload_plans WHERE upload_id=?",
+                                  (upload_id,))
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return UploadPlanDict(**dict(zip(_PLAN_COLUMNS, row)))
+
+    def get_part_hashes(self, upload_id: str, part_index: int) -> Tuple[str, Optional[str]]:
+        """Returns tree hash and plain sha256 of part. Plain sha256 may be unknown."""
+        with self._lock:
+            cur = self.db.execute("""SELECT sha256, linear_sha256 FROM upload_part_hashes
+                                     WHERE upload_id=? AND part_index=?""", (upload_id, part_index))
+            return cur.fetchone()
+
+    def claim_next_parts(self, upload_id: str, max_in_flight: int) -> List[int]:
+        """
+        Returns indexes of parts that should be enqueued now, so there are at most `max_in_flight` parts
+        of upload that are enqueued but not uploaded yet. Every part is returned only once.
+        Parts that are already recorded as uploaded are skipped.
+        Returns empty list if upload has no plan (all parts were enqueued at once).
+        """
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT next_part_index, total_parts_count FROM upload_plans WHERE upload_id=?",
+                                      (upload_id,)).fetchone()
+                if row is None:
+                    self.db.execute("COMMIT")
+                    return []
+                next_part_index, total = row
+                uploaded_before = self.db.execute("""SELECT COUNT(*) FROM upload_parts
+                                                     WHERE upload_id=? AND part_index<?""",
+                                                  (upload_id, next_part_index)).fetchone()[0]
+                free_slots = max_in_flight - (next_part_index - uploaded_before)
+                claimed = []
+                cur = self.db.execute("""SELECT part_index FROM upload_parts WHERE upload_id=? AND part_index>=?
+                                         ORDER BY part_index""", (upload_id, next_part_index))
+                uploaded_after = (r[0] for r in cur)
+                skip = next(uploaded_after, None)
+                while free_slots > 0 and next_part_index < total:
+                    if next_part_index == skip:
+                        skip = next(uploaded_after, None)
+                    else:
+                        claimed.append(next_part_index)
+                        free_slots -= 1
+                    next_part_index += 1
+                self.db.execute("UPDATE upload_plans SET next_part_index=? WHERE upload_id=?",
+                                (next_part_index, upload_id))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            return claimed
+
+    def record_part(self, upload_id: str, part_index: int, part_size: int, total_parts: int) -> PartRecord:
+        """
+        Records uploaded part. Repeated record of the same part changes nothing.
+
+        When all parts are recorded, exactly one caller gets `should_complete`.
+        It has to complete upload and call `delete_upload_info()`, or call `release_completion()` on failure.
+        """
+        return self.record_parts(upload_id, [(part_index, part_size)], total_parts)
+
+    def record_parts(self, upload_id: str, parts: List[Tuple[int, int]], total_parts: int) -> PartRecord:
+        """Same as `record_part()` for many (part_index, part_size) in one transaction"""
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.executemany("""INSERT INTO upload_parts (upload_id, part_index, part_size) VALUES (?, ?, ?)
+                                       ON CONFLICT (upload_id, part_index) DO NOTHING""",
+                                    ((upload_id, i, s) for i, s in parts))
+                uploaded = self.get_upload_part_count(upload_id)
+                should_complete = False
+                if uploaded == total_parts:
+                    now = time.time()
+                    self.db.execute("""INSERT INTO upload_completions (upload_id, completing_since) VALUES (?, NULL)
+                                       ON CONFLICT (upload_id) DO NOTHING""", (upload_id,))
+                    cur = self.db.execute("""UPDATE upload_completions SET completing_since=?
+                                             WHERE upload_id=? AND (completing_since IS NULL OR completing_since<?)""",
+                                          (now, upload_id, now - _STALE_COMPLETION_SECONDS))
+                    should_complete = cur.rowcount == 1
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return PartRecord(uploaded, should_complete)
+
+    def release_completion(self, upload_id: str):
+        """Lets another worker complete upload. Call it if completion failed."""
+        with self._lock:
+            self.db.execute("UPDATE upload_completions SET completing_since=NULL WHERE upload_id=?", (upload_id,))
+
+    def record_throughput(self, bytes_per_second: float):
+        """Adds measured speed of one part upload to moving average"""
+        with self._lock:
+            self.db.execute("""INSERT INTO upload_throughput (id, bytes_per_second) VALUES (1, ?)
+                               ON CONFLICT (id) DO UPDATE
+                               SET bytes_per_second=bytes_per_second*?+excluded.bytes_per_second*?
+                               """, (bytes_per_second, 1 - _THROUGHPUT_SMOOTHING, _THROUGHPUT_SMOOTHING))
+
+    def get_throughput(self) -> Optional[float]:
+        """Average speed of part upload in bytes per second. None if nothing was measured yet."""
+        with self._lock:
+            row = self.db.execute("SELECT bytes_per_second FROM upload_throughput WHERE id=1").fetchone()
+        return row[0] if row else None
 
     def get_upload_part_count(self, upload_id: str) -> int:
-        cur = self.db.execute("SELECT COUNT(*) FROM uploads WHERE upload_id=?", (upload_id,))
-        return cur.fetchone()[0]
+        with self._lock:
+            cur = self.db.execute("SELECT COUNT(*) FROM upload_parts WHERE upload_id=?", (upload_id,))
+            return cur.fetchone()[0]
+
+    def get_upload_progress(self, upload_id: str) -> Optional[UploadProgress]:
+        """Progress of whole multipart upload. None if upload has no plan."""
+        with self._lock:
+            row = self.db.execute("""SELECT total_parts_count, original_file_size
+                                     FROM upload_plans WHERE upload_id=?""", (upload_id,)).fetchone()
+            if row is None:
+                return None
+            total_parts, total_bytes = row
+            uploaded_parts, uploaded_bytes = self.db.execute(
+                "SELECT COUNT(*), TOTAL(part_size) FROM upload_parts WHERE upload_id=?", (upload_id,)).fetchone()
+        return UploadProgress(uploaded_parts, total_parts, int(uploaded_bytes), total_bytes)
 
     def delete_upload_info(self, upload_id: str):
-        with threading.Lock():
-            self.db.execute("DELETE FROM uploads WHERE upload_id=?", (upload_id,))
-            self.db.commit()
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute("DELETE FROM upload_parts WHERE upload_id=?", (upload_id,))
+            self.db.execute("DELETE FROM upload_completions WHERE upload_id=?", (upload_id,))
+            self.db.execute("DELETE FROM upload_plans WHERE upload_id=?", (upload_id,))
+            self.db.execute("DELETE FROM upload_part_hashes WHERE upload_id=?", (upload_id,))
+            self.db.execute("COMMIT")
 
-    def __del__(self):
+    def close(self):
+        with self._shared_lock:
+            for key, udb in list(self._shared.items()):
+                if udb is self:
+                    del self._shared[key]
         self.db.close()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.db.close()
+        self.close()
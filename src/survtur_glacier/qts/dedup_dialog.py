@@ -0,0 +1,147 @@
+import csv
+import datetime
+import logging
+import queue
+import threading
+import time
+from typing import Optional, List, Tuple
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QDialog, QTreeWidgetItem, QFileDialog, QMessageBox
+
+from ..common.human_readable import human_readable_bytes
+from ..glacier.dedup import DuplicateGroup, DedupReport, duplicate_groups, check_selection
+from ..glacier.inventory import Inventory, ArchiveInfo
+from ..qts.dedupdialog_qt5 import Ui_DedupDialog
+
+_logger = logging.getLogger(__name__)
+
+_TOP_FOLDERS = 1000
+
+
+class DedupDialog(QDialog):
+    """
+    Duplicates in inventory. Groups are found by background thread and shown as they come.
+    Redundant copies, all but the oldest one, are checked to be removed.
+    """
+    delete_desired = QtCore.pyqtSignal(list)
+
+    def __init__(self, inventory_file: str, parent=None):
+        super().__init__(parent)
+        self.ui = Ui_DedupDialog()
+        self.ui.setupUi(self)
+
+        self._report = DedupReport()
+        self._groups: List[Tuple[QTreeWidgetItem, DuplicateGroup]] = []
+        self._found: 'queue.Queue[Optional[DuplicateGroup]]' = queue.Queue(maxsize=10_000)
+        self._stop = threading.Event()
+        self._done = False
+        self.finished.connect(self._stop.set)
+        self.ui.btnExport.clicked.connect(self.export_selected)
+        self.ui.btnDelete.clicked.connect(self.delete_selected)
+
+        threading.Thread(target=self._find, args=(inventory_file,), name="dedup", daemon=True).start()
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self._show_found)
+        self._timer.start(100)
+        self._update_label()
+
+    def _find(self, inventory_file: str):
+        inv = Inventory(inventory_file)
+        try:
+            for g in duplicate_groups(inv):
+                if not self._put(g):
+                    return
+        except Exception as e:
+            _logger.exception(e)
+        finally:
+            inv.close()
+        self._put(None)
+
+    def _put(self, g: Optional[DuplicateGroup]) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._found.put(g, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _show_found(self):
+        """Shows groups found so far. Takes no more than 50 ms, so GUI is not frozen."""
+        deadline = time.monotonic() + 0.05
+        while time.monotonic() < deadline:
+            try:
+                g = self._found.get_nowait()
+            except queue.Empty:
+                break
+            if g is None:
+                self._done = True
+                self._timer.stop()
+                self._show_folders()
+                self.ui.btnExport.setEnabled(bool(self._groups))
+                self.ui.btnDelete.setEnabled(bool(self._groups))
+                break
+            self._add_group(g)
+        self._update_label()
+
+    def _add_group(self, g: DuplicateGroup):
+        self._report.add(g)
+        size = human_readable_bytes(g.size)
+        top = QTreeWidgetItem([f"{len(g.archives)} copies, wasted {human_readable_bytes(g.wasted)}", size, ""])
+        for i, a in enumerate(g.archives):
+            uploaded = datetime.datetime.fromtimestamp(a['upload_timestamp'] or 0).strftime("%Y-%m-%d %H:%M")
+            child = QTreeWidgetItem([a['parent'] + a['name'], size, uploaded])
+            child.setFlags(child.flags() | Qt.ItemIsUserCheckable)
+            child.setCheckState(0, Qt.Checked if i > 0 else Qt.Unchecked)
+            child.setData(0, Qt.UserRole, a)
+            top.addChild(child)
+        self.ui.groupsTree.addTopLevelItem(top)
+        self._groups.append((top, g))
+
+    def _show_folders(self):
+        for folder, wasted in self._report.top_folders(_TOP_FOLDERS):
+            self.ui.foldersTree.addTopLevelItem(QTreeWidgetItem([folder or "/", human_readable_bytes(wasted)]))
+
+    def _update_label(self):
+        r = self._report
+        state = "Found" if self._done else "Looking for duplicates… Found"
+        self.ui.label.setText(f"{state} {r.groups} groups of the same content. "
+                              f"Redundant copies: {r.redundant_copies}, "
+                              f"they waste <b>{human_readable_bytes(r.wasted)}</b>.")
+
+    def selected_archives(self) -> Optional[List[ArchiveInfo]]:
+        """Checked copies. None if all copies of some group are checked: the last copy must stay."""
+        selected: List[ArchiveInfo] = []
+        for top, g in self._groups:
+            checked = [top.child(i).data(0, Qt.UserRole) for i in range(top.childCount())
+                       if top.child(i).checkState(0) == Qt.Checked]
+            if not check_selection(g, (a['archive_id'] for a in checked)):
+                self.ui.groupsTree.scrollToItem(top)
+                top.setExpanded(True)
+                QMessageBox.warning(self, "All copies selected",
+                                    f"All copies of {g.archives[0]['name']} are selected. At least one must stay.")
+                return None
+            selected.extend(checked)
+        return selected
+
+    def export_selected(self):
+        """Saves checked copies to CSV file, to be removed by other tools"""
+        selected = self.selected_archives()
+        if selected is None:
+            return
+        file, _ = QFileDialog.getSaveFileName(self, "Export selected copies", "duplicates.csv", "CSV (*.csv)")
+        if not file:
+            return
+        with open(file, "w", newline="", encoding="utf8") as f:
+            w = csv.writer(f)
+            w.writerow(["archive_id", "path", "size", "sha256"])
+            for a in selected:
+                w.writerow([a['archive_id'], a['parent'] + a['name'], a['size'], a['sha256']])
+        _logger.info(f"{len(selected)} redundant copies exported to {file}")
+
+    def delete_selected(self):
+        selected = self.selected_archives()
+        if selected:
+            self.delete_desired.emit(selected)
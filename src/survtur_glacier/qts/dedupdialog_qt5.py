@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'dedupdialog_qt5.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.6
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_DedupDialog(object):
+    def setupUi(self, DedupDialog):
+        DedupDialog.setObjectName("DedupDialog")
+        DedupDialog.resize(720, 480)
+        self.verticalLayout = QtWidgets.QVBoxLayout(DedupDialog)
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.label = QtWidgets.QLabel(DedupDialog)
+        self.label.setWordWrap(True)
+        self.label.setObjectName("label")
+        self.verticalLayout.addWidget(self.label)
+        self.tabs = QtWidgets.QTabWidget(DedupDialog)
+        self.tabs.setObjectName("tabs")
+        self.groupsTab = QtWidgets.QWidget()
+        self.groupsTab.setObjectName("groupsTab")
+        self.verticalLayout_2 = QtWidgets.QVBoxLayout(self.groupsTab)
+        self.verticalLayout_2.setObjectName("verticalLayout_2")
+        self.groupsTree = QtWidgets.QTreeWidget(self.groupsTab)
+        self.groupsTree.setUniformRowHeights(True)
+        self.groupsTree.setObjectName("groupsTree")
+        self.verticalLayout_2.addWidget(self.groupsTree)
+        self.tabs.addTab(self.groupsTab, "")
+        self.foldersTab = QtWidgets.QWidget()
+        self.foldersTab.setObjectName("foldersTab")
+        self.verticalLayout_3 = QtWidgets.QVBoxLayout(self.foldersTab)
+        self.verticalLayout_3.setObjectName("verticalLayout_3")
+        self.foldersTree = QtWidgets.QTreeWidget(self.foldersTab)
+        self.foldersTree.setRootIsDecorated(False)
+        self.foldersTree.setObjectName("foldersTree")
+        self.verticalLayout_3.addWidget(self.foldersTree)
+        self.tabs.addTab(self.foldersTab, "")
+        self.verticalLayout.addWidget(self.tabs)
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout.addItem(spacerItem)
+        self.btnExport = QtWidgets.QPushButton(DedupDialog)
+        self.btnExport.setEnabled(False)
+        self.btnExport.setObjectName("btnExport")
+        self.horizontalLayout.addWidget(self.btnExport)
+        self.btnDelete = QtWidgets.QPushButton(DedupDialog)
+        self.btnDelete.setEnabled(False)
+        self.btnDelete.setObjectName("btnDelete")
+        self.horizontalLayout.addWidget(self.btnDelete)
+        self.btnClose = QtWidgets.QPushButton(DedupDialog)
+        self.btnClose.setObjectName("btnClose")
+        self.horizontalLayout.addWidget(self.btnClose)
+        self.verticalLayout.addLayout(self.horizontalLayout)
+
+        self.retranslateUi(DedupDialog)
+        self.tabs.setCurrentIndex(0)
+        self.btnClose.clicked.connect(DedupDialog.reject) # type: ignore
+        QtCore.QMetaObject.connectSlotsByName(DedupDialog)
+
+    def retranslateUi(self, DedupDialog):
+        _translate = QtCore.QCoreApplication.translate
+        DedupDialog.setWindowTitle(_translate("DedupDialog", "Duplicates"))
+        self.label.setText(_translate("DedupDialog", "[will be rewritten]"))
+        self.groupsTree.headerItem().setText(0, _translate("DedupDialog", "Archive"))
+        self.groupsTree.headerItem().setText(1, _translate("DedupDialog", "Size"))
+        self.groupsTree.headerItem().setText(2, _translate("DedupDialog", "Uploaded"))
+        self.tabs.setTabText(self.tabs.indexOf(self.groupsTab), _translate("DedupDialog", "Duplicates"))
+        self.foldersTree.headerItem().setText(0, _translate("DedupDialog", "Folder"))
+        self.foldersTree.headerItem().setText(1, _translate("DedupDialog", "Wasted"))
+        self.tabs.setTabText(self.tabs.indexOf(self.foldersTab), _translate("DedupDialog", "Folders"))
+        self.btnExport.setText(_translate("DedupDialog", "Export selected…"))
+        self.btnDelete.setText(_translate("DedupDialog", "Delete selected…"))
+        self.btnClose.setText(_translate("DedupDialog", "Close"))
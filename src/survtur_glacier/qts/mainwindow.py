@@ -103,6 +103,9 @@ class Ui_MainWindow(object):
         self.btnUpload = QtWidgets.QPushButton(self.centralwidget)
         self.btnUpload.setObjectName("btnUpload")
         self.horizontalLayout.addWidget(self.btnUpload)
+        self.btnSync = QtWidgets.QPushButton(self.centralwidget)
+        self.btnSync.setObjectName("btnSync")
+        self.horizontalLayout.addWidget(self.btnSync)
         self.searchLine = QtWidgets.QLineEdit(self.centralwidget)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Maximum, QtWidgets.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(0)
@@ -179,6 +182,9 @@ class Ui_MainWindow(object):
         self.btnUpload.setToolTip(_translate("MainWindow", "Upload files…"))
         self.btnUpload.setStatusTip(_translate("MainWindow", "Upload one or more files to current folder."))
         self.btnUpload.setText(_translate("MainWindow", "Upload…"))
+        self.btnSync.setToolTip(_translate("MainWindow", "Sync folder…"))
+        self.btnSync.setStatusTip(_translate("MainWindow", "Upload new and changed files of local folder to current folder."))
+        self.btnSync.setText(_translate("MainWindow", "Sync…"))
         self.searchLine.setStatusTip(_translate("MainWindow", "Search for this text at whole vault."))
         self.searchLine.setPlaceholderText(_translate("MainWindow", "Search…"))
         self.inventoryStatus.setText(_translate("MainWindow", "TextLabel"))
@@ -5,9 +5,10 @@ import queue
 import random
 import re
 import secrets
+import threading
 import time
 from tempfile import NamedTemporaryFile
-from typing import List, Dict, TypedDict
+from typing import List, Dict, TypedDict, Tuple, Optional, Iterator, Iterable
 
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtCore import Qt
@@ -15,18 +16,29 @@ from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import QProgressBar, QShortcut, QMessageBox, QTableWidgetItem, QStyle, QInputDialog, QFileDialog
 
 from ..common.config import Config
+from ..common.helpers import KB, MB
 from ..common.human_readable import human_readable_bytes
+from ..common.tree_scan import scan_tree, ScanTotals, ScanEntry
+from ..glacier.byte_range import retrieval_range
+from ..glacier.dedup import download_groups
 from ..glacier.enums import GlacierFolderType
+from ..glacier.hash_cache import HashCache
 from ..glacier.hasher import sha256_tree_hash_hex
 from ..glacier.inventory import Inventory, ArchiveInfo
+from ..glacier.pack import iter_packs
 from ..glacier.stubs.vaultdict import VaultDict
 from ..glacier.survtur_glacier import SurvturGlacier, GlacierTier
+from ..glacier.sync_plan import plan_sync, SyncPlan
 from ..mp.general_manager import TasksGeneralManager
 from ..mp.stubs import CommonTaskDict, TaskOutputDict, TaskStatus, TaskMetaDict, TaskType, TaskCategory, TaskPriority
 from ..mp.tasks import id_gen
-from ..mp.tasks.downloads import InitiateArchiveRequestTaskDataDict
+from ..mp.tasks.delete import ArchiveDeleteTaskDict, DELETE_BATCH
+from ..mp.tasks.downloads import InitiateArchiveRequestTaskDataDict, DownloadCopyDict
 from ..mp.tasks.initiate_upload import InitiateUploadTaskDict
 from ..mp.tasks.inventory import InitiateInventoryRequestTaskDataDict
+from ..mp.tasks.pack import PackUploadTaskDict, PackFileDict
+from ..mp.time_window import TimeWindow
+from .dedup_dialog import DedupDialog
 from .items_emitter_thread import ItemsEmitterThread
 from .mainwindow import Ui_MainWindow
 from .tier_dialog import TierDialog
@@ -42,14 +54,11 @@ class _TaskWidgetsDict(TypedDict):
     status: TaskStatus
 
 
-def get_subcontent(f: str):
-    sub = []
-    for p, dirs, files in os.walk(f, followlinks=False):
-        dirs = [os.path.join(p, d) for d in dirs]
-        files = [os.path.join(p, f) for f in files]
-        sub.extend(dirs)
-        sub.extend(files)
-    return sub
+_SMALL_FILE_SIZE = 10_000_000
+"""Smaller files are better uploaded as one archive"""
+
+_SUBMIT_BATCH = 1000
+"""Upload tasks are added to tasks queue by batches"""
 
 
 class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
@@ -59,7 +68,8 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
 
     _vault_arn_to_current_dirs: Dict[str, str]
     _upload_intention_root: str
-    _upload_intention_list: List[str]
+    _upload_intention_roots: List[str]
+    _upload_scan_cancel: threading.Event
 
     def __init__(self, *args, workdir: str, **kwargs, ):
         super().__init__(*args, **kwargs)
@@ -72,6 +82,8 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
         self._get_vaults()
         self._init_gm()
         self._init_task_adder()
+        self._init_queue_depth_monitor()
+        self._init_speed_limits()
 
         self._setup_signals()
         self._setup_shortcuts()
@@ -94,11 +106,14 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
         self.vaultSelector.currentIndexChanged.connect(self._show_vault_content)
         self.inventoryView.files_dropped.connect(self.upload_desired)
         self.inventoryView.download_desired.connect(self.download_desired)
+        self.inventoryView.duplicates_desired.connect(self.show_duplicates)
+        self.inventoryView.delete_desired.connect(self.delete_desired)
         self.newTasksTable.counters_update.connect(self.show_tasks_counters)
         self.newTasksTable.delete_tasks_desire.connect(self._gm.delete_tasks)
         self.newTasksTable.cancel_tasks_desire.connect(self._gm.add_tasks_to_cancel_list)
         self._inventory_model.current_path_changed.connect(self.currentPathTxt.setText)
         self.btnUpload.clicked.connect(self.pick_files_to_upload)
+        self.btnSync.clicked.connect(self.pick_folder_to_sync)
         self.btnMkdir.clicked.connect(self.make_dir_pressed)
 
     def _setup_shortcuts(self):
@@ -132,10 +147,61 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
         """
         db_file = os.path.join(self._workdir, 'survtur_glaciers_tasks.sqlite3')
         self._gm = TasksGeneralManager(tasks_db=db_file, config=self._config)
-        self._gm.tp_count = self._config.task_threads
+        self._gm.tp_counts = {
+            TaskCategory.UPLOAD: self._config.upload_threads,
+            TaskCategory.DOWNLOAD: self._config.download_threads,
+            TaskCategory.META: self._config.meta_threads,
+        }
+        self._gm.time_windows = {
+            TaskCategory.UPLOAD: TimeWindow.parse(self._config.upload_window),
+            TaskCategory.DOWNLOAD: TimeWindow.parse(self._config.download_window),
+            TaskCategory.META: TimeWindow.parse(self._config.meta_window),
+        }
         self._gm.on_output_callback = lambda x: self.progress.emit(x)
         self._gm.on_result = lambda x: self.result.emit(x)
-        self._populate_tasks_list(self._gm.get_all_tasks_in_queue())
+        self._populate_tasks_list(self._gm.get_all_tasks_in_queue(with_data=False))
+
+    def _init_queue_depth_monitor(self):
+        self._queue_depth_label = QtWidgets.QLabel(self)
+        self._queue_depth_label.setStatusTip("Count of tasks that are waiting for free worker.")
+        self.statusbar.addPermanentWidget(self._queue_depth_label)
+        self._queue_depth_timer = QtCore.QTimer(self)
+        self._queue_depth_timer.timeout.connect(self.show_queue_depths)
+        self._queue_depth_timer.start(1000)
+
+    def show_queue_depths(self):
+        depths = self._gm.get_queue_depths()
+        starts = self._gm.get_next_window_starts()
+        parts = []
+        for c in TaskCategory:
+            s = f"{c.value.lower()} {depths[c]}"
+            if c in starts:
+                s += f" (from {starts[c]:%H:%M})"
+            parts.append(s)
+        self._queue_depth_label.setText(f"Queued: {', '.join(parts)}")
+
+    def _init_speed_limits(self):
+        """Spin boxes in status bar to change total upload|download speed limits on the fly."""
+        for prefix, value, setter in (("Upload", self._config.upload_speed_limit_kb, self.set_upload_speed_limit),
+                                      ("Download", self._config.download_speed_limit_kb, self.set_download_speed_limit)):
+            box = QtWidgets.QSpinBox(self)
+            box.setRange(0, 1024 * 1024)
+            box.setSingleStep(128)
+            box.setSuffix(" KiB/s")
+            box.setPrefix(f"{prefix}: ")
+            box.setSpecialValueText(f"{prefix}: no limit")
+            box.setStatusTip(f"Total {prefix.lower()} speed for all tasks. 0 means no limit.")
+            box.setValue(value)
+            box.valueChanged.connect(setter)
+            self.statusbar.addPermanentWidget(box)
+
+    def set_upload_speed_limit(self, kb: int):
+        self._config.upload_speed_limit_kb = kb
+        self._gm.set_upload_speed_limit(kb * KB)
+
+    def set_download_speed_limit(self, kb: int):
+        self._config.download_speed_limit_kb = kb
+        self._gm.set_download_speed_limit(kb * KB)
 
     def _populate_tasks_list(self, tasks: List[CommonTaskDict]):
         for t in tasks:
@@ -158,105 +224,170 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
             cant.show()
             return
 
-        for path in files:
-
-            if not os.path.exists(path):
-                continue
-
-            if os.path.isdir(path):
-                q = QMessageBox(self)
-                q.setWindowTitle("Sorry")
-                q.setText(
-                    "<p>Uploading folders not supported. Files only.</p>" +
-                    "<p>You can create folder manually and then upload files.</p>")
-                q.setIcon(QMessageBox.Information)
-                q.finished.connect(q.deleteLater)
-                q.open()
-                return
+        files = [f for f in files if os.path.lexists(f)]
+        if not files:
+            return
 
-        self._upload_intention_list = []
+        # Folders are scanned in background. Dialog shows totals as they grow.
+        self._upload_intention_roots = files
         self._upload_intention_root = os.path.dirname(files[0])
-
-        for f in files:
-            self._upload_intention_list.append(f)
-            if os.path.isdir(f):
-                self._upload_intention_list.extend(get_subcontent(f))
-
-        total_size = 0
-        dirs = []
-        files = []
-        ignored_links = []
-        small_files = []
-        for p in self._upload_intention_list:
-
-            if os.path.isdir(p):
-                dirs.append(p)
-            elif os.path.islink(p):
-                ignored_links.append(p)
-            elif os.path.isfile:
-                files.append(p)
-                getsize = os.path.getsize(p)
-                total_size += getsize
-                if getsize < 10_000_000:
-                    small_files.append(p)
-            else:
-                raise RuntimeError(p)
+        self._upload_scan_cancel = threading.Event()
+        totals = ScanTotals(small_sizes=(self._config.pack_threshold_kb * KB, _SMALL_FILE_SIZE))
+        threading.Thread(target=self._count_upload, args=(files, totals, self._upload_scan_cancel),
+                         name="upload-scan", daemon=True).start()
 
         q = QMessageBox(self)
+        q.setWindowTitle("Confirm upload")
+        q.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        q.button(QMessageBox.Yes).setEnabled(False)
+        timer = QtCore.QTimer(q)
+        timer.timeout.connect(lambda: self._show_upload_totals(q, totals, timer))
+        timer.start(200)
+        self._show_upload_totals(q, totals, timer)
+        q.finished.connect(self.on_upload_confirmation_answered)
+        q.finished.connect(q.deleteLater)
+        q.open()
 
-        hr_size = human_readable_bytes(total_size)
-        if len(files) == 1:
-            text = f"Are you sure that you want to upload <b>{files[0]}</b> for {hr_size}?"
-        elif len(files) == 0:
+    @staticmethod
+    def _count_upload(roots: List[str], totals: ScanTotals, cancel: threading.Event):
+        for e in scan_tree(roots):
+            if cancel.is_set():
+                return
+            totals.add(e)
+        totals.done = True
+
+    def _show_upload_totals(self, q: QMessageBox, totals: ScanTotals, timer: QtCore.QTimer):
+        hr_size = human_readable_bytes(totals.size)
+        roots = self._upload_intention_roots
+        if not totals.done:
+            text = f"Scanning… <b>{totals.files}</b> files for {hr_size}"
+        elif totals.files == 1 and len(roots) == 1 and not os.path.isdir(roots[0]):
+            text = f"Are you sure that you want to upload <b>{roots[0]}</b> for {hr_size}?"
+        elif totals.files == 0:
             text = "No files for upload."
         else:
-            text = f"Are you sure that you want to upload <b>{len(files)}</b> files for {hr_size}?"
+            text = f"Are you sure that you want to upload <b>{totals.files}</b> files for {hr_size}?"
 
-        if dirs:
-            text += f"<br/>Folders to be created: {len(dirs)}."
+        if totals.dirs:
+            text += f"<br/>Folders to be created: {totals.dirs}."
 
-        if ignored_links:
-            text += (f"<br/><br/><b>WARNING:</b> There was symlink ({len(ignored_links)}) for upload. " +
+        if totals.links:
+            text += (f"<br/><br/><b>WARNING:</b> There was symlink ({totals.links}) for upload. " +
                      "It will be ignored and not uploaded!")
 
-        if small_files:
+        packed_count = totals.smaller_than[self._config.pack_threshold_kb * KB]
+        if packed_count > 1:
+            text += ("<br/><br/><small>" +
+                     f"NOTE: {packed_count} small files will be packed together to archives " +
+                     f"of up to {human_readable_bytes(self._config.pack_size_mb * MB)}. " +
+                     "They are shown in inventory as usual files." +
+                     "</small>")
+        elif totals.smaller_than[_SMALL_FILE_SIZE]:
             text += ("<br/><br/><small>" +
                      "NOTE: AWS Glacier does it best when you upload archives, not separate files. " +
                      "Think about making single archive with them and upload it." +
                      "</small>")
-
-        if files or dirs:
-            q.setWindowTitle("Confirm upload")
-            q.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
-            q.finished.connect(self.on_upload_confirmation_answered)
-        else:
-            q.setWindowTitle("Nothing to upload")
-            q.setStandardButtons(QMessageBox.Close)
         q.setText(text)
-        q.finished.connect(q.deleteLater)
-        q.open()
+
+        if totals.done:
+            timer.stop()
+            if totals.files or totals.dirs:
+                q.button(QMessageBox.Yes).setEnabled(True)
+            else:
+                q.setWindowTitle("Nothing to upload")
+                q.setStandardButtons(QMessageBox.Close)
 
     def on_check_for_duplicates_answered(self, answer: int):
         should_check_for_dupes = answer == QMessageBox.Yes
+        v = self.current_vault()
+        inventory_file = self._config.get_inventories_location(SurvturGlacier.inventory_filename(v['VaultARN']))
+        threading.Thread(target=self._submit_upload,
+                         args=(self._upload_intention_roots, self._upload_intention_root,
+                               self._inventory_model.get_current_path(), v, inventory_file, should_check_for_dupes),
+                         name="upload-submit", daemon=True).start()
+
+    def _submit_upload(self, roots: List[str], root: str, current_path: str, vault: VaultDict,
+                       inventory_file: str, check_duplicates: bool):
+        """
+        Scans folders again and adds tasks while scanning. Nothing is collected in memory,
+        but small files of the current pack.
 
-        tasks = []
-        current_path = self._inventory_model.get_current_path()
-        for file in self._upload_intention_list:
-            name = os.path.basename(file)
-            if os.path.isdir(file):
-                name += "/"
-            t = self._create_upload_task(file=file,
-                                         save_as_path=current_path,
-                                         save_as_name=name,
-                                         check_duplicates=should_check_for_dupes)
-            tasks.append(t)
+        Only empty folders are uploaded as folder archives. Others are put to local inventory at once.
+        They are kept there by files inside, like after inventory update.
+        """
+        dirs: List[Tuple[str, str]] = []
+        prefix = os.path.join(root, "")
+
+        def save_as(path: str) -> Tuple[str, str]:
+            # Scanned paths start with root. It is much faster than os.path.relpath()
+            rel = path[len(prefix):] if path.startswith(prefix) else os.path.basename(path)
+            parent, _, name = rel.replace(os.sep, "/").rpartition("/")
+            return (current_path + parent + "/" if parent else current_path), name
+
+        def uploads() -> Iterator[Tuple[ScanEntry, str, str]]:
+            for e in scan_tree(roots):
+                if e.is_link:
+                    _logger.warning(f"Symlink {e.path} is ignored")
+                    continue
+                parent, name = save_as(e.path)
+                if e.is_dir and not e.empty:
+                    dirs.append((parent, name + "/"))
+                else:
+                    yield e, parent, name + "/" if e.is_dir else name
+
+        tasks_count = self._add_upload_tasks(uploads(), vault, check_duplicates)
+        _logger.info(f"{tasks_count} upload tasks added")
+
+        if dirs and os.path.isfile(inventory_file):
+            inv = Inventory(inventory_file)
+            inv.put_dirs(dirs)
+            inv.save()
+            inv.close()
+            self.inventory_updated.emit(inventory_file)
+
+    def _add_upload_tasks(self, uploads: Iterable[Tuple[ScanEntry, str, str]], vault: VaultDict,
+                          check_duplicates: bool) -> int:
+        """
+        Adds tasks to upload (entry, save_as_path, save_as_name) by batches as they come.
+        Small files are packed. Returns count of tasks.
+        """
+        pack_threshold = self._config.pack_threshold_kb * KB
+        tasks: List[CommonTaskDict] = []
+        tasks_count = 0
 
-        for t in tasks:
-            self._tasks_to_add_queue.put(t)
+        def add(t: CommonTaskDict):
+            nonlocal tasks, tasks_count
+            tasks.append(t)
+            tasks_count += 1
+            if len(tasks) >= _SUBMIT_BATCH:
+                self._gm.add_tasks(tasks)
+                tasks = []
+
+        def small_files() -> Iterator[Tuple[Tuple[ScanEntry, str, str], int]]:
+            """Adds tasks of everything but small files. Small files are yielded to be packed."""
+            for e, parent, name in uploads:
+                if not e.is_dir and e.size < pack_threshold:
+                    yield (e, parent, name), e.size
+                    continue
+                add(self._create_upload_task(file=e.path, save_as_path=parent, save_as_name=name,
+                                             check_duplicates=check_duplicates, vault=vault, size=e.size))
+
+        for pack in iter_packs(small_files(), self._config.pack_size_mb * MB):
+            if len(pack) == 1:
+                e, parent, name = pack[0]
+                add(self._create_upload_task(file=e.path, save_as_path=parent, save_as_name=name,
+                                             check_duplicates=check_duplicates, vault=vault, size=e.size))
+            else:
+                files = [PackFileDict(file=e.path, save_as_path=parent, save_as_name=name) for e, parent, name in pack]
+                add(self._create_pack_upload_task(files=files, size=sum(e.size for e, _, _ in pack),
+                                                  check_duplicates=check_duplicates, vault=vault))
+        self._gm.add_tasks(tasks)
+        return tasks_count
 
     def on_upload_confirmation_answered(self, answer: int):
         if answer != QMessageBox.Yes:
-            self._upload_intention_list = []
+            self._upload_scan_cancel.set()
+            self._upload_intention_roots = []
             return
 
         q = QMessageBox(self)
@@ -393,12 +524,14 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
         self._gm.add_task(task)
 
     def _create_upload_task(self, file: str, save_as_path: str, save_as_name: str,
-                            check_duplicates: bool) -> CommonTaskDict:
-        is_dir = os.path.isdir(file)
+                            check_duplicates: bool, vault: Optional[VaultDict] = None,
+                            size: Optional[int] = None) -> CommonTaskDict:
+        """`vault` is the current one, if not given. `size` of file is read from disk, if not given."""
+        is_dir = save_as_name.endswith("/")
         if is_dir:
             name = f"Make dir {save_as_path + save_as_name}"
         else:
-            size_info = human_readable_bytes(os.path.getsize(file))
+            size_info = human_readable_bytes(os.path.getsize(file) if size is None else size)
             name = f"Upload {size_info} {save_as_name}"
 
         meta = TaskMetaDict(id=id_gen.task_id(),
@@ -406,18 +539,19 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
                             name=name,
                             type=TaskType.ARCHIVE_UPLOAD,
                             priority=TaskPriority.CREATE_DIRECTORY if is_dir else TaskPriority.INITIATE_UPLOAD,
-                            category=TaskCategory.UPLOAD,
+                            category=TaskCategory.META if is_dir else TaskCategory.UPLOAD,
                             start_after=0,
                             created=datetime.datetime.now().timestamp())
 
-        v = self.current_vault()
+        v = vault or self.current_vault()
         data = InitiateUploadTaskDict(
             vault_name=v['VaultName'],
             vault_arn=v['VaultARN'],
             file=file,
             save_as_path=save_as_path,
             save_as_name=save_as_name,
-            check_for_duplicates=check_duplicates
+            check_for_duplicates=check_duplicates,
+            pack=False
         )
 
         task: CommonTaskDict = {
@@ -427,6 +561,27 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
 
         return task
 
+    def _create_pack_upload_task(self, files: List[PackFileDict], size: int, check_duplicates: bool,
+                                 vault: VaultDict) -> CommonTaskDict:
+        size_info = human_readable_bytes(size)
+        meta = TaskMetaDict(id=id_gen.task_id(),
+                            group_id=id_gen.group_id(""),
+                            name=f"Pack {len(files)} files {size_info}",
+                            type=TaskType.PACK_UPLOAD,
+                            priority=TaskPriority.INITIATE_UPLOAD,
+                            category=TaskCategory.UPLOAD,
+                            start_after=0,
+                            created=datetime.datetime.now().timestamp())
+
+        data = PackUploadTaskDict(
+            vault_name=vault['VaultName'],
+            vault_arn=vault['VaultARN'],
+            files=files,
+            check_for_duplicates=check_duplicates
+        )
+
+        return CommonTaskDict(meta=meta, data=data)
+
     _old_values = {}
 
     def show_tasks_counters(self, d: Dict[ShowTasksThat, int]):
@@ -470,8 +625,11 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
                 total_size += a['size']
                 files_count += 1
 
+        # Archives of the same content are downloaded once
+        saved_size = sum(c['size'] for g in download_groups(archives) for c in g.copies)
+
         d = TierDialog(self)
-        d.update_label(total_size, files_count, dirs_count)
+        d.update_label(total_size, files_count, dirs_count, saved_size)
         d.accepted.connect(lambda: self.start_downloading(archives, top_level, d.selected_path, d.selected_tier))
         d.finished.connect(d.deleteLater)
         d.open()
@@ -485,11 +643,12 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
         :param tier:
         :return:
         """
-        tasks: List[CommonTaskDict] = []
-        for a in archives:
+        def dirs_to_create_for(archive: ArchiveInfo) -> List[str]:
+            relative_to_top_level = archive['parent'][len(top_level):]
+            return relative_to_top_level.split('/')[:-1]
 
-            if a['is_dir']:
-                continue
+        tasks: List[CommonTaskDict] = []
+        for a, copies in download_groups(archives):
 
             meta = TaskMetaDict(
                 id=id_gen.task_id(),
@@ -502,18 +661,24 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
                 category=TaskCategory.DOWNLOAD
             )
 
-            relative_to_top_level = a['parent'][len(top_level):]
-            dirs_to_create = relative_to_top_level.split('/')[:-1]
-
             data = InitiateArchiveRequestTaskDataDict(
                 vault_name=self.current_vault()['VaultName'],
                 archive_id=a['archive_id'],
                 save_dir=save_dir,
                 save_name=a['name'],
-                dirs_to_create=dirs_to_create,
+                dirs_to_create=dirs_to_create_for(a),
                 hash=a['sha256'],
-                tier=tier.value
+                tier=tier.value,
+                member_offset=a.get('member_offset'),
+                member_size=a['size'] if a.get('member_offset') is not None else None,
+                retrieval_range=None,
+                codec=a.get('codec'),
+                original_size=a.get('original_size'),
+                copies=[DownloadCopyDict(dirs_to_create=dirs_to_create_for(c), save_name=c['name']) for c in copies]
             )
+            if a.get('member_offset') is not None and a['size']:
+                # Only the piece of pack with the file is retrieved. Member hash is checked after extraction anyway.
+                data['retrieval_range'] = retrieval_range(a['member_offset'], a['size'], a['pack_size'])
 
             task = CommonTaskDict(
                 meta=meta,
@@ -645,6 +810,10 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
             self.inventory_updated.emit(self._inventory_model.get_inventory().db_file)
             return
 
+        if t['meta']['type'] == TaskType.ARCHIVE_DELETE:
+            self.inventory_updated.emit(self._inventory_model.get_inventory().db_file)
+            return
+
         if (
             t['status'] == TaskStatus.SUCCESS and
             t['string'] == "Uploaded" and
@@ -659,8 +828,145 @@ class SurvturGlacierGui(QtWidgets.QMainWindow, Ui_MainWindow):
         d.finished.connect(d.deleteLater)
         d.show()
 
+    def show_duplicates(self):
+        v = self.current_vault()
+        inventory_file = self._config.get_inventories_location(SurvturGlacier.inventory_filename(v['VaultARN']))
+        if not os.path.isfile(inventory_file):
+            return
+        d = DedupDialog(inventory_file, self)
+        d.delete_desired.connect(self.delete_desired)
+        d.finished.connect(d.deleteLater)
+        d.show()
+
+    def delete_desired(self, archives: List[ArchiveInfo]):
+        """Asks for confirmation and deletes archives by batches. Pack members can only be deleted with pack."""
+        to_delete = [a for a in archives
+                     if not a['archive_id'].startswith("VIRTUAL_DIR ") and a.get('member_offset') is None]
+        members = sum(1 for a in archives if a.get('member_offset') is not None)
+        if not to_delete:
+            QMessageBox.information(self, "Nothing to delete", "Selected files are parts of packs "
+                                                               "or virtual folders. They can't be deleted alone.")
+            return
+
+        size = sum(a['size'] or 0 for a in to_delete)
+        text = f"Delete {len(to_delete)} archives, {human_readable_bytes(size)}, from vault? It can't be undone."
+        if members:
+            text += f"<br>{members} files inside packs will be skipped."
+        answer = QMessageBox.question(self, "Delete archives", text, QMessageBox.Yes | QMessageBox.No,
+                                      QMessageBox.No)
+        if answer != QMessageBox.Yes:
+            return
+
+        v = self.current_vault()
+        group_id = id_gen.group_id("DEL")
+        tasks: List[CommonTaskDict] = []
+        for i in range(0, len(to_delete), DELETE_BATCH):
+            batch = [a['archive_id'] for a in to_delete[i:i + DELETE_BATCH]]
+            meta = TaskMetaDict(id=id_gen.task_id(),
+                                group_id=group_id,
+                                name=f"Delete {len(batch)} archives",
+                                type=TaskType.ARCHIVE_DELETE,
+                                priority=TaskPriority.META,
+                                category=TaskCategory.META,
+                                start_after=0,
+                                created=datetime.datetime.now().timestamp())
+            data = ArchiveDeleteTaskDict(vault_name=v['VaultName'], vault_arn=v['VaultARN'], archive_ids=batch)
+            tasks.append(CommonTaskDict(meta=meta, data=data))
+        self._gm.add_tasks(tasks)
+
+    def pick_folder_to_sync(self):
+        d = QFileDialog(self, caption="Folder to sync")
+        d.setFileMode(QFileDialog.DirectoryOnly)
+        d.fileSelected.connect(self.sync_desired)
+        d.finished.connect(d.deleteLater)
+        d.show()
+
+    def sync_desired(self, local_dir: str):
+        q = QMessageBox(self)
+        q.setWindowTitle("Sync folder")
+        q.setText(f"<p>How to find changed files of <b>{local_dir}</b>?</p>" +
+                  "<p><small>Quick: by size and modification time.<br/>" +
+                  "Exact: by checksums. Checksums are kept, so next time only new and changed files are read." +
+                  "</small></p>")
+        quick = q.addButton("Quick", QMessageBox.AcceptRole)
+        exact = q.addButton("Exact", QMessageBox.AcceptRole)
+        q.addButton(QMessageBox.Cancel)
+        q.buttonClicked.connect(lambda b: b in (quick, exact) and self._start_sync_plan(local_dir, b is exact))
+        q.finished.connect(q.deleteLater)
+        q.open()
+
+    def _start_sync_plan(self, local_dir: str, exact: bool):
+        v = self.current_vault()
+        inventory_file = self._config.get_inventories_location(SurvturGlacier.inventory_filename(v['VaultARN']))
+        remote_dir = self._inventory_model.get_current_path() + os.path.basename(os.path.normpath(local_dir)) + "/"
+        plan = SyncPlan()
+        cancel = threading.Event()
+        threading.Thread(target=self._plan_sync, args=(local_dir, remote_dir, inventory_file, exact, plan, cancel),
+                         name="sync-plan", daemon=True).start()
+
+        q = QMessageBox(self)
+        q.setWindowTitle("Sync folder")
+        q.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        q.button(QMessageBox.Yes).setEnabled(False)
+        timer = QtCore.QTimer(q)
+        timer.timeout.connect(lambda: self._show_sync_plan(q, plan, remote_dir, timer))
+        timer.start(200)
+        self._show_sync_plan(q, plan, remote_dir, timer)
+        q.finished.connect(lambda answer: self._on_sync_confirmation_answered(answer, plan, v, cancel))
+        q.finished.connect(q.deleteLater)
+        q.open()
+
+    def _plan_sync(self, local_dir: str, remote_dir: str, inventory_file: str, exact: bool, plan: SyncPlan,
+                   cancel: threading.Event):
+        if not os.path.isfile(inventory_file):
+            plan.error = "There is no inventory of vault yet."
+            return
+        inv = Inventory(inventory_file)
+        hash_cache = HashCache(os.path.join(self._config.workdir, "hash_cache.db")) if exact else None
+        try:
+            plan_sync(local_dir, remote_dir, inv, exact=exact, hash_cache=hash_cache, plan=plan,
+                      should_stop=cancel.is_set)
+        except Exception as e:
+            _logger.exception(e)
+            plan.error = str(e)
+        finally:
+            inv.close()
+            if hash_cache:
+                hash_cache.close()
+
+    @staticmethod
+    def _show_sync_plan(q: QMessageBox, plan: SyncPlan, remote_dir: str, timer: QtCore.QTimer):
+        if plan.error:
+            text = f"Can't compare: {plan.error}"
+        elif not plan.done:
+            text = f"Comparing… Files checked: {plan.checked}"
+        else:
+            text = (f"Upload to <b>{remote_dir}</b><br/>" +
+                    f"New files: {len(plan.new)}<br/>" +
+                    f"Changed files: {len(plan.changed)}<br/>" +
+                    f"Identical files: {len(plan.identical)} (skipped)<br/><br/>" +
+                    f"Total: {human_readable_bytes(plan.size_to_upload)}")
+        q.setText(text)
+
+        if plan.error or plan.done:
+            timer.stop()
+            if plan.done and plan.to_upload():
+                q.button(QMessageBox.Yes).setEnabled(True)
+            else:
+                q.setStandardButtons(QMessageBox.Close)
+
+    def _on_sync_confirmation_answered(self, answer: int, plan: SyncPlan, vault: VaultDict, cancel: threading.Event):
+        if answer != QMessageBox.Yes:
+            cancel.set()
+            return
+        # Content of changed file may be the same. Then duplicate check will skip it.
+        uploads = ((i.entry, i.save_as_path, i.save_as_name) for i in plan.to_upload())
+        threading.Thread(target=self._add_upload_tasks, args=(uploads, vault, True),
+                         name="sync-submit", daemon=True).start()
+
     def _show_hide_upload_buttons(self, filter_str: str):
         self.btnUpload.setDisabled(bool(filter_str))
+        self.btnSync.setDisabled(bool(filter_str))
         self.btnMkdir.setDisabled(bool(filter_str))
 
     def _show_tasks(self, statuses_to_show: ShowTasksThat, pressed_btn: QtWidgets.QPushButton):
@@ -24,9 +24,14 @@ class TierDialog(QDialog):
         self.ui.bultRadio.clicked.connect(lambda: self.set_tier(GlacierTier.BULK))
         self.ui.btnPickFolder.clicked.connect(self.show_pick_folder_dialog)
 
-    def update_label(self, size: int, files_count: int, dirs_count: int):
-        bts = human_readable_bytes(size, letters=("&nbsp;bytes", "&nbsp;Kb", "&nbsp;Mb", "&nbsp;Gb", "&nbsp;Tb", "&nbsp;Eb"))
+    def update_label(self, size: int, files_count: int, dirs_count: int, saved_size: int = 0):
+        """`saved_size` is size of archives that are not downloaded, because other archive has the same content"""
+        letters = ("&nbsp;bytes", "&nbsp;Kb", "&nbsp;Mb", "&nbsp;Gb", "&nbsp;Tb", "&nbsp;Eb")
+        bts = human_readable_bytes(size - saved_size, letters=letters)
         text = (f"You are going to download <b>{bts}</b> of data. Archives count:&nbsp;{files_count}.")
+        if saved_size:
+            text += (f" Duplicates are downloaded once and copied, "
+                     f"it saves <b>{human_readable_bytes(saved_size, letters=letters)}</b>.")
 
         self.ui.label.setText(f"<html>{text}</html>")
 
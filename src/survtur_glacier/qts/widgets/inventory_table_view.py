@@ -30,6 +30,8 @@ class InventoryTableView(QTableView):
     enter_or_return = QtCore.pyqtSignal(QModelIndex)
     files_dropped = QtCore.pyqtSignal(list)
     download_desired = QtCore.pyqtSignal(list)
+    duplicates_desired = QtCore.pyqtSignal()
+    delete_desired = QtCore.pyqtSignal(list)
 
     def _emit_enter_return(self):
         self.enter_or_return.emit(self.currentIndex())
@@ -93,5 +95,13 @@ class InventoryTableView(QTableView):
             select_all.triggered.connect(lambda: self.download_desired.emit(archives))
             menu.addAction(select_all)
 
+            delete = QAction(self.style().standardIcon(QStyle.SP_TrashIcon), "Delete…")
+            delete.triggered.connect(lambda: self.delete_desired.emit(archives))
+            menu.addAction(delete)
+
+        duplicates = QAction(self.style().standardIcon(QStyle.SP_FileDialogDetailedView), "Find duplicates in vault…")
+        duplicates.triggered.connect(self.duplicates_desired.emit)
+        menu.addAction(duplicates)
+
         menu.exec(QCursor.pos())
         menu.deleteLater()
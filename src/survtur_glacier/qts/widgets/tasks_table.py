@@ -4,10 +4,17 @@ from typing import TypedDict, Dict, List, Optional, Set
 
 from PyQt5 import QtCore
 from PyQt5.QtCore import Qt, QPoint
-from PyQt5.QtGui import QCursor
+from PyQt5.QtGui import QCursor, QPalette
 from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QProgressBar, QHeaderView, QWidget, QMenu, QStyle, QAction
 
-from ...mp.stubs import TaskStatus, TaskMetaDict, TaskOutputDict
+from ...common.human_readable import human_readable_bytes
+from ...mp.stubs import TaskStatus, TaskMetaDict, TaskOutputDict, TaskType
+
+_GROUPED_TYPES = {TaskType.ARCHIVE_PART_UPLOAD}
+"""
+Tasks of these types are shown as a single row for the whole group.
+Rows of tasks themselves are created only while group is expanded.
+"""
 
 
 class _TaskWidgetsDict(TypedDict):
@@ -16,6 +23,26 @@ class _TaskWidgetsDict(TypedDict):
     status: TaskStatus
 
 
+class _PartStateDict(TypedDict):
+    """Last known state of a task that is shown in group"""
+    meta: TaskMetaDict
+    status: TaskStatus
+    percent: float
+    string: str
+    transferred: int
+
+
+class _GroupDict(TypedDict):
+    name: QTableWidgetItem
+    progress_bar: QProgressBar
+    title: str
+    expanded: bool
+    part_ids: List[str]
+    counts: Dict[TaskStatus, int]
+    transferred: int
+    transfer_size: int
+
+
 class ShowTasksThat(enum.Enum):
     ACTIVE = {TaskStatus.ACTIVE, TaskStatus.CREATED, TaskStatus.WAITING}
     SUCCEED = {TaskStatus.SUCCESS}
@@ -24,7 +51,10 @@ class ShowTasksThat(enum.Enum):
 
 class TasksTable(QTableWidget):
     _tasks: Dict[str, _TaskWidgetsDict] = {}
+    _parts: Dict[str, _PartStateDict] = {}
+    _groups: Dict[str, _GroupDict] = {}
     _rows_to_task_id: List[str] = []
+    # Row of group contains group_id instead of task_id.
     _status_to_show: ShowTasksThat = ShowTasksThat.ACTIVE
 
     delete_tasks_desire = QtCore.pyqtSignal(list)
@@ -35,15 +65,22 @@ class TasksTable(QTableWidget):
         super().__init__(parent)
         self._counters = {n: 0 for n in ShowTasksThat}
         self.customContextMenuRequested.connect(self.show_context_menu)
+        self.cellDoubleClicked.connect(self._toggle_group)
 
     def show_tasks_that(self, statuses_to_show: ShowTasksThat):
         self.clearSelection()
         self._status_to_show = statuses_to_show
         for task_id, info in self._tasks.items():
             self._set_visibility(task_id, info['status'])
+        for group_id in self._groups:
+            self._set_group_visibility(group_id)
 
     def update_task(self, t: TaskOutputDict):
 
+        if t['meta']['type'] in _GROUPED_TYPES:
+            self._update_part(t)
+            return
+
         task_id = t['meta']['id']
         if task_id in self._tasks:
             original_status = self._tasks[task_id]['status']
@@ -96,18 +133,11 @@ class TasksTable(QTableWidget):
         tw['progress_bar'].setFormat(t['string'])
         tw['progress_bar'].setToolTip(t['string'])
 
-    def _create_task(self, tm: TaskMetaDict):
-        i = self.rowCount()
-        if i == 0:
-            self.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
-            self.horizontalHeader().setSectionResizeMode(1, QHeaderView.Interactive)
-            self.horizontalHeader().resizeSection(1, 200)
-
-        # Inserting row at the end. Inserting task at the end.
-        self.insertRow(i)
-        self._rows_to_task_id.append(tm['id'])
+    def _create_task(self, tm: TaskMetaDict, row: Optional[int] = None, indent: str = ""):
+        """Inserts row of task. At the end of table, if `row` is not specified."""
+        i = self._insert_row(tm['id'], row)
 
-        name_widget = QTableWidgetItem(tm['name'])
+        name_widget = QTableWidgetItem(indent + tm['name'])
         name_widget.setToolTip(tm['name'])
         self.setItem(i, 0, name_widget)
         pb = QProgressBar()
@@ -125,6 +155,163 @@ class TasksTable(QTableWidget):
         )
         self._tasks[tm['id']] = tw
 
+    def _insert_row(self, key: str, row: Optional[int] = None) -> int:
+        i = self.rowCount() if row is None else row
+        if self.rowCount() == 0:
+            self.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+            self.horizontalHeader().setSectionResizeMode(1, QHeaderView.Interactive)
+            self.horizontalHeader().resizeSection(1, 200)
+
+        self.insertRow(i)
+        self._rows_to_task_id.insert(i, key)
+        return i
+
+    def _update_part(self, t: TaskOutputDict):
+        """Updates state of task that is shown in group. Its own row is updated only if group is expanded."""
+        task_id = t['meta']['id']
+        status = t['status']
+        part = self._parts.get(task_id)
+        original_status = part['status'] if part else None
+
+        if status == TaskStatus.CREATED:
+            if part is None:
+                self._create_part(t['meta'])
+        elif part is None:
+            return
+        elif status == TaskStatus.REMOVED_SILENTLY:
+            self._forget_part(task_id)
+        else:
+            group = self._groups[part['meta']['group_id']]
+            group['counts'][part['status']] -= 1
+            group['counts'][status] += 1
+            part['status'] = status
+            part['percent'] = t['percent']
+            part['string'] = t['string']
+
+            transferred = 0 if status in (TaskStatus.ERROR, TaskStatus.CANCELLED) else t.get('transferred')
+            if transferred is not None:
+                group['transferred'] += transferred - part['transferred']
+                part['transferred'] = transferred
+            if 'group_transfer_size' in t:
+                group['transfer_size'] = t['group_transfer_size']
+
+            if task_id in self._tasks:
+                self._update(t)
+                self._set_visibility(task_id, status)
+
+        group_id = t['meta']['group_id']
+        if group_id in self._groups:
+            self._refresh_group(group_id)
+            self._set_group_visibility(group_id)
+        self._update_counters(original_status, status)
+
+    def _create_part(self, tm: TaskMetaDict):
+        group_id = tm['group_id']
+        if group_id not in self._groups:
+            self._create_group(tm)
+        group = self._groups[group_id]
+
+        self._parts[tm['id']] = _PartStateDict(meta=tm, status=TaskStatus.WAITING, percent=0, string="", transferred=0)
+        group['part_ids'].append(tm['id'])
+        group['counts'][TaskStatus.WAITING] += 1
+        if group['expanded']:
+            self._create_part_row(tm['id'], group['name'].row() + len(group['part_ids']))
+
+    def _create_group(self, tm: TaskMetaDict):
+        i = self._insert_row(tm['group_id'])
+        # Name of part task is like "Upload file.bin 3/40"
+        title = tm['name'].rsplit(" ", 1)[0]
+        name_widget = QTableWidgetItem(title)
+        self.setItem(i, 0, name_widget)
+        pb = QProgressBar()
+        pb.setValue(0)
+        self.setCellWidget(i, 1, pb)
+        self._groups[tm['group_id']] = _GroupDict(
+            name=name_widget,
+            progress_bar=pb,
+            title=title,
+            expanded=False,
+            part_ids=[],
+            counts={s: 0 for s in TaskStatus},
+            transferred=0,
+            transfer_size=0,
+        )
+
+    def _create_part_row(self, task_id: str, row: int):
+        part = self._parts[task_id]
+        self._create_task(part['meta'], row, indent="    ")
+        if part['status'] != TaskStatus.WAITING:
+            self._update(TaskOutputDict(meta=part['meta'], percent=part['percent'], string=part['string'],
+                                        status=part['status']))
+        self._set_visibility(task_id, part['status'])
+
+    def _forget_part(self, task_id: str):
+        part = self._parts.pop(task_id)
+        group_id = part['meta']['group_id']
+        group = self._groups[group_id]
+        group['part_ids'].remove(task_id)
+        group['counts'][part['status']] -= 1
+        group['transferred'] -= part['transferred']
+        if task_id in self._tasks:
+            self._quiet_remove_task(task_id)
+
+        if not group['part_ids']:
+            del self._groups[group_id]
+            row_index = group['name'].row()
+            self.removeRow(row_index)
+            self._rows_to_task_id.pop(row_index)
+
+    def _refresh_group(self, group_id: str):
+        group = self._groups[group_id]
+        counts = group['counts']
+        arrow = "▾" if group['expanded'] else "▸"
+        done = counts[TaskStatus.SUCCESS]
+        active = counts[TaskStatus.ACTIVE]
+        waiting = counts[TaskStatus.WAITING] + counts[TaskStatus.CREATED]
+        faulty = counts[TaskStatus.ERROR] + counts[TaskStatus.CANCELLED]
+        parts_info = f"done {done}, uploading {active}, waiting {waiting}"
+        if faulty:
+            parts_info += f", failed {faulty}"
+        group['name'].setText(f"{arrow} {group['title']} ({parts_info})")
+        group['name'].setToolTip(f"{group['title']}\nDouble click to show or hide parts.")
+
+        if faulty:
+            group['name'].setForeground(Qt.red)
+        elif done == len(group['part_ids']):
+            group['name'].setForeground(Qt.darkGreen)
+        else:
+            group['name'].setForeground(self.palette().color(QPalette.Text))
+
+        pb = group['progress_bar']
+        size = group['transfer_size']
+        if size:
+            pb.setValue(int(100 * group['transferred'] / size))
+            pb.setFormat(f"{human_readable_bytes(group['transferred'])} of {human_readable_bytes(size)}")
+        else:
+            pb.setFormat(human_readable_bytes(group['transferred']) if group['transferred'] else "Waiting")
+
+    def _set_group_visibility(self, group_id: str):
+        group = self._groups[group_id]
+        if any(group['counts'][s] for s in self._status_to_show.value):
+            self.showRow(group['name'].row())
+        else:
+            self.hideRow(group['name'].row())
+
+    def _toggle_group(self, row: int, _column: int):
+        group_id = self._rows_to_task_id[row]
+        group = self._groups.get(group_id)
+        if group is None:
+            return
+
+        if group['expanded']:
+            for task_id in group['part_ids']:
+                self._quiet_remove_task(task_id)
+        else:
+            for k, task_id in enumerate(group['part_ids']):
+                self._create_part_row(task_id, row + 1 + k)
+        group['expanded'] = not group['expanded']
+        self._refresh_group(group_id)
+
     def _mark_task_with_color(self, task_id: str, color: Qt.GlobalColor):
         w = self._tasks[task_id]
         w['name'].setForeground(color)
@@ -144,9 +331,11 @@ class TasksTable(QTableWidget):
 
     def _recalculate_counters(self):
         self._counters = {n: 0 for n in ShowTasksThat}
-        for t in self._tasks.values():
+        statuses = [t['status'] for task_id, t in self._tasks.items() if task_id not in self._parts]
+        statuses.extend(p['status'] for p in self._parts.values())
+        for status in statuses:
             for sh in ShowTasksThat:
-                if t['status'] in sh.value:
+                if status in sh.value:
                     self._counters[sh] += 1
 
         self.counters_update.emit(self._counters)
@@ -163,7 +352,7 @@ class TasksTable(QTableWidget):
         self.counters_update.emit(self._counters)
 
     def show_context_menu(self, p: QPoint):
-        selection = self._selected_rows()
+        selection = self._selected_task_ids()
 
         has_faulty = self._status_to_show == ShowTasksThat.FAULTY and self._counters[ShowTasksThat.FAULTY]
         has_succeed = self._status_to_show == ShowTasksThat.SUCCEED and self._counters[ShowTasksThat.SUCCEED]
@@ -211,32 +400,52 @@ class TasksTable(QTableWidget):
         selection.update((i.row() for i in self.selectedIndexes()))
         return selection
 
+    def _selected_task_ids(self) -> List[str]:
+        """Selected group means all its tasks that are shown with current filter"""
+        task_ids = {}
+        for i in sorted(self._selected_rows()):
+            key = self._rows_to_task_id[i]
+            if key in self._groups:
+                for task_id in self._groups[key]['part_ids']:
+                    if self._parts[task_id]['status'] in self._status_to_show.value:
+                        task_ids[task_id] = None
+            else:
+                task_ids[key] = None
+        return list(task_ids)
+
+    def _remove_task(self, task_id: str):
+        if task_id in self._parts:
+            group_id = self._parts[task_id]['meta']['group_id']
+            self._forget_part(task_id)
+            if group_id in self._groups:
+                self._refresh_group(group_id)
+                self._set_group_visibility(group_id)
+        else:
+            self._quiet_remove_task(task_id)
+
     def delete_selected(self):
         # Collect IDs then remove
-        for_del = []
-        for i in self._selected_rows():
-            for_del.append(self._rows_to_task_id[i])
+        for_del = self._selected_task_ids()
 
         for task_id in for_del:
-            self._quiet_remove_task(task_id)
+            self._remove_task(task_id)
         self.delete_tasks_desire.emit(for_del)
         self._recalculate_counters()
 
     def _want_to_cancel_tasks(self):
-        for_cancel = []
-        for i in self._selected_rows():
-            for_cancel.append(self._rows_to_task_id[i])
-
-        self.cancel_tasks_desire.emit(for_cancel)
+        self.cancel_tasks_desire.emit(self._selected_task_ids())
 
     def clear_all_succeed(self):
         for_del = []
         for task_id, t in self._tasks.items():
-            if t['status'] == TaskStatus.SUCCESS:
+            if t['status'] == TaskStatus.SUCCESS and task_id not in self._parts:
+                for_del.append(task_id)
+        for task_id, p in self._parts.items():
+            if p['status'] == TaskStatus.SUCCESS:
                 for_del.append(task_id)
 
         for task_id in for_del:
-            self._quiet_remove_task(task_id)
+            self._remove_task(task_id)
 
         self._recalculate_counters()
 
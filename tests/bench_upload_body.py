@@ -0,0 +1,76 @@
+"""
+Compares memory allocated by upload bodies while they are read like http.client does.
+
+    python tests/bench_upload_body.py [size_mb] [block_kb]
+
+Needs Python 3.9+ for `tracemalloc.reset_peak()`.
+"""
+import mmap
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Any
+
+from survtur_glacier.common.helpers import MB, KB
+from survtur_glacier.common.iopart2 import MmapWithReadCallback, MmapBody, BufferedReaderWithCallback
+
+GB = 1024 * MB
+
+
+def _consume(body, block_size: int, sink: Callable[[Any], Any]):
+    """Reads body in blocks and measures bytes allocated while reading. Returns (allocated, total_read)"""
+    allocated = 0
+    total = 0
+    while True:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        block = body.read(block_size)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+        if not block:
+            break
+        total += len(block)
+        sink(block)
+        del block
+    return allocated, total
+
+
+def main():
+    size = int(sys.argv[1]) * MB if len(sys.argv) > 1 else 256 * MB
+    block_size = int(sys.argv[2]) * KB if len(sys.argv) > 2 else 64 * KB
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "part.bin")
+        with open(path, "wb") as f:
+            for _ in range(size // MB):
+                f.write(os.urandom(MB))
+
+        # Socket gets the buffer and copies it to kernel. memoryview(block) does not copy.
+        sink = memoryview
+
+        def mmap_with_read_callback(f):
+            mm = MmapWithReadCallback(f.fileno(), access=mmap.ACCESS_READ, length=size)
+            mm.callback = lambda p: None
+            return mm
+
+        def buffered_reader_with_callback(f):
+            return BufferedReaderWithCallback(open(path, "br"), lambda p: None)
+
+        def mmap_body(f):
+            return MmapBody(f.fileno(), length=size, callback=lambda p: None)
+
+        tracemalloc.start()
+        for make in (mmap_with_read_callback, buffered_reader_with_callback, mmap_body):
+            with open(path, "br") as f, make(f) as body:
+                started = time.monotonic()
+                allocated, total = _consume(body, block_size, sink)
+                seconds = time.monotonic() - started
+            assert total == size, (total, size)
+            print(f"{make.__name__:32} {allocated * GB / total / MB:10.1f} MB allocated per GB "
+                  f"{size / MB / seconds:10.1f} MB/s")
+        tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()